@@ -1,13 +1,15 @@
 
 # AllCandidates.py — merged with Export-All + total count passed to template (FIXED .strip() on None)
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify, send_file
-from pagination import Paginator, sanitize_page_params
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify
+from pagination import Keyset, Paginator, and_where, count_rows, sanitize_page_params
+import contacts
+from export_stream import csv_response, iter_csv, iter_rows
+import export_jobs
 import sys
+from datetime import date
 
 import json
 import re as _re
-import io
-import csv
 
 
 def normalize_list_field(value):
@@ -105,10 +107,11 @@ def _extract_filters_from_mapping(getter):
     params = []
     if name:
         where.append("c.candidate_name ILIKE %s"); params.append(f"%{name}%")
+    # phone/email: exact or prefix lookup on the normalized candidate_contacts index
     if phone:
-        where.append("COALESCE(c.phones::text,'') ILIKE %s"); params.append(f"%{phone}%")
+        sql, p = contacts.filter_sql(contacts.PHONE, phone); where.append(sql); params.extend(p)
     if email:
-        where.append("COALESCE(c.emails::text,'') ILIKE %s"); params.append(f"%{email}%")
+        sql, p = contacts.filter_sql(contacts.EMAIL, email); where.append(sql); params.extend(p)
     for _term in _skills_terms:
         where.append("COALESCE(c.key_skills,'') ILIKE %s"); params.append(f"%{_term}%")
     if location:
@@ -166,20 +169,23 @@ def all_candidates():
     where_sql = filt['where_sql']
     params = filt['params']
 
-    order_sql = "ORDER BY c.added_date DESC, c.id DESC"
+    # ORDER BY c.added_date DESC, c.id DESC; Prev/Next seek on (added_date, id) via ?cursor=
+    keyset = Keyset('c.added_date', 'c.id', descending=True, sort_type=date)
+    cursor = keyset.decode(request.args.get('cursor'))
+    next_cursor = prev_cursor = None
+    count = None
 
     try:
         with get_db_cursor() as (conn, cur):
-            cur.execute(f"""
-                SELECT COUNT(*) AS total
+            # exact when small, planner estimate / cached count when large (see pagination.count_rows)
+            count = count_rows(cur, f"""
                 FROM candidates c
                 LEFT JOIN requirements r ON r.id = c.requirement_id
                 WHERE {where_sql}
             """, params)
-            row = cur.fetchone() or {}
-            total = row.get('total', 0)
+            total = count.value
 
-            offset = (page - 1) * per_page
+            plan = keyset.plan(cursor, page, per_page, total)
             cur.execute(f"""
                 SELECT
                     c.*,
@@ -188,11 +194,11 @@ def all_candidates():
                     r.client_name
                 FROM candidates c
                 LEFT JOIN requirements r ON r.id = c.requirement_id
-                WHERE {where_sql}
-                {order_sql}
+                WHERE {and_where(where_sql, plan)}
+                {plan.order_sql}
                 LIMIT %s OFFSET %s
-            """, params + [per_page, offset])
-            candidates = cur.fetchall() or []
+            """, params + plan.params + [plan.limit, plan.offset])
+            candidates, next_cursor, prev_cursor = keyset.finish(cur.fetchall() or [], plan, cursor, page)
 
             for c in candidates:
                 c['phones'] = normalize_list_field(c.get('phones'))
@@ -207,7 +213,11 @@ def all_candidates():
         page=page,
         per_page=per_page,
         base_url=url_for('all_candidates_bp.all_candidates'),
-        args=request.args.to_dict()
+        args=request.args.to_dict(),
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        last_cursor=keyset.last_page_cursor(),
+        count=count,
     )
 
         # canonicalize added_by_me to '1' or '0' string for the template
@@ -257,6 +267,38 @@ def all_candidates_requirements_json():
         return jsonify({'ok': False, 'error': 'failed'}), 500
 
 
+EXPORT_CSV_HEADERS = [
+    "Job Title", "Requirement", "Candidate Name", "Total Experience",
+    "Phone Number", "Email ID", "Notice Period", "Current Location",
+    "Calling Status", "Profile Status", "Comments", "Added By"
+]
+
+
+def _export_csv_row(c):
+    phones = ", ".join(normalize_list_field(c.get('phones')))
+    emails = ", ".join(normalize_list_field(c.get('emails')))
+    req_label = ""
+    if c.get('req_id'):
+        req_label = (c.get('requirement_name') or f"Requirement {c.get('req_id')}")
+        client_name = c.get('client_name')
+        if client_name:
+            req_label += f" ({client_name})"
+    return [
+        c.get('job_title') or "-",
+        req_label or "-",
+        c.get('candidate_name') or "-",
+        c.get('total_experience') or "-",
+        phones or "-",
+        emails or "-",
+        c.get('notice_period') or "-",
+        c.get('current_location') or "-",
+        c.get('calling_status') or "-",
+        c.get('profile_status') or "-",
+        c.get('comments') or "-",
+        c.get('added_by_name') or c.get('added_by') or "—",
+    ]
+
+
 @all_candidates_bp.route('/candidates/export_all', methods=['POST'])
 def export_all_candidates_csv():
     if 'user_id' not in session:
@@ -270,64 +312,32 @@ def export_all_candidates_csv():
             v = default
         return str(v).strip()
 
-    get_db_cursor = _helpers()
     filt = _extract_filters_from_mapping(_getp)
     where_sql = filt['where_sql']
     params = filt['params']
-    order_sql = "ORDER BY c.added_date DESC, c.id DESC"
-
-    with get_db_cursor() as (conn, cur):
-        cur.execute(f"""
+    spec = export_jobs.ExportSpec(
+        fmt='csv',
+        filename="candidates_export.csv",
+        select_sql="""
             SELECT
                 c.*,
                 r.id   AS req_id,
                 r.requirement_name,
-                r.client_name
+                r.client_name""",
+        from_sql=f"""
             FROM candidates c
             LEFT JOIN requirements r ON r.id = c.requirement_id
-            WHERE {where_sql}
-            {order_sql}
-        """, params)
-        rows = cur.fetchall() or []
-
-    headers = [
-        "Job Title", "Requirement", "Candidate Name", "Total Experience",
-        "Phone Number", "Email ID", "Notice Period", "Current Location",
-        "Calling Status", "Profile Status", "Comments", "Added By"
-    ]
-
-    sio = io.StringIO()
-    writer = csv.writer(sio)
-    writer.writerow(headers)
-    for c in rows:
-        phones = ", ".join(normalize_list_field(c.get('phones')))
-        emails = ", ".join(normalize_list_field(c.get('emails')))
-        req_label = ""
-        if c.get('req_id'):
-            req_label = (c.get('requirement_name') or f"Requirement {c.get('req_id')}")
-            client_name = c.get('client_name')
-            if client_name:
-                req_label += f" ({client_name})"
-        writer.writerow([
-            c.get('job_title') or "-",
-            req_label or "-",
-            c.get('candidate_name') or "-",
-            c.get('total_experience') or "-",
-            phones or "-",
-            emails or "-",
-            c.get('notice_period') or "-",
-            c.get('current_location') or "-",
-            c.get('calling_status') or "-",
-            c.get('profile_status') or "-",
-            c.get('comments') or "-",
-            c.get('added_by_name') or c.get('added_by') or "—",
-        ])
-
-    mem = io.BytesIO(sio.getvalue().encode('utf-8-sig'))
-    mem.seek(0)
-    return send_file(
-        mem,
-        as_attachment=True,
-        download_name="candidates_export.csv",
-        mimetype="text/csv"
+            WHERE {where_sql}""",
+        order_sql="ORDER BY c.added_date DESC, c.id DESC",
+        params=params,
+        headers=EXPORT_CSV_HEADERS,
+        to_row=_export_csv_row,
     )
+
+    # {"async": 1}: render in the background and poll /exports/<job_id> (export_jobs.py)
+    if _getp('async') in ('1', 'true', 'True'):
+        return export_jobs.accepted(export_jobs.submit(spec, session.get('user_id')))
+
+    # Streamed: rows come off a server-side cursor and go out in CSV chunks (export_stream.py)
+    rows = iter_rows(spec.sql, params)
+    return csv_response(iter_csv(EXPORT_CSV_HEADERS, rows, _export_csv_row), spec.filename)
@@ -0,0 +1,176 @@
+"""
+bulk_insert.py
+Batched INSERT (and UPDATE) for candidate imports.
+
+Rows are grouped by column set and written with psycopg2.extras.execute_values,
+BULK_INSERT_BATCH rows per statement, each batch inside a savepoint. When a batch
+fails it is rolled back to the savepoint and bisected until the offending rows
+are isolated, so one bad row costs ~log2(batch) extra statements instead of
+aborting the import, and every other row still goes in. Errors are reported per
+input row index, like the old one-INSERT-per-row loops.
+
+bulk_update() applies per-row changes to existing rows the same way: one
+UPDATE ... FROM (VALUES ...) per batch, values cast to the target column types.
+
+The caller owns the transaction (commit / rollback).
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from settings import env_int
+
+logger = logging.getLogger(__name__)
+
+
+BULK_INSERT_BATCH = env_int('BULK_INSERT_BATCH', 500)
+_SAVEPOINT = 'bulk_insert_sp'
+
+
+@dataclass
+class BulkResult:
+    inserted: int = 0
+    inserted_indexes: List[int] = field(default_factory=list)
+    updated: int = 0
+    updated_indexes: List[int] = field(default_factory=list)
+    returned: Dict[int, object] = field(default_factory=dict)      # row index -> RETURNING value
+    failed: List[Tuple[int, str]] = field(default_factory=list)    # (row index, error message)
+    statements: int = 0
+
+
+def _error_message(exc):
+    diag = getattr(exc, 'diag', None)
+    msg = getattr(diag, 'message_primary', None) or str(exc)
+    return (msg.strip().splitlines() or [exc.__class__.__name__])[0][:300]
+
+
+def _quote_ident(name):
+    return '"%s"' % str(name).replace('"', '""')
+
+
+def _write_batch(cur, sql, template, batch, result, done, fetch=False):
+    """batch: [(row index, values tuple)]; bisects on failure, successful indexes go to `done`.
+
+    With `fetch`, the statement's RETURNING value of each row goes to result.returned.
+    """
+    cur.execute('SAVEPOINT ' + _SAVEPOINT)
+    result.statements += 1
+    try:
+        returned = execute_values(cur, sql, [vals for _, vals in batch], template=template,
+                                  page_size=len(batch), fetch=fetch)
+    except Exception as e:
+        cur.execute('ROLLBACK TO SAVEPOINT ' + _SAVEPOINT)
+        cur.execute('RELEASE SAVEPOINT ' + _SAVEPOINT)
+        if len(batch) == 1:
+            result.failed.append((batch[0][0], _error_message(e)))
+            return
+        mid = len(batch) // 2
+        _write_batch(cur, sql, template, batch[:mid], result, done, fetch)
+        _write_batch(cur, sql, template, batch[mid:], result, done, fetch)
+        return
+    cur.execute('RELEASE SAVEPOINT ' + _SAVEPOINT)
+    done.extend(i for i, _ in batch)
+    if fetch:
+        # a multi-row INSERT ... VALUES returns its rows in VALUES order
+        for (i, _), row in zip(batch, returned):
+            result.returned[i] = row[0] if not isinstance(row, dict) else next(iter(row.values()))
+
+
+def bulk_insert(cur, table, rows, sql_values: Optional[Dict[str, str]] = None,
+                batch_size: Optional[int] = None, skip=(), returning: Optional[str] = None):
+    """Insert `rows` (dicts of column -> value) into `table`; returns a BulkResult.
+
+    `sql_values` adds columns whose value is a SQL expression, identical for every
+    row (e.g. {'added_date': 'now()'}). Indexes in `skip` are left out (rows the
+    caller already rejected), but keep their position for error reporting.
+    `returning` names a column (e.g. 'id') to collect per inserted row in result.returned.
+    """
+    batch_size = batch_size or BULK_INSERT_BATCH
+    sql_values = dict(sql_values or {})
+    skip = set(skip)
+    result = BulkResult()
+
+    # column set -> [(index, values)], in first-seen order
+    groups = {}
+    for idx, row in enumerate(rows):
+        if idx in skip:
+            continue
+        cols = tuple(row.keys())
+        groups.setdefault(cols, []).append((idx, tuple(row[c] for c in cols)))
+
+    for cols, items in groups.items():
+        all_cols = list(cols) + [c for c in sql_values if c not in cols]
+        sql = 'INSERT INTO %s (%s) VALUES %%s' % (table, ', '.join(_quote_ident(c) for c in all_cols))
+        if returning:
+            sql += ' RETURNING ' + _quote_ident(returning)
+        template = '(' + ', '.join(['%s'] * len(cols) + [sql_values[c] for c in all_cols[len(cols):]]) + ')'
+        for start in range(0, len(items), batch_size):
+            _write_batch(cur, sql, template, items[start:start + batch_size], result,
+                         result.inserted_indexes, fetch=bool(returning))
+
+    result.inserted_indexes.sort()
+    result.inserted = len(result.inserted_indexes)
+    result.failed.sort()
+    if result.failed:
+        logger.info("bulk_insert into %s: %d inserted, %d failed, %d statements",
+                    table, result.inserted, len(result.failed), result.statements)
+    return result
+
+
+def _column_types(cur, table):
+    cur.execute("""
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+    """, (table,))
+    out = {}
+    for row in cur.fetchall():
+        name, typ = (row['attname'], row['format_type']) if isinstance(row, dict) else row
+        out[name] = typ
+    return out
+
+
+def bulk_update(cur, table, rows, key='id', sql_values: Optional[Dict[str, str]] = None,
+                batch_size: Optional[int] = None):
+    """Update existing rows of `table`; returns a BulkResult (updated / updated_indexes / failed).
+
+    `rows` is [(row index, key value, {column: value})]: only the given columns
+    change, so callers pass just the values they mean to overwrite. `sql_values`
+    sets columns to a SQL expression on every updated row (e.g. {'updated_date': 'now()'}).
+    """
+    batch_size = batch_size or BULK_INSERT_BATCH
+    sql_values = dict(sql_values or {})
+    result = BulkResult()
+    if not rows:
+        return result
+    types = _column_types(cur, table)
+
+    groups = {}
+    for idx, key_value, values in rows:
+        cols = tuple(c for c in values if c != key and c not in sql_values)
+        groups.setdefault(cols, []).append((idx, (key_value,) + tuple(values[c] for c in cols)))
+
+    for cols, items in groups.items():
+        sets = ['%s = v.%s' % (_quote_ident(c), _quote_ident(c)) for c in cols]
+        sets += ['%s = %s' % (_quote_ident(c), expr) for c, expr in sql_values.items()]
+        if not sets:
+            continue
+        sql = 'UPDATE %s AS t SET %s FROM (VALUES %%s) AS v(%s) WHERE t.%s = v.%s' % (
+            table, ', '.join(sets), ', '.join(_quote_ident(c) for c in (key,) + cols),
+            _quote_ident(key), _quote_ident(key))
+        # cast in the VALUES list: untyped literals would otherwise all be text
+        template = '(' + ', '.join('%%s::%s' % types.get(c, 'text') for c in (key,) + cols) + ')'
+        for start in range(0, len(items), batch_size):
+            _write_batch(cur, sql, template, items[start:start + batch_size], result,
+                         result.updated_indexes)
+
+    result.updated_indexes.sort()
+    result.updated = len(result.updated_indexes)
+    result.failed.sort()
+    if result.failed:
+        logger.info("bulk_update of %s: %d updated, %d failed, %d statements",
+                    table, result.updated, len(result.failed), result.statements)
+    return result
@@ -0,0 +1,376 @@
+"""
+bulk_loader.py
+Offline loader for very large candidate files (100k+ rows), driven by
+scripts/load_candidates.
+
+The web import can't finish such files inside gunicorn's timeout. This path
+reuses the web import's header mapping (import_routes.compute_mappings: forced
+aliases, learned memory, semantic and fuzzy matching) and then:
+
+  1. streams the file in chunks (upload_ingest.iter_frames);
+  2. converts each mapped column to text Postgres will accept for the target
+     column's type, whole columns at a time; rows with a value that doesn't fit
+     (e.g. 'N/A' in a date column) are rejected here;
+  3. COPYs the rest into a temp staging table (all TEXT);
+  4. merges set-based: contact keys via candidate_contact_keys() (the same
+     normalization as candidate_contacts), rows already in the requirement or
+     repeating an earlier row's phone/email are skipped (on_duplicate=skip),
+     and one INSERT ... SELECT writes everything else;
+  5. stores each inserted row's fingerprint (import_delta.py, hashed from the
+     sheet's text while reading) under the load's import batch, so a later web
+     re-import of the sheet sees these rows as unchanged or changed;
+  6. writes every row that wasn't loaded, with its reason, to a rejected-rows CSV.
+
+New candidate ids are taken from the candidates id sequence in the staging
+table before the INSERT, which is what ties each fingerprint to its row.
+
+Everything is one transaction: a failed load inserts nothing.
+"""
+
+import csv
+import io
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import contacts
+import db_pool
+import import_delta
+import upload_ingest
+from import_validation import cell_text
+
+logger = logging.getLogger(__name__)
+
+LOAD_CHUNK_ROWS = 20000
+STAGING = 'candidate_load_staging'
+SKIPS = 'candidate_load_skips'
+KEYS = 'candidate_load_keys'
+
+_INT_TYPES = ('smallint', 'integer', 'bigint')
+_NUM_TYPES = ('numeric', 'real', 'double precision')
+_TRUE = {'true', 't', 'yes', 'y', '1'}
+_FALSE = {'false', 'f', 'no', 'n', '0'}
+_TIME_RE = r'^\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?(\s*[AaPp][Mm])?$'
+_VARCHAR_RE = re.compile(r'^character varying\((\d+)\)$')
+
+
+@dataclass
+class LoadResult:
+    rows: int = 0
+    blank: int = 0
+    inserted: int = 0
+    skipped: int = 0                 # duplicates (merge step)
+    rejected: int = 0                # values that don't fit their column
+    parse_seconds: float = 0.0       # read + convert + COPY
+    merge_seconds: float = 0.0
+    batch_id: Optional[int] = None
+    rejected_path: Optional[str] = None
+
+    @property
+    def seconds(self):
+        return self.parse_seconds + self.merge_seconds
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class LoadPlan:
+    mapping: Dict[str, str]                           # sheet column -> candidates column
+    types: Dict[str, str]                             # candidates column -> format_type()
+    requirement_id: int
+    on_duplicate: str = 'skip'
+    added_by: Optional[str] = None
+    columns: List[str] = field(init=False)            # target columns, sheet order
+
+    def __post_init__(self):
+        self.columns = list(self.mapping.values())
+
+
+def column_types(cur):
+    """{column: format_type} of candidates."""
+    cur.execute("""
+        SELECT attname, format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = 'candidates'::regclass AND attnum > 0 AND NOT attisdropped
+    """)
+    return {r[0]: r[1] for r in cur.fetchall()}
+
+
+# ---------- column conversion ----------
+def _by_unique(text, fn):
+    """fn over the distinct values of `text` only (sheets repeat dates, statuses, ...)."""
+    uniques = pd.unique(text.to_numpy())
+    return text.map(dict(zip(uniques, fn(pd.Series(uniques, dtype=object)))))
+
+
+def _dates(values, fmt):
+    parsed = pd.to_datetime(values, errors='coerce', dayfirst=True, format='mixed')
+    return parsed.dt.strftime(fmt).where(parsed.notna(), None).tolist()
+
+
+def _json_list(v):
+    try:
+        json.loads(v)
+        return v
+    except ValueError:
+        return json.dumps(contacts.split_contacts(v))
+
+
+def _pg_array(tokens):
+    return '{%s}' % ','.join('"%s"' % t.replace('\\', '\\\\').replace('"', '\\"') for t in tokens)
+
+
+def convert_column(series, pg_type):
+    """(text values for COPY, None where blank; mask of values that don't fit pg_type)."""
+    text = cell_text(series)
+    blank = text.eq('').to_numpy()
+    present = text[~blank]
+    out = pd.Series([None] * len(text), index=text.index, dtype=object)
+    if present.empty:
+        return out, np.zeros(len(text), dtype=bool)
+
+    if pg_type in _INT_TYPES or pg_type.startswith('numeric') or pg_type in _NUM_TYPES:
+        nums = pd.to_numeric(present.str.replace(',', '', regex=False), errors='coerce')
+        if pg_type in _INT_TYPES:
+            nums = nums.where(nums.eq(nums.round()))
+            converted = nums.map(lambda v: None if v != v else str(int(v)))
+        else:
+            converted = nums.map(lambda v: None if v != v else repr(float(v)))
+    elif pg_type == 'date':
+        converted = _by_unique(present, lambda u: _dates(u, '%Y-%m-%d'))
+    elif pg_type.startswith('timestamp'):
+        converted = _by_unique(present, lambda u: _dates(u, '%Y-%m-%d %H:%M:%S'))
+    elif pg_type.startswith('time'):
+        converted = present.where(present.str.match(_TIME_RE), None)
+    elif pg_type == 'boolean':
+        lower = present.str.lower()
+        converted = lower.map(lambda v: 'true' if v in _TRUE else ('false' if v in _FALSE else None))
+    elif pg_type in ('json', 'jsonb'):
+        converted = present.map(_json_list)
+    elif pg_type.endswith('[]'):
+        converted = present.map(lambda v: _pg_array(contacts.split_contacts(v)))
+    else:
+        converted = present
+        m = _VARCHAR_RE.match(pg_type)
+        if m:
+            converted = present.where(present.str.len() <= int(m.group(1)), None)
+
+    out.iloc[np.flatnonzero(~blank)] = converted.to_numpy()
+    bad = np.zeros(len(text), dtype=bool)
+    bad[~blank] = converted.isna().to_numpy()
+    return out, bad
+
+
+def convert_chunk(df, plan):
+    """(converted frame of target columns, reasons per rejected row, blank-row mask) for one chunk."""
+    converted = {}
+    reasons = [[] for _ in range(len(df))]
+    blank = np.ones(len(df), dtype=bool)
+    for sheet_col, db_col in plan.mapping.items():
+        values, bad = convert_column(df[sheet_col].reset_index(drop=True), plan.types.get(db_col, 'text'))
+        converted[db_col] = values
+        blank &= values.isna().to_numpy() & ~bad
+        for i in np.flatnonzero(bad):
+            reasons[i].append('%s: not a valid %s' % (db_col, plan.types.get(db_col, 'text')))
+    return pd.DataFrame(converted, columns=plan.columns), reasons, blank
+
+
+def fingerprint_chunk(texts, plan):
+    """(identity hashes, content hashes) per row of one chunk; `texts` is {candidates column:
+    cell text}, the values the web import fingerprints."""
+    columns = import_delta.content_columns(plan.columns)
+    records = pd.DataFrame(texts).to_dict('records')
+    return ([import_delta.identity_hash(r) for r in records],
+            [import_delta.content_hash(r, columns) for r in records])
+
+
+# ---------- staging + merge ----------
+def _ident(name):
+    return '"%s"' % str(name).replace('"', '""')
+
+
+def create_staging(cur, plan):
+    cols = ', '.join('%s TEXT' % _ident(c) for c in plan.columns)
+    cur.execute('CREATE TEMP TABLE %s (row_no BIGINT PRIMARY KEY, candidate_id BIGINT, '
+                'fp_identity TEXT, fp_content TEXT, %s) ON COMMIT DROP' % (STAGING, cols))
+
+
+def copy_chunk(cur, frame, row_numbers, fingerprints, plan):
+    buf = io.StringIO()
+    out = frame.copy()
+    out.insert(0, 'row_no', row_numbers)
+    out.insert(1, 'fp_identity', fingerprints[0])
+    out.insert(2, 'fp_content', fingerprints[1])
+    out.to_csv(buf, header=False, index=False, na_rep='')
+    buf.seek(0)
+    cur.copy_expert('COPY %s (row_no, fp_identity, fp_content, %s) FROM STDIN WITH (FORMAT csv)'
+                    % (STAGING, ', '.join(_ident(c) for c in plan.columns)), buf)
+
+
+def _mark_duplicates(cur, plan):
+    """Fill SKIPS with rows not to insert: repeats of an earlier row, rows already in the requirement."""
+    cur.execute('CREATE TEMP TABLE %s (row_no BIGINT PRIMARY KEY, reason TEXT NOT NULL) ON COMMIT DROP' % SKIPS)
+    if plan.on_duplicate != 'skip':
+        return
+    phones = 's.%s' % _ident('phones') if 'phones' in plan.columns else 'NULL'
+    emails = 's.%s' % _ident('emails') if 'emails' in plan.columns else 'NULL'
+    if phones == emails == 'NULL':
+        return
+    cur.execute("""
+        CREATE TEMP TABLE %s ON COMMIT DROP AS
+        SELECT s.row_no, k.kind, k.search_key
+        FROM %s s, LATERAL candidate_contact_keys(%s, %s) k
+    """ % (KEYS, STAGING, phones, emails))
+    cur.execute('CREATE INDEX ON %s (kind, search_key, row_no)' % KEYS)
+    cur.execute('ANALYZE %s' % KEYS)
+    cur.execute("""
+        INSERT INTO %(skips)s (row_no, reason)
+        SELECT a.row_no, 'Duplicate of row ' || min(b.row_no) || ' in this file'
+        FROM %(keys)s a JOIN %(keys)s b
+          ON b.kind = a.kind AND b.search_key = a.search_key AND b.row_no < a.row_no
+        GROUP BY a.row_no
+    """ % {'skips': SKIPS, 'keys': KEYS})
+    cur.execute("""
+        INSERT INTO %(skips)s (row_no, reason)
+        SELECT DISTINCT ON (k.row_no) k.row_no, 'Already in this requirement (candidate #' || c.id || ')'
+        FROM %(keys)s k
+        JOIN candidate_contacts cc ON cc.kind = k.kind AND cc.search_key = k.search_key
+        JOIN candidates c ON c.id = cc.candidate_id AND c.requirement_id = %%s
+        ORDER BY k.row_no, c.id DESC
+        ON CONFLICT (row_no) DO NOTHING
+    """ % {'skips': SKIPS, 'keys': KEYS}, (plan.requirement_id,))
+
+
+def _allocate_ids(cur):
+    """Give every staged row that isn't skipped its candidate id, in row order."""
+    cur.execute("SELECT pg_get_serial_sequence('candidates', 'id')")
+    sequence = cur.fetchone()[0]
+    if not sequence:
+        raise RuntimeError('candidates.id has no sequence to take new ids from')
+    cur.execute("""
+        UPDATE %(staging)s s SET candidate_id = n.id
+        FROM (SELECT row_no, nextval(%%s::regclass) AS id FROM %(staging)s t
+              WHERE NOT EXISTS (SELECT 1 FROM %(skips)s k WHERE k.row_no = t.row_no)
+              ORDER BY row_no) n
+        WHERE s.row_no = n.row_no
+    """ % {'staging': STAGING, 'skips': SKIPS}, (sequence,))
+
+
+def merge(cur, plan, batch_id):
+    """Insert staged rows that aren't skipped, with their fingerprints; returns (inserted, skipped)."""
+    cur.execute('ANALYZE %s' % STAGING)
+    _mark_duplicates(cur, plan)
+    _allocate_ids(cur)
+    target = ['id'] + list(plan.columns)
+    values = ['s.candidate_id'] + ['s.%s::%s' % (_ident(c), plan.types.get(c, 'text')) for c in plan.columns]
+    extra = {'requirement_id': '%s', 'added_by': '%s', 'added_date': 'now()', 'updated_date': 'now()'}
+    params = []
+    for col, expr in extra.items():
+        if col in plan.types and col not in target:
+            target.append(col)
+            values.append(expr)
+            if col == 'requirement_id':
+                params.append(plan.requirement_id)
+            elif col == 'added_by':
+                params.append(plan.added_by)
+    if 'application_date' in plan.types and 'application_date' not in target:
+        target.append('application_date')
+        values.append('now()')
+    cur.execute("""
+        INSERT INTO candidates (%s) OVERRIDING SYSTEM VALUE
+        SELECT %s FROM %s s
+        WHERE s.candidate_id IS NOT NULL
+        ORDER BY s.row_no
+    """ % (', '.join(_ident(c) for c in target), ', '.join(values), STAGING), params)
+    inserted = cur.rowcount
+    # same rows import_delta.store() would write for them; rows without contacts or a name have no identity
+    cur.execute("""
+        INSERT INTO import_row_fingerprints (candidate_id, requirement_id, identity_hash, content_hash, batch_id)
+        SELECT candidate_id, %%s, fp_identity, fp_content, %%s FROM %s
+        WHERE candidate_id IS NOT NULL AND fp_identity IS NOT NULL
+    """ % STAGING, (plan.requirement_id, batch_id))
+    cur.execute('SELECT count(*) FROM %s' % SKIPS)
+    return inserted, cur.fetchone()[0]
+
+
+class RejectedWriter:
+    """CSV of rows that weren't loaded: sheet row, reason, then the mapped values."""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = columns
+        self.count = 0
+        self._f = open(path, 'w', newline='', encoding='utf-8')
+        self._w = csv.writer(self._f)
+        self._w.writerow(['row', 'reason'] + columns)
+
+    def write(self, row_no, reason, values):
+        self._w.writerow([row_no, reason] + ['' if v is None else v for v in values])
+        self.count += 1
+
+    def write_skips(self, cur):
+        cur.execute('SELECT k.row_no, k.reason, %s FROM %s k JOIN %s s USING (row_no) ORDER BY k.row_no'
+                    % (', '.join('s.%s' % _ident(c) for c in self.columns), SKIPS, STAGING))
+        for row in cur:
+            self.write(row[0], row[1], list(row[2:]))
+
+    def close(self):
+        self._f.close()
+
+
+def load(path, plan, rejected_path, kind=None, sheet_sep=',', chunk_rows=LOAD_CHUNK_ROWS, log=print):
+    """Load the file at `path` per `plan`; returns a LoadResult."""
+    kind = kind or upload_ingest.file_kind(path)
+    result = LoadResult(rejected_path=rejected_path)
+    rejected = RejectedWriter(rejected_path, plan.columns)
+    t0 = time.perf_counter()
+    try:
+        with db_pool.connection(request_scoped=False) as conn:
+            cur = conn.cursor()
+            try:
+                create_staging(cur, plan)
+                for df in upload_ingest.iter_frames(path, kind, chunk_rows=chunk_rows, sep=sheet_sep,
+                                                    sheet_rows=True):
+                    frame, reasons, blank = convert_chunk(df, plan)
+                    row_numbers = df.index.to_numpy()     # sheet row numbers, blank rows already dropped
+                    bad = np.array([bool(r) for r in reasons], dtype=bool)
+                    texts = {db_col: cell_text(df[sheet_col].reset_index(drop=True))
+                             for sheet_col, db_col in plan.mapping.items()}
+                    for i in np.flatnonzero(bad):
+                        rejected.write(int(row_numbers[i]), '; '.join(reasons[i]), [t.iloc[i] for t in texts.values()])
+                    keep = ~bad & ~blank
+                    identities, contents = fingerprint_chunk({c: t[keep] for c, t in texts.items()}, plan)
+                    copy_chunk(cur, frame[keep], row_numbers[keep], (identities, contents), plan)
+                    result.rows += len(df)
+                    result.blank += int(blank.sum())
+                    result.rejected += int(bad.sum())
+                    elapsed = time.perf_counter() - t0
+                    log('  %9d rows read  %8.0f rows/s' % (result.rows, result.rows / elapsed if elapsed else 0))
+                result.parse_seconds = time.perf_counter() - t0
+
+                t1 = time.perf_counter()
+                result.batch_id = import_delta.start_batch(cur, plan.requirement_id, os.path.basename(path),
+                                                           plan.added_by, result.rows)
+                result.inserted, result.skipped = merge(cur, plan, result.batch_id)
+                rejected.write_skips(cur)
+                import_delta.finish_batch(cur, result.batch_id, result.inserted, 0, 0,
+                                          result.skipped + result.rejected)
+                conn.commit()
+                result.merge_seconds = time.perf_counter() - t1
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+    finally:
+        rejected.close()
+    return result
@@ -0,0 +1,261 @@
+"""
+contacts.py
+Normalized phone/email index: one candidate_contacts row per contact.
+
+candidates.phones / candidates.emails arrive as JSON text, Postgres arrays,
+comma-separated strings or Excel floats ("9876543210.0"). The DB function
+candidate_contact_keys() splits and normalizes them, and an AFTER INSERT/UPDATE
+trigger on candidates keeps candidate_contacts in sync, so every write path
+(forms, imports, COPY) is covered. The Python functions below apply the same
+rules to search input and import rows, so lookups are btree equality / prefix
+matches on (kind, search_key):
+
+  phone  value = '+<cc><number>' (E.164-ish), search_key = national number
+  email  value = search_key = lower-cased address
+
+Schema + backfill are installed by migrations.py (migration 5).
+"""
+
+import re
+
+DEFAULT_COUNTRY_CODE = '91'
+PHONE = 'phone'
+EMAIL = 'email'
+
+# Separators seen in stored values: JSON/array punctuation, lists typed by hand.
+# Spaces are deliberately not separators ("+91 98765 43210" is one number).
+SPLIT_PATTERN = r'[;,|/\n\r\t\[\]{}"]+'
+EMAIL_PATTERN = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+
+_SPLIT_RE = re.compile(SPLIT_PATTERN)
+_EMAIL_RE = re.compile(EMAIL_PATTERN)
+_FLOAT_TAIL_RE = re.compile(r'\.0+$')
+_NON_DIGIT_RE = re.compile(r'\D')
+_LIKE_ESCAPE_RE = re.compile(r'([\\%_])')
+
+
+def split_contacts(value):
+    """Flatten any stored/imported phones or emails value into raw tokens."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        out = []
+        for v in value:
+            out.extend(split_contacts(v))
+        return out
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return [t.strip() for t in _SPLIT_RE.split(str(value)) if t.strip()]
+
+
+def normalize_phone(token):
+    """'+<digits>' or None. Mirrors contact_phone_norm() in SQL."""
+    digits = _NON_DIGIT_RE.sub('', _FLOAT_TAIL_RE.sub('', str(token or '').strip()))
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if len(digits) == 11 and digits.startswith('0'):
+        digits = digits[1:]
+    if len(digits) == 10:
+        digits = DEFAULT_COUNTRY_CODE + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return '+' + digits
+
+
+def phone_national(value):
+    """search_key for a normalized phone: the number without the default country code."""
+    cc = DEFAULT_COUNTRY_CODE
+    if value.startswith('+' + cc) and len(value) == 1 + len(cc) + 10:
+        return value[1 + len(cc):]
+    return value[1:]
+
+
+def normalize_email(token):
+    """Lower-cased address or None. Mirrors contact_email_norm() in SQL."""
+    s = str(token or '').strip().lower()
+    return s if _EMAIL_RE.match(s) else None
+
+
+def contact_keys(phones, emails):
+    """{(kind, value, search_key)} for one candidate; same result as candidate_contact_keys()."""
+    keys = set()
+    for t in split_contacts(phones):
+        v = normalize_phone(t)
+        if v:
+            keys.add((PHONE, v, phone_national(v)))
+    for t in split_contacts(emails):
+        v = normalize_email(t)
+        if v:
+            keys.add((EMAIL, v, v))
+    return keys
+
+
+# ---------- pandas (whole columns of an import) ----------
+def explode_contacts(series):
+    """split_contacts() for a pandas Series: one stripped token per row, indexed by source row."""
+    s = series.dropna()
+    if s.dtype.kind == 'f':
+        s = s.map(lambda v: str(int(v)) if v.is_integer() else str(v))
+    tokens = s.astype(str).str.split(SPLIT_PATTERN, regex=True).explode().str.strip()
+    return tokens[tokens.notna() & tokens.ne('')]
+
+
+def normalize_phone_series(tokens):
+    """normalize_phone() over a Series of tokens; NaN where the token isn't a phone."""
+    digits = tokens.str.replace(r'\.0+$|\D', '', regex=True)
+    digits = digits.where(~digits.str.startswith('00'), digits.str[2:])
+    digits = digits.where(~((digits.str.len() == 11) & digits.str.startswith('0')), digits.str[1:])
+    digits = digits.where(digits.str.len() != 10, DEFAULT_COUNTRY_CODE + digits)
+    n = digits.str.len()
+    return ('+' + digits).where((n >= 8) & (n <= 15))
+
+
+def normalize_email_series(tokens):
+    """normalize_email() over a Series of tokens; NaN where the token isn't an address."""
+    s = tokens.str.strip().str.lower()
+    return s.where(s.str.match(EMAIL_PATTERN))
+
+
+# ---------- search ----------
+def phone_search_key(query):
+    """Key prefix for a (possibly partial) phone typed into a filter box; '' if no digits."""
+    s = str(query or '').strip()
+    full = normalize_phone(s)
+    digits = _NON_DIGIT_RE.sub('', _FLOAT_TAIL_RE.sub('', s))
+    if full and len(digits) >= 10:
+        return phone_national(full)
+    if s.startswith('+') and digits.startswith(DEFAULT_COUNTRY_CODE):
+        digits = digits[len(DEFAULT_COUNTRY_CODE):]
+    return digits.lstrip('0')
+
+
+def email_search_key(query):
+    return str(query or '').strip().lower()
+
+
+def _like_prefix(key):
+    return _LIKE_ESCAPE_RE.sub(r'\\\1', key) + '%'
+
+
+def filter_sql(kind, query, id_col='c.id'):
+    """(sql, params) keeping candidates that have a contact of `kind` starting with `query`.
+
+    A full number/address is an exact match on the same index a prefix uses.
+    """
+    key = phone_search_key(query) if kind == PHONE else email_search_key(query)
+    if not key:
+        return 'FALSE', []
+    return ("%s IN (SELECT candidate_id FROM candidate_contacts WHERE kind = %%s AND search_key LIKE %%s)" % id_col,
+            [kind, _like_prefix(key)])
+
+
+def lookup(cur, keys, with_requirement=False):
+    """Existing candidates per contact, in one round trip.
+
+    `keys` is an iterable of (kind, search_key); returns {(kind, search_key): [candidate_id, ...]},
+    or [(candidate_id, requirement_id), ...] per key with `with_requirement`.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    cur.execute("""
+        SELECT cc.kind, cc.search_key, cc.candidate_id%s
+        FROM candidate_contacts cc
+        JOIN unnest(%%s::text[], %%s::text[]) AS k(kind, search_key)
+          ON cc.kind = k.kind AND cc.search_key = k.search_key
+        %s
+        ORDER BY cc.candidate_id
+    """ % ((', c.requirement_id', 'JOIN candidates c ON c.id = cc.candidate_id') if with_requirement else ('', '')),
+        ([k for k, _ in keys], [s for _, s in keys]))
+    out = {}
+    for row in cur.fetchall():
+        if isinstance(row, dict):
+            row = (row['kind'], row['search_key'], row['candidate_id'], row.get('requirement_id'))
+        kind, key, cid = row[:3]
+        out.setdefault((kind, key), []).append((cid, row[3]) if with_requirement else cid)
+    return out
+
+
+# ---------- schema ----------
+SCHEMA_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS candidate_contacts (
+        candidate_id BIGINT NOT NULL REFERENCES candidates(id) ON DELETE CASCADE,
+        kind TEXT NOT NULL,
+        value TEXT NOT NULL,
+        search_key TEXT NOT NULL,
+        PRIMARY KEY (candidate_id, kind, value)
+    )
+    """,
+    r"""
+    CREATE OR REPLACE FUNCTION contact_phone_norm(token text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $fn$
+    SELECT CASE WHEN length(d) BETWEEN 8 AND 15 THEN '+' || d END
+    FROM (SELECT CASE WHEN length(d) = 10 THEN '%(cc)s' || d ELSE d END AS d
+          FROM (SELECT CASE WHEN length(d) = 11 AND left(d, 1) = '0' THEN substr(d, 2) ELSE d END AS d
+                FROM (SELECT CASE WHEN left(d, 2) = '00' THEN substr(d, 3) ELSE d END AS d
+                      FROM (SELECT regexp_replace(regexp_replace(btrim(COALESCE(token, '')), '\.0+$', ''),
+                                                  '\D', '', 'g') AS d) a) b) c) e
+    $fn$
+    """ % {'cc': DEFAULT_COUNTRY_CODE},
+    r"""
+    CREATE OR REPLACE FUNCTION contact_phone_national(value text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $fn$
+    SELECT CASE WHEN left(value, %(n)s) = '+%(cc)s' AND length(value) = %(len)s
+                THEN substr(value, %(n)s + 1) ELSE substr(value, 2) END
+    $fn$
+    """ % {'cc': DEFAULT_COUNTRY_CODE, 'n': len(DEFAULT_COUNTRY_CODE) + 1,
+           'len': len(DEFAULT_COUNTRY_CODE) + 11},
+    """
+    CREATE OR REPLACE FUNCTION contact_email_norm(token text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $fn$
+    SELECT CASE WHEN s ~ '%s' THEN s END
+    FROM (SELECT lower(btrim(COALESCE(token, ''))) AS s) t
+    $fn$
+    """ % EMAIL_PATTERN,
+    """
+    CREATE OR REPLACE FUNCTION candidate_contact_keys(phones text, emails text)
+    RETURNS TABLE (kind text, value text, search_key text)
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $fn$
+    SELECT '%(phone)s', v, contact_phone_national(v)
+    FROM (SELECT contact_phone_norm(t) AS v FROM regexp_split_to_table(COALESCE(phones, ''), '%(split)s') t) p
+    WHERE v IS NOT NULL
+    UNION
+    SELECT '%(email)s', v, v
+    FROM (SELECT contact_email_norm(t) AS v FROM regexp_split_to_table(COALESCE(emails, ''), '%(split)s') t) e
+    WHERE v IS NOT NULL
+    $fn$
+    """ % {'phone': PHONE, 'email': EMAIL, 'split': SPLIT_PATTERN},
+    """
+    CREATE OR REPLACE FUNCTION candidates_sync_contacts() RETURNS trigger
+    LANGUAGE plpgsql AS $fn$
+    BEGIN
+        IF TG_OP = 'UPDATE' THEN
+            IF NEW.phones::text IS NOT DISTINCT FROM OLD.phones::text
+               AND NEW.emails::text IS NOT DISTINCT FROM OLD.emails::text THEN
+                RETURN NULL;
+            END IF;
+            DELETE FROM candidate_contacts WHERE candidate_id = NEW.id;
+        END IF;
+        INSERT INTO candidate_contacts (candidate_id, kind, value, search_key)
+        SELECT NEW.id, k.kind, k.value, k.search_key
+        FROM candidate_contact_keys(NEW.phones::text, NEW.emails::text) k
+        ON CONFLICT DO NOTHING;
+        RETURN NULL;
+    END
+    $fn$
+    """,
+    "DROP TRIGGER IF EXISTS trg_candidates_sync_contacts ON candidates",
+    """
+    CREATE TRIGGER trg_candidates_sync_contacts
+        AFTER INSERT OR UPDATE OF phones, emails ON candidates
+        FOR EACH ROW EXECUTE FUNCTION candidates_sync_contacts()
+    """,
+)
+
+BACKFILL_SQL = """
+    INSERT INTO candidate_contacts (candidate_id, kind, value, search_key)
+    SELECT c.id, k.kind, k.value, k.search_key
+    FROM candidates c, LATERAL candidate_contact_keys(c.phones::text, c.emails::text) k
+    ON CONFLICT DO NOTHING
+"""
@@ -12,37 +12,22 @@
 from flask import Blueprint, session, jsonify, request, url_for, current_app
 from flask import Blueprint, session, request 
 from contextlib import contextmanager
-import psycopg2
-import psycopg2.extras
 import logging
 import json
 import os
 import pathlib
+import db_pool
+import pipeline_stage
 
 
 
 # === Canonical "Final Stage" matching logic (single source of truth) ===
-# Use FINAL_STAGE_EXACT for normalized exact comparisons and FINAL_STAGE_ILIKE for common variants.
-FINAL_STAGE_EXACT = ('r3 fbp', 'hr round', 'r3 scheduled', 'offered')
-FINAL_STAGE_ILIKE = [
-    '%R3 FBP%', '%R3-FBP%', '%R3_FBP%',
-    '%HR Round%', '%R3 Scheduled%', '%Offered%'
-]
-
-def final_stage_condition_sql(col_name='c.profile_status'):
+# Stages live in pipeline_stage.py and are persisted on candidates.pipeline_stage.
+def final_stage_condition_sql(stage_col='c.pipeline_stage'):
     """Return (sql_snippet, params_list) to match canonical final-stage statuses.
-    col_name should be a qualified column name like 'c.profile_status' or "COALESCE(NULLIF(c.profile_status,''), '')".
+    stage_col should be a qualified column name like 'c.pipeline_stage'.
     """
-    exact_placeholders = ','.join(['%s'] * len(FINAL_STAGE_EXACT))
-    ilike_placeholders = ','.join(['%s'] * len(FINAL_STAGE_ILIKE))
-    snippet = (
-        "("
-        + f"lower(trim({col_name})) IN ({exact_placeholders})"
-        + f" OR {col_name} ILIKE ANY (ARRAY[{ilike_placeholders}])"
-        + ")"
-    )
-    params = list(FINAL_STAGE_EXACT) + list(FINAL_STAGE_ILIKE)
-    return snippet, params
+    return pipeline_stage.stage_filter_sql(pipeline_stage.FINAL_STAGES, stage_col)
 
 # === end canonical final-stage ===
 
@@ -57,22 +42,12 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 
 @contextmanager
 def get_db_cursor():
-    conn = None
-    cur = None
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        yield conn, cur
+        with db_pool.cursor() as (conn, cur):
+            yield conn, cur
     except Exception:
         logger.exception("DB connection or query error")
         raise
-    finally:
-        if cur:
-            try: cur.close()
-            except Exception: pass
-        if conn:
-            try: conn.close()
-            except Exception: pass
 
 
 # ========= Shared Layout storage (admin-controlled, global for all users) =========
@@ -144,21 +119,156 @@ def dashboard_layout():
 
 
 # --- JSON for dashboard (requirements + candidates) ---
+RECRUITER_EXPR = "COALESCE(NULLIF(TRIM(c.added_by), ''), 'Unknown')"
+
+# Timestamp column used by the recent_fbp KPI. Schema doesn't change at runtime,
+# so information_schema is probed once per process instead of on every dashboard load.
+_FBP_TS_COL = None
+_FBP_TS_COL_PROBED = False
+
+_KPI_SAVEPOINT = 'dashboard_kpi_sp'
+
+
+def _fbp_ts_col(cur):
+    global _FBP_TS_COL, _FBP_TS_COL_PROBED
+    if not _FBP_TS_COL_PROBED:
+        cur.execute("SAVEPOINT " + _KPI_SAVEPOINT)
+        try:
+            cur.execute("""SELECT column_name FROM information_schema.columns
+                           WHERE table_schema = 'public' AND table_name = 'candidates'
+                           AND column_name IN ('profile_status_changed_at', 'profile_status_changed', 'status_changed_at', 'profile_status_date')""")
+            row = cur.fetchone()
+            _FBP_TS_COL = ('c.' + row['column_name']) if row else None
+            _FBP_TS_COL_PROBED = True
+        except Exception:
+            logger.exception("Could not probe candidates status timestamp column")
+            cur.execute("ROLLBACK TO SAVEPOINT " + _KPI_SAVEPOINT)
+            _FBP_TS_COL = None
+        cur.execute("RELEASE SAVEPOINT " + _KPI_SAVEPOINT)
+    return _FBP_TS_COL
+
+
+def _candidate_kpi_sql(base_where, ts_col, stage_kpis=True):
+    """Single scan over candidates/requirements returning every candidate KPI.
+
+    GROUPING SETS ((recruiter), ()) yields one row per recruiter plus a grand-total row
+    (is_total = 1); every KPI is a COUNT(*) FILTER over the same rows, with conditions
+    identical to /dashboard_drilldown. Status KPIs are equality checks on the persisted
+    canonical pipeline_stage (see pipeline_stage.py). stage_kpis=False leaves out every
+    pipeline_stage KPI (r2_select / final_stage / r3_rejected / recent_fbp), so the
+    fallback scan also works before migration 6 has added the column.
+    Returns (sql, params) where params precede base_where's params.
+    """
+    stage_sql, params = "", []
+    if stage_kpis:
+        final_sql, final_params = final_stage_condition_sql('c.pipeline_stage')
+        fbp_sql, fbp_params = pipeline_stage.stage_filter_sql(pipeline_stage.FBP_STAGES)
+        date_cond = f"{ts_col} <= (NOW() - INTERVAL '3 days')" if ts_col else \
+            "c.added_date <= (NOW() - INTERVAL '3 days')"
+        stage_sql = f"""
+            COUNT(*) FILTER (WHERE c.pipeline_stage = %s) AS r2_select,
+            COUNT(*) FILTER (WHERE {final_sql}) AS final_stage,
+            COUNT(*) FILTER (WHERE c.pipeline_stage = %s) AS r3_rejected,
+            COUNT(*) FILTER (WHERE {fbp_sql} AND {date_cond}) AS recent_fbp,"""
+        params += ['R2 Select'] + list(final_params) + ['R3 Rejected'] + list(fbp_params)
+    sql = f"""
+        SELECT
+            GROUPING({RECRUITER_EXPR}) AS is_total,
+            {RECRUITER_EXPR} AS username,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE c.added_date >= CURRENT_DATE - INTERVAL '30 days') AS new_30,
+            COUNT(*) FILTER (WHERE c.interview_date::date = CURRENT_DATE) AS interviews_today,
+            COUNT(*) FILTER (WHERE c.interview_date::date = CURRENT_DATE + INTERVAL '1 day') AS interviews_tomorrow,{stage_sql}
+            COUNT(*) FILTER (WHERE c.added_date::date = CURRENT_DATE) AS added_today,
+            COUNT(*) FILTER (WHERE c.added_date::date = CURRENT_DATE - INTERVAL '1 day') AS added_yesterday
+        FROM candidates c
+        LEFT JOIN requirements r ON r.id = c.requirement_id
+        {base_where}
+        GROUP BY GROUPING SETS (({RECRUITER_EXPR}), ())
+    """
+    return sql, params
+
+
+def requirement_kpis(cur):
+    """Requirements: total, per-status and per-assignee counts in one scan."""
+    cur.execute("""
+        SELECT GROUPING(status) AS g_status, GROUPING(assigned_to) AS g_assigned,
+               status, assigned_to, COUNT(*) AS cnt
+        FROM requirements
+        GROUP BY GROUPING SETS ((status), (assigned_to), ())
+    """)
+    total_req = 0
+    status_counts = []
+    per_recruiter_req = []
+    for row in cur.fetchall() or []:
+        if row['g_status'] and row['g_assigned']:
+            total_req = row['cnt']
+        elif not row['g_status']:
+            status_counts.append({'status': row['status'], 'cnt': row['cnt']})
+        else:
+            per_recruiter_req.append({'username': row['assigned_to'], 'cnt': row['cnt']})
+    return {
+        'total_requirements': total_req,
+        'status_counts': status_counts,
+        'per_recruiter_requirements': per_recruiter_req,
+    }
+
+
+def candidate_kpis(cur, base_where="", base_params=(), ts_col=None):
+    """Candidate KPI tiles and per-recruiter charts, keyed as in /dashboard_data_plus.
+
+    As before the single-scan rewrite, a failure in the stage KPIs (final stage,
+    R3 rejected, recent FBP) shows those tiles as 0 instead of failing the dashboard.
+    """
+    cur.execute("SAVEPOINT " + _KPI_SAVEPOINT)
+    try:
+        sql, kpi_params = _candidate_kpi_sql(base_where, ts_col)
+        cur.execute(sql, tuple(kpi_params + list(base_params)))
+    except Exception:
+        logger.exception("Error computing dashboard stage KPIs; showing them as 0")
+        cur.execute("ROLLBACK TO SAVEPOINT " + _KPI_SAVEPOINT)
+        sql, kpi_params = _candidate_kpi_sql(base_where, ts_col, stage_kpis=False)
+        cur.execute(sql, tuple(kpi_params + list(base_params)))
+    kpi_rows = cur.fetchall() or []
+    cur.execute("RELEASE SAVEPOINT " + _KPI_SAVEPOINT)
+
+    totals = {}
+    per_recruiter_cand = []
+    per_recruiter_cand_today = []
+    per_recruiter_cand_yesterday = []
+    for row in kpi_rows:
+        if row['is_total']:
+            totals = row
+            continue
+        username = row['username']
+        per_recruiter_cand.append({'username': username, 'cnt': row['total']})
+        if row['added_today']:
+            per_recruiter_cand_today.append({'username': username, 'cnt': row['added_today']})
+        if row['added_yesterday']:
+            per_recruiter_cand_yesterday.append({'username': username, 'cnt': row['added_yesterday']})
+
+    return {
+        'cand_total': totals.get('total', 0),
+        'cand_new_30': totals.get('new_30', 0),
+        'interviews_today': totals.get('interviews_today', 0),
+        'interviews_tomorrow': totals.get('interviews_tomorrow', 0),
+        'r2_select_total': totals.get('r2_select', 0),
+        'final_stage_candidates': totals.get('final_stage', 0),
+        'r3_rejected': totals.get('r3_rejected', 0),
+        'recent_fbp': totals.get('recent_fbp', 0),
+        'per_recruiter_candidates': per_recruiter_cand,
+        'per_recruiter_candidates_today': per_recruiter_cand_today,
+        'per_recruiter_candidates_yesterday': per_recruiter_cand_yesterday,
+    }
+
+
 @dashboard_bp.route('/dashboard_data_plus')
 def dashboard_data_plus():
     if 'user_id' not in session:
         return jsonify({'error': 'unauthenticated'}), 401
     try:
         with get_db_cursor() as (conn, cur):
-            # Requirements
-            cur.execute("SELECT COUNT(*) as total FROM requirements")
-            total_req = (cur.fetchone() or {}).get('total', 0)
-
-            cur.execute("SELECT status, COUNT(*) as cnt FROM requirements GROUP BY status")
-            status_counts = cur.fetchall() or []
-
-            cur.execute("SELECT assigned_to AS username, COUNT(*) as cnt FROM requirements GROUP BY assigned_to")
-            per_recruiter_req = cur.fetchall() or []
+            data = requirement_kpis(cur)
 
             # Candidates (respect recruiter permission)
             me = (session.get('username') or '').strip()
@@ -170,168 +280,16 @@ def dashboard_data_plus():
                 base_where = " WHERE r.assigned_to ILIKE %s "
                 base_params = [f"%{me}%"]
 
-            # KPIs
-            cur.execute(f"""
-                SELECT COUNT(*) AS total
-                FROM candidates c
-                LEFT JOIN requirements r ON r.id = c.requirement_id
-                {base_where}
-            """, tuple(base_params))
-            cand_total = (cur.fetchone() or {}).get('total', 0)
-
-            cur.execute(f"""
-                SELECT COUNT(*) AS total
-                FROM candidates c
-                LEFT JOIN requirements r ON r.id = c.requirement_id
-                {base_where + (' AND ' if base_where else ' WHERE ')} c.added_date >= CURRENT_DATE - INTERVAL '30 days'
-            """, tuple(base_params))
-            cand_new_30 = (cur.fetchone() or {}).get('total', 0)
-
-            cur.execute(f"""
-                SELECT COUNT(*) AS total
-                FROM candidates c
-                LEFT JOIN requirements r ON r.id = c.requirement_id
-                {base_where + (' AND ' if base_where else ' WHERE ')} c.interview_date::date = CURRENT_DATE
-            """, tuple(base_params))
-            interviews_today = (cur.fetchone() or {}).get('total', 0)
-
-            cur.execute(f"""
-                SELECT COUNT(*) AS total
-                FROM candidates c
-                LEFT JOIN requirements r ON r.id = c.requirement_id
-                {base_where + (' AND ' if base_where else ' WHERE ')} c.interview_date::date = CURRENT_DATE + INTERVAL '1 day'
-            """, tuple(base_params))
-            interviews_tomorrow = (cur.fetchone() or {}).get('total', 0)
-
-            cur.execute(f"""
-                SELECT COUNT(*) AS total
-                FROM candidates c
-                LEFT JOIN requirements r ON r.id = c.requirement_id
-                {base_where + (' AND ' if base_where else ' WHERE ')} c.profile_status = 'R2 Select'
-            """, tuple(base_params))
-            r2_select_total = (cur.fetchone() or {}).get('total', 0)
-
-            # --- Added KPI aggregates (robust, parameterized, and recruiter-scoped) ---
-            try:
-                # Build base SQL prefix and param list to reuse
-                sql_prefix = "SELECT COUNT(*) AS total FROM candidates c LEFT JOIN requirements r ON r.id = c.requirement_id "
-                # compute condition prefix: if base_where already includes WHERE, we need to append AND; otherwise start WHERE
-                cond_prefix = (base_where + " AND ") if (base_where and base_where.strip()) else " WHERE "
-
-                # Final stage candidates — use canonical condition helper
-                try:
-                    cond_sql, cond_params = final_stage_condition_sql('c.profile_status')
-                    sql = sql_prefix + cond_prefix + cond_sql
-                    params = list(base_params) + cond_params
-                    cur.execute(sql, tuple(params))
-                    final_stage_candidates = (cur.fetchone() or {}).get('total', 0)
-                except Exception as _kpi_err:
-                    final_stage_candidates = 0
-                    try:
-                        current_app.logger.exception("Error computing final_stage_candidates: %s", _kpi_err)
-                    except Exception:
-                        pass
-# R3 rejected
-                sql = sql_prefix + cond_prefix + "(" + \
-                      "lower(trim(c.profile_status)) = 'r3 rejected' OR c.profile_status ILIKE %s" + \
-                      ")"
-                params = list(base_params) + ['%R3 Rejected%']
-                cur.execute(sql, tuple(params))
-                r3_rejected = (cur.fetchone() or {}).get('total', 0)
-
-                # Recent FBP: R1/R2/R3 FBP within last 3 days
-
-                # recent_fbp: candidates currently in FBP state for more than 3 days.
-                try:
-                    ts_col = None
-                    cur.execute("""SELECT column_name FROM information_schema.columns
-                                   WHERE table_schema = 'public' AND table_name = 'candidates'
-                                   AND column_name IN ('profile_status_changed_at', 'profile_status_changed', 'status_changed_at', 'profile_status_date')""")
-                    row = cur.fetchone()
-                    if row:
-                        ts_col = 'c.' + row['column_name']
-                except Exception:
-                    ts_col = None
-
-                if ts_col:
-                    date_cond = f"({{}} <= (NOW() - INTERVAL '3 days'))".format(ts_col)
-                else:
-                    date_cond = "(c.added_date <= (NOW() - INTERVAL '3 days'))"
-
-                sql = sql_prefix + cond_prefix + ("(" +
-                      "lower(trim(c.profile_status)) IN ('r1 fbp','r2 fbp','r3 fbp') " +
-                      "OR c.profile_status ILIKE ANY (ARRAY[%s,%s,%s,%s,%s,%s])" +
-                      ") AND " + date_cond)
-                params = list(base_params) + ['%R1 FBP%','%R2 FBP%','%R3 FBP%','%R1-FBP%','%R2-FBP%','%R3-FBP%']
-                cur.execute(sql, tuple(params))
-                recent_fbp = (cur.fetchone() or {}).get('total', 0)
-
-            except Exception as _kpi_err:
-                # ensure variables exist even on failure
-                final_stage_candidates = 0
-                r3_rejected = 0
-                recent_fbp = 0
-                try:
-                    current_app.logger.exception("Error computing dashboard KPIs: %s", _kpi_err)
-                except Exception:
-                    pass
+            data.update(candidate_kpis(cur, base_where, base_params, _fbp_ts_col(cur)))
 
             # add debug log
             try:
                 current_app.logger.debug("Computed dashboard KPIs: final_stage=%s r3_rejected=%s recent_fbp=%s",
-                                         final_stage_candidates, r3_rejected, recent_fbp)
+                                         data['final_stage_candidates'], data['r3_rejected'], data['recent_fbp'])
             except Exception:
                 pass
 
-
-
-            # Candidates per recruiter (all-time)
-            cur.execute(f"""
-                SELECT COALESCE(NULLIF(TRIM(c.added_by), ''), 'Unknown') AS username, COUNT(*) AS cnt
-                FROM candidates c
-                LEFT JOIN requirements r ON r.id = c.requirement_id
-                {base_where}
-                GROUP BY COALESCE(NULLIF(TRIM(c.added_by), ''), 'Unknown')
-            """, tuple(base_params))
-            per_recruiter_cand = cur.fetchall() or []
-
-            # Today per recruiter
-            cur.execute(f"""
-                SELECT COALESCE(NULLIF(TRIM(c.added_by), ''), 'Unknown') AS username, COUNT(*) AS cnt
-                FROM candidates c
-                LEFT JOIN requirements r ON r.id = c.requirement_id
-                {base_where + (' AND ' if base_where else ' WHERE ')} c.added_date::date = CURRENT_DATE
-                GROUP BY COALESCE(NULLIF(TRIM(c.added_by), ''), 'Unknown')
-            """, tuple(base_params))
-            per_recruiter_cand_today = cur.fetchall() or []
-
-            # Yesterday per recruiter
-            cur.execute(f"""
-                SELECT COALESCE(NULLIF(TRIM(c.added_by), ''), 'Unknown') AS username, COUNT(*) AS cnt
-                FROM candidates c
-                LEFT JOIN requirements r ON r.id = c.requirement_id
-                {base_where + (' AND ' if base_where else ' WHERE ')} c.added_date::date = CURRENT_DATE - INTERVAL '1 day'
-                GROUP BY COALESCE(NULLIF(TRIM(c.added_by), ''), 'Unknown')
-            """, tuple(base_params))
-            per_recruiter_cand_yesterday = cur.fetchall() or []
-
-            return jsonify({
-
-                'total_requirements': total_req,
-                'status_counts': [dict(r) for r in status_counts],
-                'per_recruiter_requirements': [dict(r) for r in per_recruiter_req],
-                'cand_total': cand_total,
-                'cand_new_30': cand_new_30,
-                'interviews_today': interviews_today,
-                'interviews_tomorrow': interviews_tomorrow,
-                'r2_select_total': r2_select_total,
-                'final_stage_candidates': final_stage_candidates,
-                'r3_rejected': r3_rejected,
-                'recent_fbp': recent_fbp,
-                'per_recruiter_candidates': [dict(r) for r in per_recruiter_cand],
-                'per_recruiter_candidates_today': [dict(r) for r in per_recruiter_cand_today],
-                'per_recruiter_candidates_yesterday': [dict(r) for r in per_recruiter_cand_yesterday],
-})
+            return jsonify(data)
     except Exception:
         logger.exception("Error preparing extended dashboard data")
         return jsonify({'error': 'server error'}), 500
@@ -374,16 +332,20 @@ def dashboard_drilldown():
             elif scope == 'interviews_tomorrow':
                 where.append("c.interview_date::date = CURRENT_DATE + INTERVAL '1 day'")
             elif scope == 'r2_select':
-                where.append("c.profile_status = 'R2 Select'")
+                where.append("c.pipeline_stage = %s")
+                params.append('R2 Select')
             elif scope == 'combined_offer_pipeline':
                 # Use canonical condition (same as KPI) so counts match exactly
-                cond_sql, cond_params = final_stage_condition_sql('c.profile_status')
+                cond_sql, cond_params = final_stage_condition_sql('c.pipeline_stage')
                 where.append(cond_sql)
                 params.extend(cond_params)
             elif scope == 'r3_rejected':
-                where.append("c.profile_status = 'R3 Rejected'")
+                where.append("c.pipeline_stage = %s")
+                params.append('R3 Rejected')
             elif scope == 'recent_fbp':
-              where.append("c.profile_status IN ('R1 FBP', 'R2 FBP' , 'R3 FBP') AND c.added_date <= CURRENT_DATE - INTERVAL '3 days'")
+                fbp_sql, fbp_params = pipeline_stage.stage_filter_sql(pipeline_stage.FBP_STAGES)
+                where.append(fbp_sql + " AND c.added_date <= CURRENT_DATE - INTERVAL '3 days'")
+                params.extend(fbp_params)
             elif scope == 'by_recruiter' and recruiter:
                 where.append("COALESCE(NULLIF(TRIM(c.added_by), ''), 'Unknown') = %s")
                 params.append(recruiter)
@@ -615,54 +577,20 @@ def dashboard_requirement_pipeline_grid():
                 r.id AS req_id,
                 r.requirement_name,
                 r.client_name,
-                COALESCE(NULLIF(TRIM(c.profile_status),''), 'Others') AS profile_status,
+                c.pipeline_stage,
+                CASE WHEN c.pipeline_stage IS NULL THEN c.profile_status END AS raw_status,
                 COUNT(c.id) AS cnt
             FROM requirements r
             LEFT JOIN candidates c ON c.requirement_id = r.id
             {where_sql}
-            GROUP BY r.id, r.requirement_name, r.client_name,
-                     COALESCE(NULLIF(TRIM(c.profile_status),''), 'Others')
+            GROUP BY r.id, r.requirement_name, r.client_name, 4, 5
             ORDER BY r.requirement_name
         """
         with get_db_cursor() as (conn, cur):
             cur.execute(sql, tuple(params))
             rows = cur.fetchall() or []
 
-        # Canonical buckets + patterns
-        CANON = [
-            'Profile shared with client','Review Pending by client','R1 to be schedule','R1 scheduled',
-            'R2 Pending','R2 scheduled','R2 FBP','R2 Select','R3 Pending','R3 scheduled','R3 FBP',
-            'HR Round','Offered','R1 FBP','R1 Rejected','R2 Rejected','R3 Rejected','Others'
-        ]
-        import re as _re
-        PATTERNS = {
-            'Profile shared with client':[r'profile\s*shared',r'shared.*client'],
-            'Review Pending by client':[r'review\s*pending.*client',r'pending.*client'],
-            'R1 to be schedule':[r'\br?1\b.*to\s*be.*sched'],
-            'R1 scheduled':[r'\br?1\b.*sched'],
-            'R2 Pending':[r'\br?2\b.*pending'],
-            'R2 scheduled':[r'\br?2\b.*sched'],
-            'R2 FBP':[r'\br?2\b.*fbp'],
-            'R2 Select':[r'\br?2\b.*select'],
-            'R3 Pending':[r'\br?3\b.*pending'],
-            'R3 scheduled':[r'\br?3\b.*sched'],
-            'R3 FBP':[r'\br?3\b.*fbp'],
-            'HR Round':[r'hr\s*round',r'\bhr\b'],
-            'Offered':[r'offered?',r'\boffer\b'],
-            'R1 FBP':[r'\br?1\b.*fbp'],
-            'R1 Rejected':[r'\br?1\b.*reject'],
-            'R2 Rejected':[r'\br?2\b.*reject'],
-            'R3 Rejected':[r'\br?3\b.*reject'],
-        }
-        def canonize(raw):
-            t = (raw or '').strip().lower()
-            for key,pats in PATTERNS.items():
-                for pat in pats:
-                    if _re.search(pat,t):
-                        return key
-            return 'Others'
-
-        buckets = CANON[:]
+        buckets = pipeline_stage.PIPELINE_STAGES[:]
         by_req = {}
         for r in rows:
             rid = r['req_id']
@@ -672,7 +600,10 @@ def dashboard_requirement_pipeline_grid():
                     'client_name': r['client_name'],
                     'counts': {k:0 for k in buckets}
                 }
-            k = canonize(r['profile_status'])
+            # raw_status is only set for rows the backfill hasn't reached yet
+            k = r['pipeline_stage'] or pipeline_stage.CLASSIFIER.classify(r['raw_status'])
+            if k not in by_req[rid]['counts']:
+                k = pipeline_stage.OTHERS
             by_req[rid]['counts'][k] += int(r['cnt'])
 
         def esc(v):
@@ -781,28 +712,6 @@ def dashboard_requirement_pipeline_table():
         if not req_id:
             return "<div class='p-3'>Missing requirement id.</div>", 400
 
-        # token map aligns with the grid
-        TOKENS = {
-            'Profile shared with client': ['profile','shared','client'],
-            'Review Pending by client':  ['review','pending','client'],
-            'R1 to be schedule':         ['r1','to','be','sched'],
-            'R1 scheduled':              ['r1','sched'],
-            'R2 Pending':                ['r2','pending'],
-            'R2 scheduled':              ['r2','sched'],
-            'R2 FBP':                    ['r2','fbp'],
-            'R2 Select':                 ['r2','select'],
-            'R3 Pending':                ['r3','pending'],
-            'R3 scheduled':              ['r3','sched'],
-            'R3 FBP':                    ['r3','fbp'],
-            'HR Round':                  ['hr'],
-            'Offered':                   ['offer'],
-            'R1 FBP':                    ['r1','fbp'],
-            'R1 Rejected':               ['r1','reject'],
-            'R2 Rejected':               ['r2','reject'],
-            'R3 Rejected':               ['r3','reject'],
-            'Others':                    None,
-        }
-
         me = (session.get('username') or '').strip()
         is_recruiter = (session.get('role') == 'recruiter')
 
@@ -811,14 +720,12 @@ def dashboard_requirement_pipeline_table():
         if is_recruiter and me:
             where.append("r.assigned_to ILIKE %s")
             params.append(f"%{me}%")
-        tokens = TOKENS.get(canon)
-        if tokens:
-            ors = []
-            for t in tokens:
-                ors.append("LOWER(c.profile_status) LIKE %s")
-                params.append('%' + t + '%')
-            where.append("(" + " AND ".join(ors) + ")")
-        elif canon and canon != 'Others':
+        if canon in pipeline_stage.PIPELINE_STAGES:
+            # same bucket the grid counted (persisted canonical stage)
+            cond_sql, cond_params = pipeline_stage.CLASSIFIER.stage_condition_sql(canon)
+            where.append(cond_sql)
+            params.extend(cond_params)
+        elif canon:
             where.append("LOWER(COALESCE(NULLIF(TRIM(c.profile_status),''),'others')) = %s")
             params.append(canon.lower())
 
@@ -926,54 +833,24 @@ def dashboard_recruiter_pipeline_grid():
             cur.execute("""
                 SELECT
                     COALESCE(NULLIF(TRIM(c.added_by),''), 'Unknown') AS recruiter_name,
-                    COALESCE(NULLIF(TRIM(c.profile_status),''), 'Others') AS profile_status,
+                    c.pipeline_stage,
+                    CASE WHEN c.pipeline_stage IS NULL THEN c.profile_status END AS raw_status,
                     COUNT(*)::int AS cnt
                 FROM candidates c
-                GROUP BY 1, 2
+                GROUP BY 1, 2, 3
                 ORDER BY 1
             """)
             rows = cur.fetchall() or []
 
-        CANON = [
-            'Profile shared with client','Review Pending by client','R1 to be schedule','R1 scheduled',
-            'R2 Pending','R2 scheduled','R2 FBP','R2 Select','R3 Pending','R3 scheduled','R3 FBP',
-            'HR Round','Offered','R1 FBP','R1 Rejected','R2 Rejected','R3 Rejected','Others'
-        ]
-        import re as _re
-        PATTERNS = {
-            'Profile shared with client':[r'profile\s*shared',r'shared.*client'],
-            'Review Pending by client':[r'review\s*pending.*client',r'pending.*client'],
-            'R1 to be schedule':[r'\br?1\b.*to\s*be.*sched'],
-            'R1 scheduled':[r'\br?1\b.*sched'],
-            'R2 Pending':[r'\br?2\b.*pending'],
-            'R2 scheduled':[r'\br?2\b.*sched'],
-            'R2 FBP':[r'\br?2\b.*fbp'],
-            'R2 Select':[r'\br?2\b.*select'],
-            'R3 Pending':[r'\br?3\b.*pending'],
-            'R3 scheduled':[r'\br?3\b.*sched'],
-            'R3 FBP':[r'\br?3\b.*fbp'],
-            'HR Round':[r'hr\s*round',r'\bhr\b'],
-            'Offered':[r'offered?',r'\boffer\b'],
-            'R1 FBP':[r'\br?1\b.*fbp'],
-            'R1 Rejected':[r'\br?1\b.*reject'],
-            'R2 Rejected':[r'\br?2\b.*reject'],
-            'R3 Rejected':[r'\br?3\b.*reject'],
-        }
-        def canonize(raw):
-            t = (raw or '').strip().lower()
-            for key,pats in PATTERNS.items():
-                for pat in pats:
-                    if _re.search(pat,t):
-                        return key
-            return 'Others'
-
-        buckets = CANON[:]
+        buckets = pipeline_stage.PIPELINE_STAGES[:]
         by_rec = {}
         for r in rows:
             rec = r['recruiter_name'] or 'Unknown'
             if rec not in by_rec:
                 by_rec[rec] = { 'counts': {k:0 for k in buckets} }
-            k = canonize(r['profile_status'])
+            k = r['pipeline_stage'] or pipeline_stage.CLASSIFIER.classify(r['raw_status'])
+            if k not in by_rec[rec]['counts']:
+                k = pipeline_stage.OTHERS
             by_rec[rec]['counts'][k] += int(r['cnt'])
 
         def esc(v):
@@ -1018,41 +895,10 @@ def dashboard_recruiter_pipeline_table():
         if not recruiter or not canon:
             return "<div class='p-3'>Missing recruiter or status.</div>", 400
 
-        TOKENS = {
-            'Profile shared with client': ['profile','shared','client'],
-            'Review Pending by client':  ['review','pending','client'],
-            'R1 to be schedule':         ['r1','to','be','sched'],
-            'R1 scheduled':              ['r1','sched'],
-            'R2 Pending':                ['r2','pending'],
-            'R2 scheduled':              ['r2','sched'],
-            'R2 FBP':                    ['r2','fbp'],
-            'R2 Select':                 ['r2','select'],
-            'R3 Pending':                ['r3','pending'],
-            'R3 scheduled':              ['r3','sched'],
-            'R3 FBP':                    ['r3','fbp'],
-            'HR Round':                  ['hr'],
-            'Offered':                   ['offer'],
-            'R1 FBP':                    ['r1','fbp'],
-            'R1 Rejected':               ['r1','reject'],
-            'R2 Rejected':               ['r2','reject'],
-            'R3 Rejected':               ['r3','reject'],
-            'Others':                    []
-        }
-
-        tokens = TOKENS.get(canon, [])
-        where = ["COALESCE(NULLIF(TRIM(c.added_by),''), 'Unknown') = %s"]
-        params = [recruiter]
-
-        if tokens:
-            ors = []
-            for t in tokens:
-                ors.append("LOWER(COALESCE(c.profile_status,'')) LIKE %s")
-                params.append(f"%{t}%")
-            where.append("(" + " OR ".join(ors) + ")")
-        else:
-            where.append(r"""NOT (
-                LOWER(COALESCE(c.profile_status,'')) ~ '(profile\s*shared|shared.*client|review\s*pending.*client|pending.*client|\br?1\b.*sched|\br?1\b.*to\s*be.*sched|\br?2\b.*pending|\br?2\b.*sched|\br?2\b.*fbp|\br?2\b.*select|\br?3\b.*pending|\br?3\b.*sched|\br?3\b.*fbp|hr\s*round|\boffer\b|offered?|\br?1\b.*fbp|\br?1\b.*reject|\br?2\b.*reject|\br?3\b.*reject)'
-            )""")
+        # equality on the persisted canonical stage (indexed with the recruiter expression)
+        cond_sql, cond_params = pipeline_stage.CLASSIFIER.stage_condition_sql(canon)
+        where = ["COALESCE(NULLIF(TRIM(c.added_by),''), 'Unknown') = %s", cond_sql]
+        params = [recruiter] + cond_params
 
         sql = f"""
             SELECT
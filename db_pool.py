@@ -0,0 +1,442 @@
+"""
+db_pool.py
+Process-wide Postgres connection pool shared by every blueprint.
+
+Each gunicorn worker gets its own pool (created lazily on first use and
+re-created after a fork), so the TCP + TLS + auth handshake is paid once per
+connection instead of once per `get_db_cursor()` call.
+
+Tunables (env):
+  DB_POOL_MIN             connections opened eagerly on first use  (default 1)
+  DB_POOL_MAX             hard cap per worker process              (default 10)
+  DB_POOL_TIMEOUT         seconds to wait for a free connection    (default 30)
+  DB_POOL_MAX_LIFETIME    recycle connections older than this (s)  (default 1800)
+  DB_POOL_CHECK_IDLE      ping connections idle longer than this   (default 30)
+  DB_STATEMENT_TIMEOUT_MS per-connection statement_timeout, 0=off  (default 0)
+  DB_APPLICATION_NAME     application_name shown in pg_stat_activity
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+from flask import g, has_request_context
+
+from settings import env_int
+
+logger = logging.getLogger(__name__)
+
+
+def _load_db_conn_args():
+    """Prefer DATABASE_URL; fallback to DB_* vars (same precedence as main.DB_CONFIG)."""
+    dsn = os.getenv('DATABASE_URL')
+    if dsn:
+        return {'dsn': dsn}
+    return {
+        'dbname': os.getenv('DB_NAME', 'job_portal'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', '5432')),
+    }
+
+
+class ConnectionPool:
+    """Thread-safe pool with waiting, health checks and max connection lifetime."""
+
+    def __init__(self, conn_args, minconn=1, maxconn=10, timeout=30.0,
+                 max_lifetime=1800.0, check_idle=30.0, session_settings=None,
+                 application_name=None):
+        self.conn_args = dict(conn_args)
+        self.minconn = max(0, int(minconn))
+        self.maxconn = max(1, int(maxconn))
+        self.timeout = float(timeout)
+        self.max_lifetime = float(max_lifetime)
+        self.check_idle = float(check_idle)
+        self.session_settings = dict(session_settings or {})
+        self.application_name = application_name
+        self.pid = os.getpid()
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()        # (conn, created_at, last_used)
+        self._meta = {}             # id(conn) -> created_at, for connections handed out
+        self._open = 0              # idle + in use
+        self._waiting = 0
+
+        self._stats = {
+            'connects': 0,
+            'connect_errors': 0,
+            'connect_ms_total': 0.0,
+            'connect_ms_max': 0.0,
+            'connect_ms_last': 0.0,
+            'checkouts': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+            'recycled': 0,
+            'discarded': 0,
+        }
+
+    # ---------- connection lifecycle ----------
+    def _connect(self):
+        kwargs = {}
+        if self.application_name:
+            kwargs['application_name'] = self.application_name
+        t0 = time.perf_counter()
+        try:
+            if 'dsn' in self.conn_args:
+                conn = psycopg2.connect(self.conn_args['dsn'], **kwargs)
+            else:
+                conn = psycopg2.connect(**self.conn_args, **kwargs)
+        except Exception:
+            with self._cond:
+                self._stats['connect_errors'] += 1
+            raise
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        try:
+            if self.session_settings:
+                with conn.cursor() as cur:
+                    for key, value in self.session_settings.items():
+                        cur.execute("SELECT set_config(%s, %s, false)", (key, str(value)))
+                # SET inside a transaction is undone by rollback, so make it stick
+                conn.commit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            raise
+        with self._cond:
+            self._stats['connects'] += 1
+            self._stats['connect_ms_total'] += elapsed
+            self._stats['connect_ms_last'] = elapsed
+            self._stats['connect_ms_max'] = max(self._stats['connect_ms_max'], elapsed)
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if self.check_idle >= 0 and (time.monotonic() - last_used) < self.check_idle:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _expired(self, created_at):
+        return self.max_lifetime > 0 and (time.monotonic() - created_at) > self.max_lifetime
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        """Check out a connection, waiting up to `timeout` seconds when the pool is full."""
+        t0 = time.monotonic()
+        deadline = t0 + self.timeout
+        while True:
+            conn = None
+            created_at = last_used = None
+            must_connect = False
+            with self._cond:
+                while not self._idle and self._open >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolError("connection pool exhausted (max=%d, waited %.1fs)" % (self.maxconn, self.timeout))
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                else:
+                    self._open += 1
+                    must_connect = True
+
+            if must_connect:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+            elif self._expired(created_at) or not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._open -= 1
+                    if self._expired(created_at):
+                        self._stats['recycled'] += 1
+                    else:
+                        self._stats['health_check_failures'] += 1
+                    self._cond.notify()
+                self._close_quietly(conn)
+                continue
+
+            waited = (time.monotonic() - t0) * 1000.0
+            with self._cond:
+                self._meta[id(conn)] = created_at
+                self._stats['checkouts'] += 1
+                self._stats['wait_ms_total'] += waited
+                self._stats['wait_ms_max'] = max(self._stats['wait_ms_max'], waited)
+            return conn
+
+    def putconn(self, conn):
+        """Return a connection; any open transaction is rolled back (same effect as close())."""
+        with self._cond:
+            created_at = self._meta.pop(id(conn), None)
+        keep = created_at is not None and not conn.closed
+        if keep:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except Exception:
+                keep = False
+        if keep and self._expired(created_at):
+            keep = False
+            with self._cond:
+                self._stats['recycled'] += 1
+        if not keep:
+            self._close_quietly(conn)
+        with self._cond:
+            if keep:
+                self._idle.append((conn, created_at, time.monotonic()))
+            else:
+                self._open -= 1
+                self._stats['discarded'] += 1
+            self._cond.notify()
+
+    def prefill(self):
+        """Open `minconn` connections eagerly so the first requests don't pay for them."""
+        while True:
+            with self._cond:
+                if self._open >= self.minconn:
+                    return
+                self._open += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                logger.exception("db_pool: prefill connect failed")
+                return
+            now = time.monotonic()
+            with self._cond:
+                self._idle.append((conn, now, now))
+                self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            idle = len(self._idle)
+            s.update({
+                'pid': self.pid,
+                'min': self.minconn,
+                'max': self.maxconn,
+                'open': self._open,
+                'idle': idle,
+                'in_use': self._open - idle,
+                'waiting': self._waiting,
+            })
+        s['connect_ms_avg'] = round(s['connect_ms_total'] / s['connects'], 2) if s['connects'] else 0.0
+        s['wait_ms_avg'] = round(s['wait_ms_total'] / s['checkouts'], 2) if s['checkouts'] else 0.0
+        for k in ('connect_ms_total', 'connect_ms_max', 'connect_ms_last', 'wait_ms_total', 'wait_ms_max'):
+            s[k] = round(s[k], 2)
+        return s
+
+
+# ---------- process-wide singleton ----------
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _session_settings_from_env():
+    settings = {}
+    timeout_ms = env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+    if timeout_ms > 0:
+        settings['statement_timeout'] = timeout_ms
+    idle_tx_ms = env_int('DB_IDLE_IN_TX_TIMEOUT_MS', 0)
+    if idle_tx_ms > 0:
+        settings['idle_in_transaction_session_timeout'] = idle_tx_ms
+    return settings
+
+
+def get_pool():
+    """Return this process's pool, rebuilding it after a fork (gunicorn --preload safe)."""
+    global _POOL
+    pool = _POOL
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+    with _POOL_LOCK:
+        if _POOL is not None and _POOL.pid == os.getpid():
+            return _POOL
+        # Connections inherited from the parent must not be used (or closed) here.
+        _POOL = ConnectionPool(
+            _load_db_conn_args(),
+            minconn=env_int('DB_POOL_MIN', 1),
+            maxconn=env_int('DB_POOL_MAX', 10),
+            timeout=env_int('DB_POOL_TIMEOUT', 30),
+            max_lifetime=env_int('DB_POOL_MAX_LIFETIME', 1800),
+            check_idle=env_int('DB_POOL_CHECK_IDLE', 30),
+            session_settings=_session_settings_from_env(),
+            application_name=os.getenv('DB_APPLICATION_NAME', 'reqtool-app'),
+        )
+        _POOL.prefill()
+        return _POOL
+
+
+# ---------- request scope ----------
+# Inside a Flask request every connection()/cursor() call shares one connection kept on
+# flask.g, so nested helpers (e.g. emails.* called while a route holds a cursor) reuse it
+# instead of checking out a second one. It goes back to the pool at app-context teardown.
+# Note that a commit() from any nested block commits the whole shared transaction.
+_G_CONN = '_db_pool_conn'
+_G_DEPTH = '_db_pool_depth'
+_local = threading.local()
+
+
+def init_app(app):
+    """Register the teardown that returns the request-scoped connection to the pool."""
+    app.teardown_appcontext(release_request_connection)
+
+
+def release_request_connection(exc=None):
+    conn = g.pop(_G_CONN, None)
+    g.pop(_G_DEPTH, None)
+    if conn is not None:
+        get_pool().putconn(conn)
+
+
+@contextmanager
+def detached():
+    """Opt this thread out of request scoping, e.g. around work handed to a background thread."""
+    prev = getattr(_local, 'detached', False)
+    _local.detached = True
+    try:
+        yield
+    finally:
+        _local.detached = prev
+
+
+def _use_request_scope(request_scoped):
+    return request_scoped and not getattr(_local, 'detached', False) and has_request_context()
+
+
+def _rollback_quietly(conn, savepoint=None):
+    try:
+        if savepoint and conn.info.transaction_status in (psycopg2.extensions.TRANSACTION_STATUS_INTRANS,
+                                                          psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+            with conn.cursor() as cur:
+                cur.execute("ROLLBACK TO SAVEPOINT " + savepoint)
+            return
+    except Exception:
+        pass
+    try:
+        conn.rollback()
+    except Exception:
+        pass
+
+
+@contextmanager
+def _request_connection():
+    conn = g.get(_G_CONN)
+    if conn is not None and conn.closed:
+        g.pop(_G_CONN, None)
+        get_pool().putconn(conn)
+        conn = None
+    if conn is None:
+        conn = get_pool().getconn()
+        setattr(g, _G_CONN, conn)
+        setattr(g, _G_DEPTH, 0)
+
+    depth = g.get(_G_DEPTH, 0)
+    savepoint = None
+    # Nested use while the outer block has uncommitted work: protect it with a savepoint
+    # so a failure in the inner helper doesn't discard the caller's transaction.
+    if depth > 0 and conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+        savepoint = "db_pool_sp_%d" % depth
+        with conn.cursor() as cur:
+            cur.execute("SAVEPOINT " + savepoint)
+    setattr(g, _G_DEPTH, depth + 1)
+    try:
+        yield conn
+    except Exception:
+        _rollback_quietly(conn, savepoint)
+        raise
+    finally:
+        setattr(g, _G_DEPTH, depth)
+    if depth == 0 and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        # Outermost block left work uncommitted: discard it, exactly as close() used to.
+        _rollback_quietly(conn)
+
+
+@contextmanager
+def connection(request_scoped=True):
+    """Yield a pooled psycopg2 connection.
+
+    Within a request the connection is shared (see _request_connection); elsewhere, or
+    with request_scoped=False / inside detached(), it goes straight back to the pool on exit.
+    """
+    if _use_request_scope(request_scoped):
+        with _request_connection() as conn:
+            yield conn
+        return
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+
+@contextmanager
+def cursor(cursor_factory=psycopg2.extras.RealDictCursor, commit_on_exit=False, request_scoped=True):
+    """Yield (conn, cur) from the pool.
+
+    commit_on_exit=True commits on success; otherwise callers commit explicitly and
+    anything left uncommitted is rolled back when the outermost block exits
+    (identical to the old close()-per-call behaviour).
+    """
+    with connection(request_scoped=request_scoped) as conn:
+        cur = conn.cursor(cursor_factory=cursor_factory)
+        try:
+            yield conn, cur
+            if commit_on_exit:
+                conn.commit()
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+
+
+def pool_stats():
+    """Snapshot of in-use / idle / waiting counts and connect + wait latency (ms)."""
+    if _POOL is None or _POOL.pid != os.getpid():
+        return {'pid': os.getpid(), 'open': 0, 'idle': 0, 'in_use': 0, 'waiting': 0}
+    return _POOL.stats()
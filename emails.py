@@ -7,6 +7,7 @@ import requests
 from threading import Thread
 from time import sleep
 from datetime import datetime
+import db_pool
 
 
 # kept for compatibility if Flask-Mail is available
@@ -783,7 +784,11 @@ def _send_via_brevo_api(subject, plain_body, html_body, to_emails,
 # --------- New helper: run sync send in background ----------
 def _run_send_in_background(target_fn, *args, **kwargs):
     """Start a daemon thread and return immediately (best-effort)."""
-    t = Thread(target=target_fn, args=args, kwargs=kwargs, daemon=True)
+    def _run():
+        # never share the originating request's DB connection with the worker thread
+        with db_pool.detached():
+            return target_fn(*args, **kwargs)
+    t = Thread(target=_run, daemon=True)
     t.start()
     return True
 
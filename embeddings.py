@@ -0,0 +1,139 @@
+"""
+embeddings.py
+Lazily loaded sentence-embedding backend for semantic column mapping on import.
+
+import_routes used to load SentenceTransformer at import time and encode the
+canonical schema right after, i.e. in every gunicorn worker at boot, whether or
+not anyone imports a sheet that day. Here:
+
+  - sentence_transformers is only imported, and the model only loaded, on the
+    first encode() that misses the cache (once per process, under a lock);
+  - vectors are L2-normalised and cached per text, in memory and on disk under
+    EMBED_CACHE_DIR/<model>/<sha1>.npy (atomic writes), so recurring headers and
+    the canonical texts never need the model again, in any worker, after restarts;
+  - SemanticIndex keeps the canonical texts as one normalised matrix, so matching
+    a header is a single matrix-vector product.
+
+If the package is missing or the model fails to load, available() turns False
+and callers fall back to fuzzy matching.
+
+Tunables (env):
+  EMBED_MODEL      sentence-transformers model name  (default all-MiniLM-L6-v2)
+  EMBED_CACHE_DIR  on-disk vector cache               (default: <tmp>/reqtool_embeddings)
+  EMBED_DISABLED   set to 1 to skip embeddings entirely
+"""
+
+import hashlib
+import importlib.util
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBED_MODEL = os.getenv('EMBED_MODEL', 'all-MiniLM-L6-v2')
+EMBED_CACHE_DIR = os.getenv('EMBED_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'reqtool_embeddings')
+EMBED_DISABLED = os.getenv('EMBED_DISABLED', '').lower() in ('1', 'true', 'yes')
+
+
+def _normalise(m):
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    return (m / np.maximum(norms, 1e-9)).astype(np.float32)
+
+
+class EmbeddingBackend:
+    def __init__(self, model_name=EMBED_MODEL, cache_dir=EMBED_CACHE_DIR):
+        self.model_name = model_name
+        self.cache_dir = os.path.join(cache_dir, model_name.replace('/', '_'))
+        self._model = None
+        self._failed = EMBED_DISABLED or importlib.util.find_spec('sentence_transformers') is None
+        self._lock = threading.Lock()
+        self._memo = {}              # text -> normalised vector
+
+    def available(self):
+        return not self._failed
+
+    def _load_model(self):
+        with self._lock:
+            if self._model is None and not self._failed:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+                except Exception:
+                    logger.exception("could not load embedding model %s; semantic matching disabled",
+                                     self.model_name)
+                    self._failed = True
+        return self._model
+
+    def _path(self, text):
+        return os.path.join(self.cache_dir, hashlib.sha1(text.encode('utf-8')).hexdigest() + '.npy')
+
+    def _read_cached(self, text):
+        try:
+            return np.load(self._path(text), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cached(self, text, vec):
+        path = self._path(text)
+        tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp, 'wb') as f:
+                np.save(f, vec, allow_pickle=False)
+            os.replace(tmp, path)
+        except OSError:
+            logger.warning("could not write embedding cache %s", path)
+
+    def encode(self, texts):
+        """Normalised vectors for `texts` as a (len(texts), dim) array, or None if unavailable."""
+        texts = [str(t) for t in texts]
+        missing = []
+        for t in texts:
+            if t not in self._memo:
+                vec = self._read_cached(t)
+                if vec is None:
+                    missing.append(t)
+                else:
+                    self._memo[t] = vec
+        if missing:
+            model = self._load_model()
+            if model is None:
+                return None
+            missing = list(dict.fromkeys(missing))
+            vecs = _normalise(model.encode(missing, convert_to_numpy=True))
+            for t, vec in zip(missing, vecs):
+                self._memo[t] = vec
+                self._write_cached(t, vec)
+        return np.stack([self._memo[t] for t in texts])
+
+
+class SemanticIndex:
+    """Fixed set of labelled texts, matched by cosine similarity."""
+
+    def __init__(self, backend, labelled_texts):
+        self.backend = backend
+        self.labels = list(labelled_texts)
+        self.texts = [labelled_texts[k] for k in self.labels]
+        self._matrix = None          # (labels, dim), built on first use
+
+    def best(self, text):
+        """(label, cosine) of the closest label, or None if embeddings are unavailable."""
+        if not self.labels or not self.backend.available():
+            return None
+        if self._matrix is None:
+            self._matrix = self.backend.encode(self.texts)
+            if self._matrix is None:
+                return None
+        vec = self.backend.encode([text])
+        if vec is None:
+            return None
+        sims = self._matrix @ vec[0]
+        i = int(np.argmax(sims))
+        return self.labels[i], float(sims[i])
+
+
+BACKEND = EmbeddingBackend()
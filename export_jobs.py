@@ -0,0 +1,200 @@
+"""
+export_jobs.py
+Background export jobs: the request enqueues an export and gets a job id back, a
+small thread pool renders the CSV/XLSX to disk, and the browser polls for
+progress and then downloads the finished file.
+
+Job state lives next to the output as <job_id>.json in EXPORT_JOB_DIR (written
+atomically by the rendering thread), so any gunicorn worker can answer a status
+poll or serve the download, not only the one that runs the job (job_store.py,
+shared with import_jobs.py).
+
+Tunables (env):
+  EXPORT_JOB_DIR      where state + files are kept       (default: <tmp>/reqtool_exports)
+  EXPORT_JOB_WORKERS  render threads per worker process  (default 2)
+  EXPORT_JOB_TTL      seconds a job and its file are kept (default 3600)
+  EXPORT_JOB_STALE    a running job with no progress for this long is reported failed (default 600)
+  EXPORT_JOB_QUEUED_MAX  a job still queued after this long is reported failed (default 1800);
+                      sooner if the worker process that queued it is gone
+"""
+
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+from flask import Blueprint, jsonify, send_file, session, url_for
+
+import db_pool
+from export_stream import XLSX_MIMETYPE, iter_csv, iter_rows, write_xlsx
+from job_store import DONE, FAILED, RUNNING, JobStore
+from pagination import count_rows
+from settings import env_int
+
+logger = logging.getLogger(__name__)
+
+EXPORT_JOB_DIR = os.getenv('EXPORT_JOB_DIR') or os.path.join(tempfile.gettempdir(), 'reqtool_exports')
+EXPORT_JOB_WORKERS = env_int('EXPORT_JOB_WORKERS', 2)
+EXPORT_JOB_TTL = env_int('EXPORT_JOB_TTL', 3600)
+EXPORT_JOB_STALE = env_int('EXPORT_JOB_STALE', 600)
+EXPORT_JOB_QUEUED_MAX = env_int('EXPORT_JOB_QUEUED_MAX', 1800)
+PROGRESS_EVERY = 1000          # rows between state-file updates
+
+_store = JobStore(EXPORT_JOB_DIR, EXPORT_JOB_WORKERS, EXPORT_JOB_TTL, EXPORT_JOB_STALE,
+                  stale_error='export stopped responding', thread_name_prefix='export-job',
+                  cleanup_interval=60, queued_max=EXPORT_JOB_QUEUED_MAX,
+                  lost_error='export was lost before it started (the server restarted); please retry')
+load = _store.load
+cleanup = _store.cleanup
+
+_MIMETYPES = {'csv': 'text/csv', 'xlsx': XLSX_MIMETYPE}
+
+
+@dataclass
+class ExportSpec:
+    """What to render: `select_sql from_sql order_sql` with `params`, as fmt 'csv' or 'xlsx'.
+
+    from_sql ("FROM ... WHERE ...") is also used to size the job for the progress bar.
+    `to_row` maps a result row to cell values; `headers` default to the row keys (xlsx).
+    """
+    fmt: str
+    filename: str
+    select_sql: str
+    from_sql: str
+    order_sql: str = ''
+    params: List[Any] = field(default_factory=list)
+    headers: Optional[List[str]] = None
+    to_row: Optional[Callable] = None
+    sheet_title: str = 'Candidates'
+    empty_message: Optional[str] = None
+
+    @property
+    def sql(self):
+        return '%s %s %s' % (self.select_sql, self.from_sql, self.order_sql)
+
+
+def _output_path(job_id, fmt):
+    return _store.path(job_id, fmt)
+
+
+def _counting(rows, state):
+    n = 0
+    for row in rows:
+        yield row
+        n += 1
+        if n % PROGRESS_EVERY == 0:
+            state['rows_written'] = n
+            _store.save(state)
+    state['rows_written'] = n
+
+
+def _run(state, spec):
+    state['status'] = RUNNING
+    _store.save(state)
+    out_path = _output_path(state['id'], spec.fmt)
+    part = out_path + '.part'
+    try:
+        with db_pool.cursor(request_scoped=False) as (conn, cur):
+            count = count_rows(cur, spec.from_sql, spec.params)
+        state['total'] = count.value
+        state['total_exact'] = count.exact
+        _store.save(state)
+
+        rows = _counting(iter_rows(spec.sql, spec.params), state)
+        with open(part, 'wb') as out:
+            if spec.fmt == 'csv':
+                for chunk in iter_csv(spec.headers, rows, spec.to_row):
+                    out.write(chunk)
+            else:
+                write_xlsx(rows, headers=spec.headers, to_row=spec.to_row, sheet_title=spec.sheet_title,
+                           empty_message=spec.empty_message, out=out)
+        os.replace(part, out_path)
+        state['status'] = DONE
+        state['finished_at'] = time.time()
+        _store.save(state)
+    except Exception as e:
+        logger.exception("export job %s failed", state['id'])
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        state['status'] = FAILED
+        state['error'] = str(e)[:300]
+        _store.save(state)
+
+
+def submit(spec, owner):
+    """Queue `spec` for rendering; returns the new job's state dict."""
+    if spec.fmt not in _MIMETYPES:
+        raise ValueError('unsupported export format %r' % spec.fmt)
+    state = _store.create(owner, fmt=spec.fmt, filename=spec.filename, rows_written=0,
+                          total=None, total_exact=True)
+    _store.submit(_run, state, spec)
+    return state
+
+
+def percent(state):
+    if state['status'] == DONE:
+        return 100
+    total = state.get('total')
+    if not total:
+        return 0
+    # estimated totals can be exceeded; hold at 99 until the file is actually written
+    return min(99, int(state.get('rows_written', 0) * 100 / total))
+
+
+def status_payload(state):
+    return {
+        'job_id': state['id'],
+        'status': state['status'],
+        'rows_written': state.get('rows_written', 0),
+        'total': state.get('total'),
+        'total_exact': state.get('total_exact', True),
+        'percent': percent(state),
+        'filename': state.get('filename'),
+        'error': state.get('error'),
+        'status_url': url_for('export_jobs_bp.job_status', job_id=state['id']),
+        'download_url': url_for('export_jobs_bp.job_download', job_id=state['id']) if state['status'] == DONE else None,
+    }
+
+
+def accepted(state):
+    """202 response for an export endpoint that queued `state`."""
+    return jsonify(status_payload(state)), 202
+
+
+# ---------- routes ----------
+export_jobs_bp = Blueprint('export_jobs_bp', __name__)
+
+
+def _owned_job(job_id):
+    if 'user_id' not in session:
+        return None, (jsonify({'error': 'unauthenticated'}), 401)
+    state = load(job_id)
+    if state is None or state.get('owner') != session.get('user_id'):
+        return None, (jsonify({'error': 'export not found or expired'}), 404)
+    return state, None
+
+
+@export_jobs_bp.route('/exports/<job_id>', methods=['GET'])
+def job_status(job_id):
+    state, err = _owned_job(job_id)
+    if err:
+        return err
+    return jsonify(status_payload(state))
+
+
+@export_jobs_bp.route('/exports/<job_id>/download', methods=['GET'])
+def job_download(job_id):
+    state, err = _owned_job(job_id)
+    if err:
+        return err
+    if state['status'] != DONE:
+        return jsonify(status_payload(state)), 409
+    path = _output_path(job_id, state['fmt'])
+    if not os.path.exists(path):
+        return jsonify({'error': 'export not found or expired'}), 404
+    return send_file(path, as_attachment=True, download_name=state['filename'],
+                     mimetype=_MIMETYPES[state['fmt']])
@@ -0,0 +1,144 @@
+"""
+export_stream.py
+Constant-memory exports: rows come off a server-side (named) cursor `itersize`
+at a time and are encoded and sent in chunks, so a 200k-row export never holds
+more than one chunk in the worker. XLSX goes through an openpyxl write-only
+workbook spooled to a temp file, never a BytesIO.
+
+Tunables (env):
+  EXPORT_ITERSIZE    rows fetched per round trip from the named cursor (default 2000)
+  EXPORT_CHUNK_ROWS  CSV rows buffered per chunk written to the client  (default 500)
+  EXPORT_TMP_DIR     where XLSX files are spooled (default: system temp dir)
+"""
+
+import codecs
+import csv
+import io
+import itertools
+import json
+import os
+import tempfile
+import uuid
+from datetime import datetime
+
+import openpyxl
+import psycopg2.extras
+from flask import Response
+
+import db_pool
+from settings import env_int
+
+
+EXPORT_ITERSIZE = env_int('EXPORT_ITERSIZE', 2000)
+EXPORT_CHUNK_ROWS = env_int('EXPORT_CHUNK_ROWS', 500)
+EXPORT_TMP_DIR = os.getenv('EXPORT_TMP_DIR') or None
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def iter_rows(sql, params=(), itersize=None, cursor_factory=psycopg2.extras.RealDictCursor):
+    """Yield the rows of `sql` through a named cursor on a connection of its own.
+
+    The connection is not request-scoped: it lives exactly as long as the generator,
+    which outlives the view function when used as a streaming response body. Closing
+    the generator early (client went away) returns the connection to the pool.
+    """
+    with db_pool.connection(request_scoped=False) as conn:
+        cur = conn.cursor(name='export_%s' % uuid.uuid4().hex[:12], cursor_factory=cursor_factory)
+        cur.itersize = itersize or EXPORT_ITERSIZE
+        try:
+            cur.execute(sql, tuple(params))
+            for row in cur:
+                yield row
+        finally:
+            try:
+                cur.close()
+            except Exception:
+                pass
+
+
+def iter_csv(headers, rows, to_row, chunk_rows=None, bom=True):
+    """Encode `rows` as CSV (csv.excel dialect, UTF-8) in chunks of `chunk_rows` rows.
+
+    With bom=True the output is byte-identical to StringIO + .encode('utf-8-sig').
+    """
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    if bom:
+        yield codecs.BOM_UTF8
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(headers)
+    pending = 0
+    for row in rows:
+        writer.writerow(to_row(row))
+        pending += 1
+        if pending >= chunk_rows:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    tail = buf.getvalue()
+    if tail:
+        yield tail.encode('utf-8')
+
+
+def csv_response(chunks, filename):
+    """Streaming attachment response with the same headers send_file() would set."""
+    resp = Response(chunks, mimetype='text/csv')
+    resp.headers.set('Content-Disposition', 'attachment', filename=filename)
+    # don't let a reverse proxy buffer the whole body before forwarding it
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
+
+
+def xlsx_cell(v):
+    """One cell value: lists/dicts as JSON, datetimes as text, None as ''."""
+    if v is None:
+        return ""
+    if isinstance(v, (list, dict)):
+        try:
+            return json.dumps(v, ensure_ascii=False)
+        except Exception:
+            return str(v)
+    if isinstance(v, datetime):
+        return v.strftime('%Y-%m-%d %H:%M:%S')
+    return v
+
+
+def write_xlsx(rows, headers=None, to_row=None, sheet_title='Candidates', empty_message=None, out=None):
+    """Write `rows` into a write-only workbook spooled to an anonymous temp file.
+
+    `headers` defaults to the keys of the first row; `to_row(row)` maps a row to its
+    cell values (default: row[h] for each header). With no rows the sheet holds
+    `empty_message` (or just the headers). Returns the file rewound to the start;
+    it disappears when closed (send_file closes it after the response). Pass `out`
+    (a binary file opened for writing) to save there instead; it is left open.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title)
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        if empty_message:
+            ws.append([empty_message])
+        elif headers:
+            ws.append(list(headers))
+    else:
+        if headers is None:
+            headers = list(first.keys())
+        ws.append(list(headers))
+        for row in itertools.chain((first,), rows):
+            values = to_row(row) if to_row else [row.get(h) for h in headers]
+            ws.append([xlsx_cell(v) for v in values])
+
+    if out is not None:
+        wb.save(out)
+        return out
+    out = tempfile.TemporaryFile(suffix='.xlsx', dir=EXPORT_TMP_DIR)
+    try:
+        wb.save(out)
+    except Exception:
+        out.close()
+        raise
+    out.seek(0)
+    return out
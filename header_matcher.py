@@ -0,0 +1,120 @@
+"""
+header_matcher.py
+Vectorized fuzzy matching of uploaded sheet headers to forced aliases / DB columns.
+
+fuzzywuzzy runs in pure Python here (python-Levenshtein is not in requirements),
+and process.extractOne scored each uploaded header against every target one pair
+at a time: hundreds of forced aliases, then the DB columns, for every column of
+the sheet. A TrigramIndex turns its targets into L2-normalised character-trigram
+count vectors once; all headers of a sheet are then scored against all targets
+with matrix products, and only the SHORTLIST_K best targets per header (by each
+signal, see TrigramIndex) go through fuzz.WRatio (via process.extractOne, as before).
+
+The final score stays WRatio on purpose: the import thresholds (0.90 nearest
+forced, 0.60 / 0.80 fallback) are calibrated on it, including the partial-ratio
+credit it gives a short alias contained in a longer header, which a cosine cannot
+reproduce. The matrix only decides which pairs are worth scoring.
+Parity with the plain extractOne calls: python scripts/check_header_matcher
+"""
+
+import math
+from collections import Counter
+
+import numpy as np
+from fuzzywuzzy import process, utils
+
+from settings import env_int
+
+
+# Targets re-scored with WRatio per header; 0 disables the shortlist (plain extractOne).
+SHORTLIST_K = env_int('HEADER_MATCH_SHORTLIST', 8)
+
+
+def trigrams(value, pad=True):
+    """Character trigrams of `value` as WRatio sees it (full_process, ascii)."""
+    s = utils.full_process(str(value), force_ascii=True)
+    if not s:
+        return []
+    if pad:
+        s = ' %s ' % s
+    return [s[i:i + 3] for i in range(len(s) - 2)]
+
+
+class TrigramIndex:
+    """Two views of the targets, one matrix each:
+
+    - cosine of padded trigram counts: similar strings overall;
+    - containment (share of a target's inner trigrams found in the query): short
+      targets inside a long header, which WRatio credits through partial_ratio
+      (e.g. 'id' in 'candidate id no') but a cosine ranks low.
+    Targets too short to have an inner trigram are always on the shortlist.
+    """
+
+    def __init__(self, targets):
+        self.targets = list(targets)
+        grams = [Counter(trigrams(t)) for t in self.targets]
+        inner = [set(trigrams(t, pad=False)) for t in self.targets]
+        self.vocab = {}
+        for g in grams:
+            for gram in g:
+                self.vocab.setdefault(gram, len(self.vocab))
+        self.matrix = self._vectors(grams)          # (targets, vocab), rows L2-normalised
+        self.inner_vocab = {}
+        for g in inner:
+            for gram in g:
+                self.inner_vocab.setdefault(gram, len(self.inner_vocab))
+        self.containment = np.zeros((len(inner), max(1, len(self.inner_vocab))), dtype=np.float32)
+        for i, g in enumerate(inner):
+            for gram in g:
+                self.containment[i, self.inner_vocab[gram]] = 1.0 / len(g)
+        self.always = np.array([not g for g in inner], dtype=bool)
+
+    def _vectors(self, counters):
+        m = np.zeros((len(counters), max(1, len(self.vocab))), dtype=np.float32)
+        for i, counts in enumerate(counters):
+            # the norm covers grams the targets don't have, so they still dilute the score
+            norm = math.sqrt(sum(c * c for c in counts.values()))
+            if not norm:
+                continue
+            for gram, c in counts.items():
+                j = self.vocab.get(gram)
+                if j is not None:
+                    m[i, j] = c / norm
+        return m
+
+    def scores(self, queries):
+        """Similarity of every query against every target: (2, queries, targets),
+        cosine first, containment second."""
+        cosine = self._vectors([Counter(trigrams(q)) for q in queries]) @ self.matrix.T
+        present = np.zeros((len(queries), max(1, len(self.inner_vocab))), dtype=np.float32)
+        for i, q in enumerate(queries):
+            for gram in set(trigrams(q, pad=False)):
+                j = self.inner_vocab.get(gram)
+                if j is not None:
+                    present[i, j] = 1.0
+        return np.stack([cosine, present @ self.containment.T])
+
+    def extract_one(self, query, row=None, allowed=None, k=None):
+        """process.extractOne(query, targets), restricted to the trigram shortlist.
+
+        `row` is the query's scores()[:, i] when the caller scored a batch;
+        `allowed` is a boolean mask over targets (e.g. DB columns not used yet).
+        Returns (target, score 0-100) or None, like extractOne.
+        """
+        mask = np.ones(len(self.targets), dtype=bool) if allowed is None else np.asarray(allowed, dtype=bool)
+        if not mask.any():
+            return None
+        k = SHORTLIST_K if k is None else k
+        if k and mask.sum() > k and trigrams(query):
+            if row is None:
+                row = self.scores([query])[:, 0]
+            idx = np.flatnonzero(mask)
+            keep = mask & self.always
+            for signal in row:
+                if len(idx) > k:
+                    keep[idx[np.argpartition(-signal[idx], k - 1)[:k]]] = True
+                else:
+                    keep[idx] = True
+            mask = keep
+        # target order is kept, so extractOne breaks ties the way it did on the full list
+        return process.extractOne(query, [t for t, m in zip(self.targets, mask) if m])
@@ -0,0 +1,173 @@
+"""
+import_dedupe.py
+Pre-commit duplicate check of import rows against existing candidates.
+
+Nothing on the import path looked at the database before inserting, so
+re-importing the same job-board export created every candidate again. Here the
+phones/emails of all rows are normalized (contacts.py), looked up together in
+one query on the candidate_contacts index, and each row is flagged:
+
+  new             no candidate shares a phone or email with it
+  in_requirement  already a candidate of the requirement being imported into
+  elsewhere       only known in other requirements (a new application, not a duplicate)
+
+plan_commit() then splits the rows by the chosen policy (on_duplicate):
+
+  skip    rows already in the requirement are left out                 (default)
+  update  they overwrite that candidate's fields with the non-blank sheet values
+  insert  they are inserted anyway (the old behaviour)
+
+With skip/update a row sharing a contact with an earlier row of the same
+import is left out too, so one commit never creates the same person twice.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import pandas as pd
+
+import contacts
+
+logger = logging.getLogger(__name__)
+
+SKIP, UPDATE, INSERT = 'skip', 'update', 'insert'
+POLICIES = (SKIP, UPDATE, INSERT)
+NEW, IN_REQUIREMENT, ELSEWHERE = 'new', 'in_requirement', 'elsewhere'
+
+
+@dataclass
+class RowMatch:
+    keys: frozenset = frozenset()                                   # {(kind, search_key)}
+    in_requirement: List[int] = field(default_factory=list)        # candidate ids
+    elsewhere: List[Tuple[int, int]] = field(default_factory=list)  # (candidate id, requirement id)
+
+    @property
+    def status(self):
+        if self.in_requirement:
+            return IN_REQUIREMENT
+        return ELSEWHERE if self.elsewhere else NEW
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'candidate_ids': self.in_requirement,
+            'elsewhere': [{'candidate_id': c, 'requirement_id': r} for c, r in self.elsewhere],
+        }
+
+
+@dataclass
+class CommitPlan:
+    insert: List[int] = field(default_factory=list)                # row indexes
+    update: List[Tuple[int, int]] = field(default_factory=list)    # (row index, candidate id)
+    skipped: List[Tuple[int, str]] = field(default_factory=list)   # (row index, reason)
+
+    @property
+    def not_inserted(self):
+        return {i for i, _ in self.update} | {i for i, _ in self.skipped}
+
+
+def record_keys(record):
+    """{(kind, search_key)} of one row dict with 'phones' / 'emails' values."""
+    return frozenset((kind, key) for kind, _, key in
+                     contacts.contact_keys(record.get('phones'), record.get('emails')))
+
+
+def frame_keys(df, contact_cols):
+    """record_keys() for every row of an uploaded sheet.
+
+    `contact_cols` is {contacts.PHONE: [columns], contacts.EMAIL: [columns]} (see
+    import_routes.contact_columns); values are split and normalized per column.
+    """
+    keys = [set() for _ in range(len(df))]
+    for kind, columns in contact_cols.items():
+        for col in columns:
+            if col not in df.columns:
+                continue
+            tokens = contacts.explode_contacts(df[col].reset_index(drop=True))
+            if kind == contacts.PHONE:
+                values = contacts.normalize_phone_series(tokens).dropna()
+                values = values.map(contacts.phone_national)
+            else:
+                values = contacts.normalize_email_series(tokens).dropna()
+            for i, v in zip(values.index, values):
+                keys[i].add((kind, v))
+    return [frozenset(k) for k in keys]
+
+
+def find_existing(cur, row_keys, requirement_id):
+    """[RowMatch] for `row_keys` (one key set per row), from a single lookup."""
+    hits = contacts.lookup(cur, set().union(*row_keys) if row_keys else (), with_requirement=True)
+    matches = []
+    for keys in row_keys:
+        owners = {}
+        for key in keys:
+            owners.update(hits.get(key, ()))
+        ids = sorted(owners)
+        matches.append(RowMatch(
+            keys=keys,
+            in_requirement=[c for c in ids if owners[c] == requirement_id],
+            elsewhere=[(c, owners[c]) for c in ids if owners[c] != requirement_id],
+        ))
+    return matches
+
+
+_LOOKUP_SAVEPOINT = 'import_dedupe_lookup'
+
+
+def find_existing_or_new(cur, row_keys, requirement_id):
+    """(matches, checked): find_existing(), or every row NEW (keys kept, so rows repeating
+    each other are still caught) when the lookup fails, e.g. before candidate_contacts
+    (migration 5) exists. Runs under a savepoint so the caller's transaction survives.
+    """
+    cur.execute('SAVEPOINT ' + _LOOKUP_SAVEPOINT)
+    try:
+        matches = find_existing(cur, row_keys, requirement_id)
+    except Exception:
+        logger.exception("duplicate lookup failed; treating every row as new")
+        cur.execute('ROLLBACK TO SAVEPOINT ' + _LOOKUP_SAVEPOINT)
+        cur.execute('RELEASE SAVEPOINT ' + _LOOKUP_SAVEPOINT)
+        return [RowMatch(keys=keys) for keys in row_keys], False
+    cur.execute('RELEASE SAVEPOINT ' + _LOOKUP_SAVEPOINT)
+    return matches, True
+
+
+def plan_commit(matches, policy=SKIP, exclude=(), first_row=1):
+    """Split rows into insert / update / skipped; rows in `exclude` (failed validation,
+    handled elsewhere) are left alone.
+
+    `first_row` is the number the caller shows for row index 0, used in skip reasons.
+    """
+    if policy not in POLICIES:
+        raise ValueError('unknown duplicate policy %r' % policy)
+    exclude = set(exclude)
+    plan = CommitPlan()
+    claimed = {}                   # contact key -> first row index using it
+    for i, m in enumerate(matches):
+        if i in exclude:
+            continue
+        if policy != INSERT:
+            first = next((claimed[k] for k in m.keys if k in claimed), None)
+            if first is not None:
+                plan.skipped.append((i, 'Duplicate of row %d in this import' % (first + first_row)))
+                continue
+            for k in m.keys:
+                claimed[k] = i
+        if m.in_requirement and policy == SKIP:
+            plan.skipped.append((i, 'Already in this requirement (candidate #%d)' % m.in_requirement[-1]))
+        elif m.in_requirement and policy == UPDATE:
+            plan.update.append((i, m.in_requirement[-1]))      # most recently added match
+        else:
+            plan.insert.append(i)
+    return plan
+
+
+def update_values(record, columns):
+    """The non-blank values of `columns` in `record`: what an update may overwrite."""
+    out = {}
+    for col in columns:
+        v = record.get(col)
+        if v is None or (isinstance(v, float) and pd.isna(v)) or (isinstance(v, str) and not v.strip()):
+            continue
+        out[col] = v
+    return out
@@ -0,0 +1,180 @@
+"""
+import_delta.py
+Row fingerprints for delta re-imports of a client's sheet.
+
+commit_candidates used to insert every row of a sheet each time it was uploaded,
+so an updated version of the same sheet duplicated all of it. Now every row
+imported into a requirement leaves a fingerprint:
+
+  identity_hash  sha1 of who the row is: its normalized phones/emails
+                 (contacts.py), or the candidate name when it has neither
+  content_hash   sha1 of its mapped values (system columns excluded)
+
+stored per candidate in import_row_fingerprints, with the import_batches row
+of the commit that wrote it. On the next import into the same requirement,
+rows are looked up by identity in one query and split:
+
+  unchanged  same identity and content -> no write at all
+  changed    same identity, other content -> batched UPDATE of the mapped columns
+  new        unknown identity -> the regular path (duplicate check, INSERT)
+
+so re-importing a 10k-row sheet with 50 edited rows writes ~50 rows. Both
+tables are migration 7 (SCHEMA_SQL / FINGERPRINT_INDEXES in migrations.py) and
+are not created at runtime: import commits fail until `python scripts/migrate
+apply` has run, which is a required deploy step (README.md).
+"""
+
+import hashlib
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+import import_dedupe
+
+# mapped columns that never count as content
+SYSTEM_COLUMNS = ('id', 'requirement_id', 'application_date', 'added_by', 'added_date', 'updated_date')
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+SCHEMA_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS import_batches (
+        id              BIGSERIAL PRIMARY KEY,
+        requirement_id  BIGINT,
+        upload_id       TEXT,
+        created_by      TEXT,
+        created_at      TIMESTAMP DEFAULT NOW(),
+        rows_total      INTEGER DEFAULT 0,
+        inserted        INTEGER DEFAULT 0,
+        updated         INTEGER DEFAULT 0,
+        unchanged       INTEGER DEFAULT 0,
+        skipped         INTEGER DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS import_row_fingerprints (
+        candidate_id    BIGINT PRIMARY KEY REFERENCES candidates(id) ON DELETE CASCADE,
+        requirement_id  BIGINT NOT NULL,
+        identity_hash   TEXT NOT NULL,
+        content_hash    TEXT NOT NULL,
+        batch_id        BIGINT REFERENCES import_batches(id) ON DELETE SET NULL
+    )
+    """,
+)
+
+
+def _text(v):
+    """Cell value as compared between imports: '' for missing, 3.0 -> '3', stripped."""
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return ''
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    if hasattr(v, 'isoformat'):
+        return v.isoformat()
+    return str(v).strip()
+
+
+def _sha1(obj):
+    return hashlib.sha1(json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def identity_hash(record):
+    """Stable id of the person in `record`, or None if it has no contacts and no name."""
+    keys = sorted('%s:%s' % k for k in import_dedupe.record_keys(record))
+    if keys:
+        return _sha1(['c'] + keys)
+    name = _SPACE_RE.sub(' ', _text(record.get('candidate_name'))).lower()
+    return _sha1(['n', name]) if name else None
+
+
+def content_hash(record, columns):
+    return _sha1([[c, _text(record.get(c))] for c in sorted(columns)])
+
+
+def content_columns(mapped_columns):
+    """The mapped DB columns that make up a row's content."""
+    return [c for c in dict.fromkeys(mapped_columns) if c not in SYSTEM_COLUMNS]
+
+
+def content_values(record, columns):
+    """{column: value} for an UPDATE to the sheet's current content; blanks become NULL."""
+    return {c: (record.get(c) if _text(record.get(c)) else None) for c in columns}
+
+
+@dataclass
+class Delta:
+    fingerprints: List[Tuple[Optional[str], str]]                       # per row: (identity, content)
+    unchanged: List[int] = field(default_factory=list)                  # row indexes
+    changed: List[Tuple[int, int]] = field(default_factory=list)        # (row index, candidate id)
+
+    @property
+    def handled(self):
+        return set(self.unchanged) | {i for i, _ in self.changed}
+
+
+def compare(cur, requirement_id, records, columns):
+    """Delta of `records` against the fingerprints already stored for the requirement.
+
+    One query. An identity is matched by its first row only.
+    """
+    fps = [(identity_hash(r), content_hash(r, columns)) for r in records]
+    identities = sorted({ident for ident, _ in fps if ident})
+    previous = {}                  # identity -> (candidate id, content hash); latest candidate wins
+    if identities:
+        cur.execute("""
+            SELECT identity_hash, candidate_id, content_hash
+            FROM import_row_fingerprints
+            WHERE requirement_id = %s AND identity_hash = ANY(%s)
+            ORDER BY candidate_id
+        """, (requirement_id, identities))
+        for row in cur.fetchall():
+            if isinstance(row, dict):
+                row = (row['identity_hash'], row['candidate_id'], row['content_hash'])
+            previous[row[0]] = (row[1], row[2])
+    delta = Delta(fingerprints=fps)
+    for i, (ident, content) in enumerate(fps):
+        if ident not in previous:
+            continue
+        candidate_id, old_content = previous.pop(ident)
+        if old_content == content:
+            delta.unchanged.append(i)
+        else:
+            delta.changed.append((i, candidate_id))
+    return delta
+
+
+def start_batch(cur, requirement_id, upload_id=None, created_by=None, rows_total=0):
+    cur.execute("""
+        INSERT INTO import_batches (requirement_id, upload_id, created_by, rows_total)
+        VALUES (%s, %s, %s, %s) RETURNING id
+    """, (requirement_id, upload_id, None if created_by is None else str(created_by), rows_total))
+    row = cur.fetchone()
+    return row['id'] if isinstance(row, dict) else row[0]
+
+
+def finish_batch(cur, batch_id, inserted, updated, unchanged, skipped):
+    cur.execute("""
+        UPDATE import_batches SET inserted = %s, updated = %s, unchanged = %s, skipped = %s
+        WHERE id = %s
+    """, (inserted, updated, unchanged, skipped, batch_id))
+
+
+def store(cur, requirement_id, batch_id, fingerprints: Dict[int, Tuple[Optional[str], str]]):
+    """Save {candidate id: (identity, content)} for the rows this batch wrote, in one statement."""
+    values = [(cid, requirement_id, ident, content, batch_id)
+              for cid, (ident, content) in fingerprints.items() if ident]
+    if not values:
+        return
+    execute_values(cur, """
+        INSERT INTO import_row_fingerprints (candidate_id, requirement_id, identity_hash, content_hash, batch_id)
+        VALUES %s
+        ON CONFLICT (candidate_id) DO UPDATE SET requirement_id = EXCLUDED.requirement_id,
+                                                 identity_hash = EXCLUDED.identity_hash,
+                                                 content_hash = EXCLUDED.content_hash,
+                                                 batch_id = EXCLUDED.batch_id
+    """, values, page_size=1000)
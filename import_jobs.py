@@ -0,0 +1,141 @@
+"""
+import_jobs.py
+Background import commits: the request validates and enqueues, a small thread
+pool does the writes, and the browser polls for progress.
+
+commit_candidates used to insert every row, then upsert the mapping memory row
+by row on a second connection, then send one JD email per imported candidate,
+all inside the HTTP request, so big sheets hit the gunicorn timeout and tied up
+a worker for minutes. Now the request hands a work function to submit(); the
+function reports through a Progress object (stage, rows done, counters such as
+inserted / updated / emails_sent) and its return value becomes the job result.
+
+Job state is <job_id>.json in IMPORT_JOB_DIR, written atomically, so any
+gunicorn worker can answer a status poll (job_store.py, shared with export_jobs.py).
+
+Tunables (env):
+  IMPORT_JOB_DIR      where job state is kept              (default: <tmp>/reqtool_imports)
+  IMPORT_JOB_WORKERS  commit threads per worker process    (default 2)
+  IMPORT_JOB_TTL      seconds a finished job is kept       (default 86400)
+  IMPORT_JOB_STALE    a running job with no progress for this long is reported failed (default 600)
+  IMPORT_JOB_QUEUED_MAX  a job still queued after this long is reported failed (default 3600);
+                      sooner if the worker process that queued it is gone
+"""
+
+import logging
+import os
+import tempfile
+import time
+
+from flask import Blueprint, jsonify, session, url_for
+
+from job_store import DONE, FAILED, RUNNING, JobStore
+from settings import env_int
+
+logger = logging.getLogger(__name__)
+
+IMPORT_JOB_DIR = os.getenv('IMPORT_JOB_DIR') or os.path.join(tempfile.gettempdir(), 'reqtool_imports')
+IMPORT_JOB_WORKERS = env_int('IMPORT_JOB_WORKERS', 2)
+IMPORT_JOB_TTL = env_int('IMPORT_JOB_TTL', 86400)
+IMPORT_JOB_STALE = env_int('IMPORT_JOB_STALE', 600)
+IMPORT_JOB_QUEUED_MAX = env_int('IMPORT_JOB_QUEUED_MAX', 3600)
+SAVE_EVERY = 0.5               # seconds between state-file updates while running
+
+_store = JobStore(IMPORT_JOB_DIR, IMPORT_JOB_WORKERS, IMPORT_JOB_TTL, IMPORT_JOB_STALE,
+                  stale_error='import stopped responding; rows committed so far were kept',
+                  thread_name_prefix='import-job', cleanup_interval=300,
+                  queued_max=IMPORT_JOB_QUEUED_MAX,
+                  lost_error='import was lost before it started (the server restarted); nothing was '
+                             'saved, please retry')
+load = _store.load
+cleanup = _store.cleanup
+
+
+class Progress:
+    """What a running job publishes: current stage, rows done of total, named counters."""
+
+    def __init__(self, state):
+        self.state = state
+        self._saved_at = 0.0
+
+    def stage(self, name, total=None):
+        self.state['stage'] = name
+        self.state['done'] = 0
+        self.state['total'] = total
+        self._save(force=True)
+
+    def advance(self, n=0, **counters):
+        """Add `n` to done and each keyword to its counter."""
+        self.state['done'] += n
+        for key, value in counters.items():
+            self.state['counters'][key] = self.state['counters'].get(key, 0) + value
+        self._save()
+
+    def _save(self, force=False):
+        if force or time.time() - self._saved_at >= SAVE_EVERY:
+            self._saved_at = time.time()
+            _store.save(self.state)
+
+
+def _run(state, work, app):
+    state['status'] = RUNNING
+    _store.save(state)
+    try:
+        with app.app_context():
+            result = work(Progress(state))
+        state['result'] = result
+        state['status'] = DONE
+    except Exception as e:
+        logger.exception("import job %s failed", state['id'])
+        state['status'] = FAILED
+        state['error'] = str(e)[:300]
+    state['finished_at'] = time.time()
+    _store.save(state)
+
+
+def submit(work, owner, app, total=None):
+    """Queue `work(progress)` (run inside `app`'s context); returns the new job's state dict."""
+    state = _store.create(owner, stage=None, done=0, total=total, counters={}, result=None)
+    _store.submit(_run, state, work, app)
+    return state
+
+
+def percent(state):
+    if state['status'] == DONE:
+        return 100
+    total = state.get('total')
+    if not total:
+        return 0
+    return min(99, int(state.get('done', 0) * 100 / total))
+
+
+def status_payload(state):
+    return {
+        'job_id': state['id'],
+        'status': state['status'],
+        'stage': state.get('stage'),
+        'done': state.get('done', 0),
+        'total': state.get('total'),
+        'percent': percent(state),
+        'counters': state.get('counters', {}),
+        'result': state.get('result'),
+        'error': state.get('error'),
+        'status_url': url_for('import_jobs_bp.job_status', job_id=state['id']),
+    }
+
+
+def accepted(state):
+    """202 response for an endpoint that queued `state`."""
+    return jsonify(status_payload(state)), 202
+
+
+# ---------- routes ----------
+import_jobs_bp = Blueprint('import_jobs_bp', __name__)
+
+
+@import_jobs_bp.route('/imports/<job_id>', methods=['GET'])
+def job_status(job_id):
+    state = load(job_id)
+    if state is None or state.get('owner') != (session.get('user_id') or session.get('username')):
+        return jsonify({'error': 'import not found or expired'}), 404
+    return jsonify(status_payload(state))
@@ -0,0 +1,213 @@
+"""
+import_parse.py
+Parallel parsing of multi-file / multi-sheet import uploads.
+
+upload_candidates takes one file and reads only its active sheet, so a recruiter
+with three workbooks (or one workbook with a sheet per source) ran the wizard
+once per sheet, each time waiting for openpyxl, which is CPU-bound and uses one
+core. Here every (file, sheet) pair is a task: list_tasks() finds the sheets,
+parsed() reads them in a small ProcessPoolExecutor, and each task comes back as
+a SheetResult. Header mapping stays in the web process (it needs the
+learned-mapping memory and the layout cache); see import_routes._batch_upload.
+
+A worker reads its sheet in INGEST_CHUNK_ROWS chunks (upload_ingest.iter_frames,
+indexed by sheet row) and pickles each chunk to a spool file as soon as it is
+read, so neither the worker nor the web process ever holds a whole sheet; the
+result carries the header, row count and chunk paths, and SheetResult.frames()
+streams the chunks back one at a time.
+
+Worker processes are started with 'spawn' (forking a threaded gunicorn worker
+that holds DB connections is unsafe) and reused while uploads keep coming, so
+the pandas/openpyxl import cost is paid once per burst, not per upload; the
+pool is shut down after IMPORT_PARSE_IDLE seconds without a parse. Spawned
+children re-import the parent's __main__, so scripts calling parsed() need the
+usual `if __name__ == '__main__'` guard (gunicorn's entry point has one). A
+single task, or IMPORT_PARSE_WORKERS=1, is parsed in-process.
+
+Tunables (env):
+  IMPORT_PARSE_WORKERS  parser processes per web worker     (default 2, at most the usable cores)
+  IMPORT_PARSE_IDLE     seconds an unused pool is kept      (default 300)
+"""
+
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import List, Optional
+
+import pandas as pd
+
+import upload_ingest
+from settings import env_int
+
+logger = logging.getLogger(__name__)
+
+
+def _usable_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+# every gunicorn worker has its own pool, so one process per core each would oversubscribe the box
+IMPORT_PARSE_WORKERS = max(1, env_int('IMPORT_PARSE_WORKERS', min(2, _usable_cores())))
+IMPORT_PARSE_IDLE = env_int('IMPORT_PARSE_IDLE', 300)
+
+
+@dataclass
+class SheetTask:
+    path: str
+    filename: str
+    sheet: Optional[str] = None           # None: the file's only / active sheet
+    spool: Optional[str] = None           # chunk files are <spool>-<k>.pkl (set by parsed())
+
+
+@dataclass
+class SheetResult:
+    filename: str
+    sheet: Optional[str]
+    columns: List[str] = field(default_factory=list)
+    rows: int = 0
+    chunks: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    error: Optional[str] = None
+    pid: int = field(default_factory=os.getpid)
+
+    def frames(self):
+        """The sheet's chunks as DataFrames indexed by sheet row, one at a time."""
+        for path in self.chunks:
+            yield pd.read_pickle(path)
+
+
+def sheet_names(path, kind):
+    """Sheets to read from the file at `path`: every sheet of an .xlsx, [None] otherwise."""
+    if kind != upload_ingest.XLSX:
+        return [None]
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def list_tasks(files):
+    """SheetTasks for [(path, filename)], one per sheet; unreadable files get a single task
+    so the error is reported per file by parse_sheet."""
+    tasks = []
+    for path, filename in files:
+        try:
+            names = sheet_names(path, upload_ingest.file_kind(filename))
+        except Exception:
+            names = [None]
+        tasks.extend(SheetTask(path, filename, name) for name in names)
+    return tasks
+
+
+def parse_sheet(task):
+    """Read one sheet chunk by chunk into spool files (runs in a worker process)."""
+    t0 = time.perf_counter()
+    result = SheetResult(task.filename, task.sheet)
+    kind = upload_ingest.file_kind(task.filename)
+    try:
+        for k, df in enumerate(upload_ingest.iter_frames(task.path, kind, sheet=task.sheet, sheet_rows=True)):
+            result.columns = result.columns or list(df.columns)
+            if df.empty:
+                continue
+            path = '%s-%d.pkl' % (task.spool, k)
+            df.to_pickle(path)
+            result.chunks.append(path)
+            result.rows += len(df)
+    except Exception as e:
+        return SheetResult(task.filename, task.sheet, error=str(e)[:300],
+                           seconds=time.perf_counter() - t0)
+    result.seconds = time.perf_counter() - t0
+    return result
+
+
+# ---------- pool (per process, rebuilt after fork like import_jobs, released when idle) ----------
+_pool = None
+_pool_key = None                 # (pid, workers) the pool was built for
+_pool_users = 0                  # parse_all() calls currently using the pool
+_idle_timer = None
+_pool_lock = threading.Lock()
+
+
+def _acquire_pool(workers):
+    global _pool, _pool_key, _pool_users
+    with _pool_lock:
+        if _idle_timer is not None:
+            _idle_timer.cancel()
+        if _pool is None or _pool_key != (os.getpid(), workers):
+            if _pool is not None and _pool_key[0] == os.getpid() and _pool_users == 0:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_key = (os.getpid(), workers)
+            _pool_users = 0
+        _pool_users += 1
+        return _pool
+
+
+def _release_pool(pool):
+    global _pool_users, _idle_timer
+    with _pool_lock:
+        if pool is not _pool:
+            return
+        _pool_users -= 1
+        if _pool_users == 0:
+            _idle_timer = threading.Timer(IMPORT_PARSE_IDLE, _shutdown_idle, args=(pool,))
+            _idle_timer.daemon = True
+            _idle_timer.start()
+
+
+def _shutdown_idle(pool):
+    global _pool
+    with _pool_lock:
+        if pool is not _pool or _pool_users:
+            return
+        _pool = None
+    pool.shutdown(wait=False)
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def parse_all(tasks, workers=None) -> List[SheetResult]:
+    """Parse `tasks` (SheetTasks with spool set), in parallel when there is more than one;
+    results in task order. Use parsed() unless you manage the spool files yourself."""
+    workers = IMPORT_PARSE_WORKERS if workers is None else workers
+    if len(tasks) <= 1 or workers <= 1:
+        return [parse_sheet(t) for t in tasks]
+    pool = _acquire_pool(workers)
+    try:
+        return list(pool.map(parse_sheet, tasks))
+    except Exception:
+        # a worker died (OOM, killed): drop the broken pool, parse here this time
+        logger.exception("parallel import parse failed; parsing sequentially")
+        _reset_pool()
+        return [parse_sheet(t) for t in tasks]
+    finally:
+        _release_pool(pool)
+
+
+@contextmanager
+def parsed(tasks, workers=None):
+    """parse_all() with the chunk files in a temp dir that is removed on exit."""
+    spool = tempfile.mkdtemp(prefix='reqtool_parse_', dir=upload_ingest.INGEST_SPOOL_DIR)
+    try:
+        yield parse_all([replace(t, spool=os.path.join(spool, str(i))) for i, t in enumerate(tasks)], workers)
+    finally:
+        shutil.rmtree(spool, ignore_errors=True)
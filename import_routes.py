@@ -1,30 +1,35 @@
 # import_routes.py  (MERGED & PATCHED)
 import os
-import uuid
 import json
-import pandas as pd
-from flask import Blueprint, request, jsonify, session, render_template
+from flask import Blueprint, current_app, request, jsonify, session, render_template
 from datetime import datetime
-import psycopg2
-from fuzzywuzzy import process
-import re
+from psycopg2.extras import execute_values
+import numpy as np
+import hashlib
+import threading
+import time
 import unicodedata
-from functools import lru_cache
+from collections import OrderedDict
+from functools import lru_cache, partial
 from typing import Optional, Tuple
 from flask_login import login_required, current_user
 from uuid import UUID
-
-# Optional semantic embeddings (fallback to fuzzy)
-try:
-    from sentence_transformers import SentenceTransformer
-    EMB_MODEL = SentenceTransformer('all-MiniLM-L6-v2')
-    def compute_embedding(text):
-        return EMB_MODEL.encode([text], convert_to_numpy=True)[0]
-    EMB_ENABLED = True
-except Exception:
-    EMB_ENABLED = False
-    def compute_embedding(text):
-        return None
+from contextlib import ExitStack, contextmanager
+import db_pool
+from bulk_insert import bulk_insert, bulk_update
+from import_dedupe import (NEW as DEDUPE_NEW, POLICIES as DEDUPE_POLICIES, SKIP as DEDUPE_SKIP,
+                           find_existing, frame_keys, plan_commit, record_keys, update_values)
+from header_matcher import TrigramIndex
+import embeddings
+from upload_store import UploadStore
+from upload_ingest import XLSX, IngestStats, file_kind, iter_frames, spooled, tracked
+from import_validation import schema_rules, validate_frame
+import import_delta
+import import_jobs
+import import_parse
+from import_delta import content_columns
+import contacts
+from settings import env_int
 
 # Blueprint
 import_bp = Blueprint("import_bp", __name__)
@@ -37,7 +42,8 @@ DATABASE_URL = os.getenv('DATABASE_URL')
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-UPLOAD_STORE = {}  # in-memory store for DataFrames (same as before)
+# Parsed uploads, on disk so every worker sees them (upload_store.py)
+UPLOAD_STORE = UploadStore(UPLOAD_DIR)
 
 # Canonical schema dictionary (editable)
 CANONICAL_SCHEMA = {
@@ -137,12 +143,16 @@ FORCED_MAPPINGS = {alias: target for target, aliases in FORCED_GROUPS.items() fo
 FORCED_MAPPINGS_NORM = {normalize_col(alias): target for alias, target in FORCED_MAPPINGS.items()}
 FORCED_KEYS_RAW = list(FORCED_MAPPINGS.keys())
 FORCED_KEYS_NORM = list(FORCED_MAPPINGS_NORM.keys())
+# Trigram index over the forced aliases for the nearest-forced pass (header_matcher.py)
+FORCED_INDEX = TrigramIndex(FORCED_KEYS_NORM)
 
 
 # DB helpers
+@contextmanager
 def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
-    return psycopg2.connect(**DB_CONFIG)
+    """Borrow a connection from the shared pool (db_pool.py); returned on exit."""
+    with db_pool.connection() as conn:
+        yield conn
 
 def ensure_memory_table(cur):
     cur.execute("""
@@ -168,19 +178,176 @@ def load_learned_map(cur):
         mem[norm].sort(key=lambda t: t[1], reverse=True)
     return mem
 
+# Process-wide copy of import_mapping_memory, so matching a sheet's headers doesn't
+# open a connection and re-read the whole table for every column. Reloaded when the
+# table's version (row count, sum of weights, newest last_used) changes, checked at
+# most every LEARNED_MAP_TTL seconds; local upserts are applied write-through.
+LEARNED_MAP_TTL = env_int("LEARNED_MAP_TTL", 60)
+
+
+class LearnedMappingIndex:
+    def __init__(self, ttl=LEARNED_MAP_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._map = None            # norm -> [(db_col, weight, confidence)], heaviest first
+        self._version = None
+        self._checked_at = 0.0
+        self._table_ready = False
+
+    @staticmethod
+    def _db_version(cur):
+        cur.execute("SELECT COUNT(*), COALESCE(SUM(weight), 0), MAX(last_used) FROM import_mapping_memory;")
+        return tuple(str(v) for v in cur.fetchone())
+
+    def refresh(self, force=False):
+        """Reload from the DB if the table changed (or always, with force=True)."""
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            if not self._table_ready:
+                ensure_memory_table(cur)
+            version = self._db_version(cur)
+            learned = None
+            if force or self._map is None or version != self._version:
+                learned = load_learned_map(cur)
+            conn.commit()
+            cur.close()
+        with self._lock:
+            self._table_ready = True
+            self._checked_at = time.monotonic()
+            if learned is not None:
+                self._map = learned
+                self._version = version
+
+    def _maybe_refresh(self):
+        if self._map is not None and time.monotonic() - self._checked_at < self.ttl:
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            # keep serving the last copy; retry after another ttl
+            print("Warning: failed to refresh learned mappings:", str(e))
+            with self._lock:
+                self._checked_at = time.monotonic()
+                if self._map is None:
+                    self._map = {}
+
+    def get(self, norm):
+        """[(db_col, weight, confidence)] for a normalized header, heaviest first."""
+        self._maybe_refresh()
+        return list(self._map.get(norm) or [])
+
+    @property
+    def version(self):
+        return self._version
+
+    def record(self, norm, db_col, increment):
+        """Mirror of the import_mapping_memory upsert, applied to the in-process copy."""
+        with self._lock:
+            if self._map is None:
+                return
+            entries = self._map.setdefault(norm, [])
+            for i, (col, weight, conf) in enumerate(entries):
+                if col == db_col:
+                    entries[i] = (col, weight + 1, min(1.0, conf + increment))
+                    break
+            else:
+                entries.append((db_col, 1, float(increment)))
+            entries.sort(key=lambda t: t[1], reverse=True)
+
+
+LEARNED_MAPPINGS = LearnedMappingIndex()
+
+# Whole-sheet mapping results for recurring layouts (the same job-board export every
+# day). Keyed by the ordered normalized headers, the DB column set and, for headers
+# that have learned mappings, the learned column each would pick, so a new or changed
+# learned mapping yields a different signature. Persisted in import_layout_cache
+# (migration 8, migrations.py) so every worker shares it, with a small per-process
+# LRU in front.
+LAYOUT_CACHE_SIZE = env_int("LAYOUT_CACHE_SIZE", 256)
+LAYOUT_CACHE_MAX_AGE_DAYS = env_int("LAYOUT_CACHE_MAX_AGE_DAYS", 90)
+
+
+def layout_signature(norm_headers, db_columns):
+    learned = []
+    for norm in norm_headers:
+        top = LEARNED_MAPPINGS.get(norm)[:1]
+        learned.append(top[0][0] if top else None)
+    key = json.dumps([list(norm_headers), sorted(db_columns), learned], separators=(",", ":"))
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class LayoutMappingCache:
+    def __init__(self, size=LAYOUT_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._local = OrderedDict()     # signature -> mappings
+
+    def _remember(self, signature, mappings):
+        with self._lock:
+            self._local[signature] = mappings
+            self._local.move_to_end(signature)
+            while len(self._local) > self.size:
+                self._local.popitem(last=False)
+
+    def get(self, signature):
+        """Cached mappings (copies) for a layout signature, or None."""
+        with self._lock:
+            mappings = self._local.get(signature)
+            if mappings is not None:
+                self._local.move_to_end(signature)
+        if mappings is None:
+            try:
+                with get_db_connection() as conn:
+                    cur = conn.cursor()
+                    cur.execute("""
+                        UPDATE import_layout_cache SET hits = hits + 1, last_used = NOW()
+                        WHERE signature = %s RETURNING mappings;
+                    """, (signature,))
+                    row = cur.fetchone()
+                    conn.commit()
+                    cur.close()
+            except Exception as e:
+                print("Warning: layout cache lookup failed:", str(e))
+                return None
+            if not row:
+                return None
+            mappings = row[0]
+            self._remember(signature, mappings)
+        return [dict(m) for m in mappings]
+
+    def put(self, signature, norm_headers, mappings):
+        mappings = [dict(m) for m in mappings]
+        self._remember(signature, mappings)
+        try:
+            with get_db_connection() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    INSERT INTO import_layout_cache (signature, headers, mappings)
+                    VALUES (%s, %s::jsonb, %s::jsonb)
+                    ON CONFLICT (signature)
+                    DO UPDATE SET mappings = EXCLUDED.mappings, last_used = NOW();
+                """, (signature, json.dumps(list(norm_headers)), json.dumps(mappings, default=str)))
+                cur.execute("DELETE FROM import_layout_cache WHERE last_used < NOW() - make_interval(days => %s);",
+                            (LAYOUT_CACHE_MAX_AGE_DAYS,))
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            print("Warning: failed to persist layout mapping:", str(e))
+
+
+LAYOUT_CACHE = LayoutMappingCache()
+
 # Build canonical lookup for quick exact/alias matches
 CANONICAL_LOOKUP = {}
 for dbcol, variants in CANONICAL_SCHEMA.items():
     for v in variants:
         CANONICAL_LOOKUP[normalize_col(v)] = dbcol
 
-# Precompute embeddings for canonical names if embeddings enabled
-CANONICAL_EMB = {}
-if EMB_ENABLED:
-    for dbcol, variants in CANONICAL_SCHEMA.items():
-        text = dbcol + " " + " ".join(variants)
-        emb = compute_embedding(text)
-        CANONICAL_EMB[dbcol] = emb
+# Optional semantic embeddings (fallback to fuzzy); the model loads on first use (embeddings.py)
+CANONICAL_SEMANTIC = embeddings.SemanticIndex(
+    embeddings.BACKEND,
+    {dbcol: dbcol + " " + " ".join(variants) for dbcol, variants in CANONICAL_SCHEMA.items()},
+)
 
 def heuristic_guess(norm: str) -> Tuple[Optional[str], float, str]:
     """
@@ -207,6 +374,11 @@ def heuristic_guess(norm: str) -> Tuple[Optional[str], float, str]:
         return "ctc_current", 0.86, "Heuristic: ctc current-ish"
     return None, 0.0, "No heuristic"
 
+# Trigram index over the DB column set, for the fuzzy passes (header_matcher.py)
+@lru_cache(maxsize=32)
+def db_column_index(db_columns: tuple) -> TrigramIndex:
+    return TrigramIndex(db_columns)
+
 # Semantic match: returns (dbcol, score, reason)
 def semantic_match(uploaded_col, db_columns):
     norm = normalize_col(uploaded_col)
@@ -214,15 +386,10 @@ def semantic_match(uploaded_col, db_columns):
     if norm in CANONICAL_LOOKUP:
         return CANONICAL_LOOKUP[norm], 1.0, "Canonical dictionary"
 
-    # 3. learned memory (match by normalized uploaded col)
-    conn = get_db_connection()
-    cur = conn.cursor()
-    ensure_memory_table(cur)
-    learned = load_learned_map(cur)
-    cur.close()
-    conn.close()
-    if norm in learned and learned[norm]:
-        top = learned[norm][0]
+    # 3. learned memory (match by normalized uploaded col; in-process index, no DB round trip)
+    learned = LEARNED_MAPPINGS.get(norm)
+    if learned:
+        top = learned[0]
         return top[0], min(1.0, top[1] / (top[1] + 1)), "Learned"
 
     # 3.5. heuristic guess
@@ -231,89 +398,74 @@ def semantic_match(uploaded_col, db_columns):
         return dbcol_h, float(score_h), why_h
 
     # 4. semantic/embeddings
-    if EMB_ENABLED:
-        emb_u = compute_embedding(uploaded_col)
-        best = None
-        best_score = -1
-        for dbc, emb in CANONICAL_EMB.items():
-            import numpy as np
-            s = float(np.dot(emb_u, emb) / (np.linalg.norm(emb_u) * np.linalg.norm(emb) + 1e-9))
-            if s > best_score:
-                best_score = s
-                best = dbc
-        if best_score is not None:
-            return best, float(best_score), "Semantic"
+    semantic = CANONICAL_SEMANTIC.best(uploaded_col)
+    if semantic:
+        return semantic[0], semantic[1], "Semantic"
 
     # 5. fallback to fuzzy
     if db_columns:
-        res = process.extractOne(uploaded_col, db_columns)
+        res = db_column_index(tuple(db_columns)).extract_one(uploaded_col)
         if res:
             best_match, score = res
             return best_match, float(score/100.0), "Fuzzy"
 
     return None, 0.0, "No match"
 
-# validate function (keep your schema logic)
-def validate_row_against_schema(row, schema):
-    errors = []
-    for col, col_type in schema.items():
-        val = row.get(col)
-        if col_type == "integer":
-            if val is None or str(val).strip() == "" or not str(val).isdigit():
-                errors.append(f"{col} must be an integer")
-        elif col_type == "email":
-            if not val or not re.match(r"[^@]+@[^@]+\.[^@]+", str(val)):
-                errors.append(f"{col} is not a valid email")
-        elif col_type == "phone":
-            if not val or not str(val).isdigit():
-                errors.append(f"{col} must be numeric")
-        elif col_type == "required":
-            if val is None or str(val).strip() == "":
-                errors.append(f"{col} is required")
-    return errors
+def contact_columns(columns, mapping=None):
+    """{contacts.PHONE: [...], contacts.EMAIL: [...]}: sheet columns holding phones/emails,
+    by the user's mapping (uploaded -> DB column), DB column name or forced alias."""
+    mapping = mapping or {}
+    found = {contacts.PHONE: [], contacts.EMAIL: []}
+    for col in columns:
+        target = mapping.get(col) or (col if col in ("phones", "emails") else FORCED_MAPPINGS_NORM.get(normalize_col(col)))
+        if target == "phones":
+            found[contacts.PHONE].append(col)
+        elif target == "emails":
+            found[contacts.EMAIL].append(col)
+    return found
+
+def existing_candidates(df, contact_cols, requirement_id):
+    """Per row: None, or where a candidate with the same phone/email already exists.
+
+    One lookup for the whole sheet (import_dedupe.py); advisory, so a failed
+    lookup (or no requirement to compare against) just returns [].
+    """
+    if requirement_id is None or not str(requirement_id).isdigit():
+        return []
+    try:
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            matches = find_existing(cur, frame_keys(df, contact_cols), int(requirement_id))
+            cur.close()
+    except Exception as e:
+        print("Warning: duplicate lookup failed:", str(e))
+        return []
+    return [m.as_dict() if m.status != DEDUPE_NEW else None for m in matches]
 
 # --- ROUTES ---
 
+
 @import_bp.route("/candidates/import", methods=["GET"])
 @import_bp.route("/candidates/import/<int:req_id>", methods=["GET"])
 def import_page(req_id):
     return render_template("candidates_import.html", req_id=req_id)
 
-@import_bp.route("/candidates/import/upload", methods=["POST"])
-def upload_candidates():
-    if "file" not in request.files:
-        return jsonify({"success": False, "error": "No file uploaded"})
-
-    file = request.files["file"]
-    filename = file.filename
-
-    try:
-        if filename.endswith(".csv"):
-            df = pd.read_csv(file)
-        else:
-            df = pd.read_excel(file)
-    except Exception as e:
-        return jsonify({"success": False, "error": f"Failed to read file: {str(e)}"})
-
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("""SELECT column_name FROM information_schema.columns WHERE table_name='candidates';""")
-    db_columns = [r[0] for r in cur.fetchall()]
-    cur.close()
-    conn.close()
-
-    if "Not Needed" not in db_columns:
-        db_columns.append("Not Needed")
-
+def compute_mappings(columns, db_columns):
+    """Match uploaded column names to DB columns: forced, nearest-forced, semantic, fuzzy."""
     mappings = []
     used = set()
-    for col in df.columns:
+    # score every header against every forced alias / DB column in one go
+    norm_cols = [normalize_col(c) for c in columns]
+    forced_scores = FORCED_INDEX.scores(norm_cols)
+    db_index = db_column_index(tuple(db_columns))
+    db_scores = db_index.scores(list(columns))
+    for i, col in enumerate(columns):
         matched = None
         status = "Not Matched"
         confidence = 0.0
         reason = "None"
         reason_sm = "" 
-        norm_col = normalize_col(col)
+        norm_col = norm_cols[i]
         # 1) Forced (normalized) first
         if norm_col in FORCED_MAPPINGS_NORM:
             cand = FORCED_MAPPINGS_NORM[norm_col]
@@ -323,7 +475,7 @@ def upload_candidates():
         # 2) Nearest match to forced (fuzzy on normalized forced keys)
         if not matched and FORCED_KEYS_NORM:
             try:
-                best_key, best_score = process.extractOne(norm_col, FORCED_KEYS_NORM)
+                best_key, best_score = FORCED_INDEX.extract_one(norm_col, row=forced_scores[:, i])
                 scoref = (best_score or 0)/100.0
                 if scoref >= 0.90:
                     cand = FORCED_MAPPINGS_NORM.get(best_key)
@@ -344,9 +496,9 @@ def upload_candidates():
                     used.add(dbcol)
 
         if not matched:
-            remaining = [c for c in db_columns if c != "Not Needed" and c not in used]
-            if remaining:
-                res = process.extractOne(col, remaining)
+            allowed = np.array([c != "Not Needed" and c not in used for c in db_columns])
+            if allowed.any():
+                res = db_index.extract_one(col, row=db_scores[:, i], allowed=allowed)
                 if res:
                     best_match, score = res
                     scoref = score / 100.0
@@ -363,21 +515,176 @@ def upload_candidates():
             "reason": reason if (matched is None or status.startswith("Matched (Forced")) else (reason_sm or reason)
 
         })
+    return mappings
+
+def candidate_db_columns():
+    """Columns of the candidates table, plus the "Not Needed" choice."""
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""SELECT column_name FROM information_schema.columns WHERE table_name='candidates';""")
+        db_columns = [r[0] for r in cur.fetchall()]
+        cur.close()
+    if "Not Needed" not in db_columns:
+        db_columns.append("Not Needed")
+    return db_columns
+
+def map_columns(columns, db_columns):
+    """(mappings, from_cache) for an uploaded header row; known layouts come from LAYOUT_CACHE."""
+    norm_headers = [normalize_col(c) for c in columns]
+    signature = layout_signature(norm_headers, db_columns)
+    mappings = LAYOUT_CACHE.get(signature)
+    if mappings is not None:
+        return [dict(m, uploaded=col, cached=True) for m, col in zip(mappings, columns)], True
+    mappings = compute_mappings(columns, db_columns)
+    LAYOUT_CACHE.put(signature, norm_headers, mappings)
+    return mappings, False
+
+@import_bp.route("/candidates/import/upload", methods=["POST"])
+def upload_candidates():
+    if "file" not in request.files:
+        return jsonify({"success": False, "error": "No file uploaded"})
+
+    file = request.files["file"]
+    filename = file.filename
+
+    # spool to disk, parse in chunks straight into the upload store (upload_ingest.py)
+    kind = file_kind(filename)
+    stats = IngestStats()
+    try:
+        with spooled(file) as path:
+            if kind == XLSX and len(import_parse.sheet_names(path, kind)) > 1:
+                # only the active sheet would be read here; the batch path reads every sheet
+                return _batch_upload([(path, filename)])
+            upload_id = UPLOAD_STORE.put_frames(tracked(iter_frames(path, kind), stats))
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Failed to read file: {str(e)}"})
+    columns = stats.columns or []
+    db_columns = candidate_db_columns()
+    mappings, layout_cached = map_columns(columns, db_columns)
 
-    upload_id = str(uuid.uuid4())
-    UPLOAD_STORE[upload_id] = df
     session["upload_id"] = upload_id
-    csv_path = os.path.join(UPLOAD_DIR, f"{upload_id}.csv")
-    df.to_csv(csv_path, index=False)
 
     return jsonify({
         "success": True,
         "upload_id": upload_id,
         "mappings": mappings,
         "db_columns": db_columns,
-        "total_rows": len(df)
+        "total_rows": stats.rows,
+        "layout_cached": layout_cached,
+        "preview": stats.preview,
+        "stats": stats.as_dict()
     })
 
+# provenance columns of a batch upload (never mapped to the DB)
+SOURCE_COLUMNS = ("source_file", "source_sheet", "source_row")
+IMPORT_BATCH_MAX_FILES = env_int("IMPORT_BATCH_MAX_FILES", 20)
+
+def _sheet_columns(result, db_columns):
+    """({sheet column: merged column}, sheet mappings, from_cache) for one parsed sheet.
+
+    Headers without a match keep their name (suffixed with the file when it would
+    clash) so they can still be mapped by hand in the merged preview.
+    """
+    mappings, cached = map_columns(result.columns, [c for c in db_columns if c not in ("id", "requirement_id")])
+    rename, taken = {}, set()
+    for m in mappings:
+        target = m.get("matched")
+        if target and target != "Not Needed" and target not in taken:
+            rename[m["uploaded"]] = target
+            taken.add(target)
+    for col in result.columns:
+        if col not in rename:
+            name = str(col)
+            if name in db_columns or name in SOURCE_COLUMNS:
+                name = "%s (%s)" % (name, result.filename)
+            rename[col] = name
+    return rename, mappings, cached
+
+def _sheet_frames(sheets, columns):
+    """Every sheet's chunks renamed to the merged `columns`, with provenance, one chunk at a time."""
+    for result, rename in sheets:
+        for df in result.frames():
+            part = df.rename(columns=rename)
+            part = part.loc[:, ~part.columns.duplicated()].assign(
+                source_file=result.filename, source_sheet=result.sheet or "", source_row=df.index.to_numpy())
+            yield part.reindex(columns=columns)
+
+def _batch_upload(paths):
+    """Parse every sheet of the spooled [(path, filename)] in parallel (import_parse.py), map each
+    sheet's headers and merge them into one upload with source_file/source_sheet/source_row."""
+    t0 = time.perf_counter()
+    with ExitStack() as stack:
+        try:
+            results = stack.enter_context(import_parse.parsed(import_parse.list_tasks(paths)))
+        except Exception as e:
+            return jsonify({"success": False, "error": f"Failed to read files: {str(e)}"})
+        parse_seconds = time.perf_counter() - t0
+
+        db_columns = candidate_db_columns()
+        sources, sheets = [], []
+        for r in results:
+            source = {"file": r.filename, "sheet": r.sheet, "seconds": round(r.seconds, 3)}
+            if r.error is not None:
+                source["error"] = r.error
+            elif not r.rows:
+                source["rows"] = 0
+            else:
+                rename, source["mappings"], source["layout_cached"] = _sheet_columns(r, db_columns)
+                source["rows"] = r.rows
+                sheets.append((r, rename))
+            sources.append(source)
+        if not sheets:
+            return jsonify({"success": False, "error": "No rows found in the uploaded files", "sources": sources})
+
+        columns = list(dict.fromkeys(c for r, rename in sheets for c in (rename[col] for col in r.columns)
+                                     if c not in SOURCE_COLUMNS))
+        columns += list(SOURCE_COLUMNS)
+        stats = IngestStats()
+        upload_id = UPLOAD_STORE.put_frames(tracked(_sheet_frames(sheets, columns), stats))
+    session["upload_id"] = upload_id
+
+    # merged columns already carry DB names; unmatched headers and provenance start unmapped
+    mappings = []
+    for col in columns:
+        if col in SOURCE_COLUMNS:
+            mappings.append({"uploaded": col, "matched": "Not Needed", "status": "Not Needed",
+                             "confidence": 1.0, "reason": "Source"})
+        elif col in db_columns:
+            mappings.append({"uploaded": col, "matched": col, "status": "Matched (Per sheet)",
+                             "confidence": 1.0, "reason": "Per sheet"})
+        else:
+            mappings.append({"uploaded": col, "matched": None, "status": "Not Matched",
+                             "confidence": 0.0, "reason": "None"})
+
+    return jsonify({
+        "success": True,
+        "upload_id": upload_id,
+        "mappings": mappings,
+        "db_columns": db_columns,
+        "total_rows": stats.rows,
+        "preview": stats.preview,
+        "stats": stats.as_dict(),
+        "sources": sources,
+        "parse": {"sheets": len(results), "workers": min(import_parse.IMPORT_PARSE_WORKERS, len(results)),
+                  "seconds": round(parse_seconds, 3),
+                  "sheet_seconds": round(sum(r.seconds for r in results), 3)},
+    })
+
+@import_bp.route("/candidates/import/upload_batch", methods=["POST"])
+def upload_candidates_batch():
+    """Several files and/or every sheet of a workbook, parsed in parallel (import_parse.py),
+    mapped per sheet and merged into one upload with source_file/source_sheet/source_row."""
+    files = [f for f in request.files.getlist("files") + request.files.getlist("file") if f and f.filename]
+    if not files:
+        return jsonify({"success": False, "error": "No file uploaded"})
+    if len(files) > IMPORT_BATCH_MAX_FILES:
+        return jsonify({"success": False, "error": f"At most {IMPORT_BATCH_MAX_FILES} files per upload"})
+    try:
+        with ExitStack() as stack:
+            return _batch_upload([(stack.enter_context(spooled(f)), f.filename) for f in files])
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Failed to read files: {str(e)}"})
+
 @import_bp.route("/candidates/import/validate", methods=["POST"])
 def validate_candidates():
     data = request.get_json(silent=True) or {}
@@ -391,19 +698,22 @@ def validate_candidates():
             session["mapping"] = {k: v for k, v in mapping.items() if v and v != "Not Needed"}
 
     upload_id = data.get("upload_id")
-    if not upload_id or upload_id not in UPLOAD_STORE:
+    df = UPLOAD_STORE.get(upload_id)
+    if df is None:
         return jsonify({"success": False, "error": "Upload session expired. Please re-upload file."})
 
-    df = UPLOAD_STORE[upload_id]
+    # whole-column masks + in-file duplicates on normalized phones/emails (import_validation.py)
+    contact_cols = contact_columns(df.columns, session.get("mapping"))
+    row_errors = validate_frame(df, schema_rules(schema), contact_cols)
+    existing = existing_candidates(df, contact_cols, data.get("requirement_id") or session.get("requirement_id"))
     validated = []
-    for idx, row in df.iterrows():
-        rowdict = row.to_dict()
-        errors = validate_row_against_schema(rowdict, schema)
+    for i, (rowdict, errors) in enumerate(zip(df.to_dict("records"), row_errors)):
         validated.append({
-            "rownum": idx + 1,
+            "rownum": i + 1,
             "data": rowdict,
             "status": "error" if errors else "ok",
-            "error": "; ".join(errors) if errors else ""
+            "error": "; ".join(errors) if errors else "",
+            "existing": existing[i] if existing else None
         })
 
     return jsonify({
@@ -413,10 +723,199 @@ def validate_candidates():
         "rows": validated
     })
 
+# ---------- commit job (runs in import_jobs' thread pool) ----------
+IMPORT_COMMIT_CHUNK = env_int("IMPORT_COMMIT_CHUNK", 1000)   # rows written + committed at a time
+JD_EMAIL_CHUNK = 25                                            # JD emails between progress updates
+
+
+def _mapped_records(rows, mapping, db_columns, requirement_id, added_by):
+    """DB rows for the sheet rows (blank ones dropped) and [(sheet row number, sheet row)] alongside."""
+    records = []
+    source_rows = []
+    now = datetime.now()
+    for row_no, row in enumerate(rows, start=1):
+        mapped_row = {}
+        for uploaded_col, db_col in mapping.items():
+            if db_col and db_col != "Not Needed" and db_col in db_columns:
+                mapped_row[db_col] = row.get(uploaded_col)
+
+        # skip totally empty rows
+        if not any(v and str(v).strip() for v in mapped_row.values()):
+            continue
+
+        # system fields
+        mapped_row["application_date"] = now
+        mapped_row["requirement_id"] = requirement_id
+        if added_by is not None:
+            mapped_row["added_by"] = added_by
+
+        records.append(mapped_row)
+        source_rows.append((row_no, row))
+    return records, source_rows
+
+
+def _fetch_requirement(cur, requirement_id):
+    cur.execute("SELECT * FROM requirements WHERE id = %s", (requirement_id,))
+    row = cur.fetchone()
+    if not row:
+        return {"id": requirement_id}
+    return dict(zip([d[0] for d in cur.description], row))
+
+
+def _user_email(cur, user):
+    """Email of the importing user (CC'd on JD emails); the session isn't available in the job."""
+    if not user or "@" in str(user):
+        return user
+    try:
+        cur.execute("SELECT email FROM users WHERE username = %s OR email = %s", (user, user))
+        row = cur.fetchone()
+        return row[0] if row and row[0] else user
+    except Exception:
+        return user
+
+
+def _primary_email(record, email_cols):
+    for col in email_cols:
+        for token in contacts.split_contacts(record.get(col)):
+            if contacts.normalize_email(token):
+                return token
+    return None
+
+
+def remember_mappings(mapping, increment=0.1):
+    """Learn the confirmed mapping: one multi-row upsert into import_mapping_memory."""
+    pairs = {}
+    for uploaded_col, db_col in mapping.items():
+        if db_col and db_col != "Not Needed":
+            pairs.setdefault((normalize_col(uploaded_col), db_col), uploaded_col)
+    if not pairs:
+        return
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        ensure_memory_table(cur)
+        execute_values(cur, """
+            INSERT INTO import_mapping_memory (uploaded_col_norm, uploaded_col_raw, db_col, weight, confidence, last_used)
+            VALUES %s
+            ON CONFLICT (uploaded_col_norm, db_col)
+            DO UPDATE SET weight = import_mapping_memory.weight + 1,
+                          confidence = LEAST(1.0, COALESCE(import_mapping_memory.confidence, 1.0)
+                                                  + EXCLUDED.confidence),
+                          last_used = NOW();
+        """,
+            [(norm, raw, db_col, 1, increment) for (norm, db_col), raw in pairs.items()],
+            template="(%s, %s, %s, %s, %s, NOW())")
+        conn.commit()
+        cur.close()
+    for norm, db_col in pairs:
+        LEARNED_MAPPINGS.record(norm, db_col, increment)
+
+
+def send_jd_emails(progress, requirement, candidates, initiator):
+    """JD email to each {'id', 'candidate_name', 'primary_email'}, JD_EMAIL_CHUNK at a time."""
+    import emails
+    templates = emails.render_requirement_jd(requirement)
+    progress.stage("emails", len(candidates))
+    for start in range(0, len(candidates), JD_EMAIL_CHUNK):
+        chunk = candidates[start:start + JD_EMAIL_CHUNK]
+        try:
+            report = emails.send_requirement_jd(requirement, chunk, initiator_user_id=initiator,
+                                                subject=templates.get("subject"),
+                                                body_html=templates.get("html"),
+                                                body_text=templates.get("text"))
+            progress.advance(len(chunk), emails_sent=report.get("sent", 0),
+                             emails_failed=report.get("failed", 0))
+        except Exception as e:
+            print("Post-import email send failed:", e)
+            progress.advance(len(chunk), emails_failed=len(chunk))
+
+
+def run_commit(progress, requirement_id, mapping, rows, on_duplicate, upload_id=None, added_by=None):
+    """Body of an import commit job; returns the summary the UI shows.
+
+    Rows are written IMPORT_COMMIT_CHUNK at a time, each chunk committed on its
+    own (delta against earlier imports, duplicate check, batched INSERT/UPDATE,
+    fingerprints), then the mapping memory is learned and the JD emails go out.
+    """
+    skipped = []
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+    to_email = []
+    with db_pool.connection(request_scoped=False) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'candidates'")
+            db_columns = {r[0] for r in cur.fetchall()}
+            records, source_rows = _mapped_records(rows, mapping, db_columns, requirement_id, added_by)
+            update_cols = content_columns(c for c in mapping.values() if c in db_columns)
+            email_cols = [c for c in update_cols if "email" in c.lower()]
+            sql_updated = {"updated_date": "now()"} if "updated_date" in db_columns else None
+            batch_id = import_delta.start_batch(cur, requirement_id, upload_id, added_by, len(records))
+            conn.commit()
+
+            progress.stage("rows", len(records))
+            for start in range(0, len(records), IMPORT_COMMIT_CHUNK):
+                chunk = records[start:start + IMPORT_COMMIT_CHUNK]
+                # rows imported into this requirement before: unchanged ones are left alone,
+                # changed ones updated in place (import_delta.py)
+                delta = import_delta.compare(cur, requirement_id, chunk, update_cols)
+                # the rest: rows already in this requirement by phone/email, then the policy (import_dedupe.py)
+                matches = find_existing(cur, [record_keys(r) for r in chunk], requirement_id)
+                plan = plan_commit(matches, on_duplicate, exclude=delta.handled)
+                result = bulk_insert(cur, "candidates", chunk, skip=plan.not_inserted | delta.handled,
+                                     returning="id")
+                updates = [(i, cid, import_delta.content_values(chunk[i], update_cols)) for i, cid in delta.changed]
+                updates += [(i, cid, update_values(chunk[i], update_cols)) for i, cid in plan.update]
+                updated = bulk_update(cur, "candidates", updates, sql_values=sql_updated)
+
+                written = dict(result.returned)
+                updated_rows = set(updated.updated_indexes)
+                written.update((i, cid) for i, cid, _ in updates if i in updated_rows)
+                import_delta.store(cur, requirement_id, batch_id,
+                                   {cid: delta.fingerprints[i] for i, cid in written.items()})
+                conn.commit()
+
+                chunk_skipped = [{"row": source_rows[start + i][0], "reasons": [reason]} for i, reason in plan.skipped]
+                chunk_skipped += [{"row": source_rows[start + i][0], "reasons": [err]}
+                                  for i, err in result.failed + updated.failed]
+                skipped += chunk_skipped
+                totals["inserted"] += result.inserted
+                totals["updated"] += updated.updated
+                totals["unchanged"] += len(delta.unchanged)
+                progress.advance(len(chunk), inserted=result.inserted, updated=updated.updated,
+                                 unchanged=len(delta.unchanged), skipped=len(chunk_skipped))
+                # only rows that actually went in get the JD email
+                for i, cid in sorted(result.returned.items()):
+                    primary = _primary_email(chunk[i], email_cols)
+                    if primary:
+                        to_email.append({"id": cid, "candidate_name": chunk[i].get("candidate_name") or "",
+                                         "primary_email": primary})
+
+            skipped.sort(key=lambda s: s["row"])
+            import_delta.finish_batch(cur, batch_id, totals["inserted"], totals["updated"], totals["unchanged"],
+                                      len(skipped))
+            conn.commit()
+            requirement = _fetch_requirement(cur, requirement_id) if to_email else None
+            initiator = _user_email(cur, added_by) if to_email else None
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    try:
+        remember_mappings(mapping)
+    except Exception as e:
+        print("Warning: failed to persist mapping memory:", str(e))
+    if to_email:
+        send_jd_emails(progress, requirement, to_email, initiator)
+
+    return {"rows_inserted": totals["inserted"], "rows_updated": totals["updated"],
+            "rows_unchanged": totals["unchanged"], "skipped": skipped,
+            "on_duplicate": on_duplicate, "batch_id": batch_id}
+
+
 @import_bp.route("/candidates/import/commit", methods=["POST"])
 def commit_candidates():
     import json
-    from uuid import UUID
 
     # --- Accept both JSON (validation modal) and form (review page) ---
     payload = request.get_json(silent=True) or {}
@@ -458,200 +957,20 @@ def commit_candidates():
     if not mapping or not isinstance(mapping, dict):
         return jsonify({"status": "error", "message": "Mapping not found or invalid format in POST data"}), 400
 
-    # --- Open DB + introspect columns + added_by type ---
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("""SELECT column_name, data_type, udt_name
-                       FROM information_schema.columns
-                       WHERE table_name='candidates';""")
-        cols_meta = cur.fetchall()
-        db_columns = {r[0] for r in cols_meta}
-        added_by_type = None
-        for col_name, data_type, udt_name in cols_meta:
-            if col_name == "added_by":
-                # Postgres reports UUID as data_type 'uuid' or udt_name 'uuid'
-                added_by_type = (data_type or "").lower() or (udt_name or "").lower()
-                break
-
-        # --- Derive current user id (don’t require login decorator) ---
-        user_id_raw = None
-        try:
-            # flask-login style
-            from flask_login import current_user
-            if current_user is not None:
-                user_id_raw = getattr(current_user, "id", None)
-                if user_id_raw is None and hasattr(current_user, "get_id"):
-                    user_id_raw = current_user.get_id()
-        except Exception:
-            pass
-        # Also allow session fallback
-        if user_id_raw is None:
-            user_id_raw = (session.get("user_id") or session.get("uid") or None)
-
-        # Coerce based on DB column type (if present)
-        def coerce_added_by(val):
-            if val is None or "added_by" not in db_columns:
-                return None
-            # UUID column?
-            if added_by_type == "uuid":
-                try:
-                    return str(UUID(str(val)))
-                except Exception:
-                    return None
-            # Integer-like column?
-            if added_by_type in {"integer", "int4", "bigint", "int8", "smallint", "int2"}:
-                try:
-                    return int(val)
-                except Exception:
-                    return None
-            # Anything else -> store as text
-            return str(val)
-
-        added_by_value = session.get("username") 
-
-        # --- Insert rows ---
-        inserted = 0
-        for row in (rows or []):
-            mapped_row = {}
-            for uploaded_col, db_col in mapping.items():
-                if db_col and db_col != "Not Needed" and db_col in db_columns:
-                    mapped_row[db_col] = row.get(uploaded_col)
-
-            # skip totally empty rows
-            if not any(v and str(v).strip() for v in mapped_row.values()):
-                continue
-
-            # system fields
-            mapped_row["application_date"] = datetime.now()
-            mapped_row["requirement_id"] = requirement_id
+    # --- What to do with rows already in this requirement (see import_dedupe.py) ---
+    on_duplicate = (payload.get("on_duplicate") if is_json else request.form.get("on_duplicate")) or DEDUPE_SKIP
+    if on_duplicate not in DEDUPE_POLICIES:
+        return jsonify({"status": "error", "message": "on_duplicate must be one of: " + ", ".join(DEDUPE_POLICIES)}), 400
 
-            # stamp added_by if we could coerce it
-            if added_by_value is not None:
-                mapped_row["added_by"] = added_by_value
+    rows = [r for r in rows if isinstance(r, dict)] if isinstance(rows, list) else []
 
-            cols = list(mapped_row.keys())
-            vals = list(mapped_row.values())
-            placeholders = ", ".join(["%s"] * len(vals))
-            colnames = ", ".join([f'"{c}"' for c in cols])
-            query = f"INSERT INTO candidates ({colnames}) VALUES ({placeholders})"
-            cur.execute(query, vals)
-            inserted += 1
-
-        conn.commit()
-
-        # --- POST-COMMIT: best-effort send GD/JD emails to inserted candidates ---
-        try:
-            # import here to avoid changing top-level imports
-            import emails
-            # Build minimal requirement dict
-            requirement = {'id': requirement_id}
-            try:
-                cur.execute("SELECT * FROM requirements WHERE id = %s", (requirement_id,))
-                req_row = cur.fetchone()
-                if req_row:
-                    try:
-                        cols = [d.name if hasattr(d, 'name') else d[0] for d in cur.description]
-                        requirement = dict(zip(cols, req_row))
-                    except Exception:
-                        try:
-                            requirement = dict(req_row)
-                        except Exception:
-                            requirement = {'id': requirement_id}
-            except Exception:
-                requirement = {'id': requirement_id}
-
-            # Find uploaded headers mapped to email-like DB columns
-            email_uploaded_keys = []
-            try:
-                for uploaded_col, db_col in (mapping or {}).items():
-                    if not db_col:
-                        continue
-                    if isinstance(db_col, str) and 'email' in db_col.lower():
-                        email_uploaded_keys.append(uploaded_col)
-            except Exception:
-                email_uploaded_keys = []
-
-            # Fallback: uploaded header names containing 'email'
-            if not email_uploaded_keys:
-                try:
-                    for uploaded_col in (mapping or {}).keys():
-                        if 'email' in str(uploaded_col).lower():
-                            email_uploaded_keys.append(uploaded_col)
-                except Exception:
-                    pass
-
-            # Build simple candidates list with primary_email only (as expected by emails.send_requirement_jd)
-            candidates_to_send = []
-            for r_row in (rows or []):
-                if not isinstance(r_row, dict):
-                    continue
-                primary = None
-                for ek in email_uploaded_keys:
-                    val = r_row.get(ek)
-                    if not val:
-                        continue
-                    if isinstance(val, list) and val:
-                        primary = str(val[0]).strip()
-                    else:
-                        # take first of comma-separated if present
-                        sval = str(val).strip()
-                        if ',' in sval:
-                            primary = sval.split(',')[0].strip()
-                        else:
-                            primary = sval
-                    if primary:
-                        break
-                if primary:
-                    candidates_to_send.append({
-                        'id': None,
-                        'candidate_name': '',
-                        'primary_email': primary
-                    })
-
-            # Call the email helper (best-effort)
-            if candidates_to_send:
-                try:
-                    emails.send_requirement_jd(requirement, candidates_to_send, initiator_user_id=added_by_value)
-                except Exception as e_send:
-                    try:
-                        print("Post-import email send failed:", e_send)
-                    except Exception:
-                        pass
-        except Exception:
-            # swallow any errors here so import result is unaffected
-            pass
-        # --- END POST-COMMIT EMAIL ---
-    except Exception as e:
-        conn.rollback()
-        # Return the first ~300 chars so you can see the actual DB cause
-        return jsonify({"status": "error", "message": f"Commit failed: {str(e)[:300]}"}), 500
-    finally:
-        cur.close()
-        conn.close()
-
-    # --- Persist mapping memory (unchanged from your code) ---
-    try:
-        conn2 = get_db_connection()
-        cur2 = conn2.cursor()
-        ensure_memory_table(cur2)
-        for uploaded_col, db_col in mapping.items():
-            if db_col and db_col != "Not Needed":
-                cur2.execute("""
-                    INSERT INTO import_mapping_memory (uploaded_col_norm, uploaded_col_raw, db_col, weight, confidence, last_used)
-                    VALUES (%s, %s, %s, 1, %s, NOW())
-                    ON CONFLICT (uploaded_col_norm, db_col)
-                    DO UPDATE SET weight = import_mapping_memory.weight + 1,
-                                  confidence = LEAST(1.0, COALESCE(import_mapping_memory.confidence, 1.0) + %s),
-                                  last_used = NOW();
-                """, (normalize_col(uploaded_col), uploaded_col, db_col, 0.1, 0.1))
-        conn2.commit()
-        cur2.close()
-        conn2.close()
-    except Exception as e:
-        print("Warning: failed to persist mapping memory:", str(e))
-
-    return jsonify({"status": "ok", "rows_inserted": inserted})
+    # --- The writes run as a background job (import_jobs.py); the UI polls status_url ---
+    work = partial(run_commit, requirement_id=requirement_id, mapping=mapping, rows=rows,
+                   on_duplicate=on_duplicate, upload_id=payload.get("upload_id") if is_json else None,
+                   added_by=session.get("username"))
+    state = import_jobs.submit(work, session.get("user_id") or session.get("username"),
+                               current_app._get_current_object(), total=len(rows))
+    return import_jobs.accepted(state)
 
 @import_bp.route("/candidates/import/mapping/remember", methods=["POST"])
 def remember_mapping_now():
@@ -666,40 +985,42 @@ def remember_mapping_now():
     if not isinstance(pairs, list) or not pairs:
         return jsonify({"success": False, "error": "No mapping pairs supplied"}), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    ensure_memory_table(cur)
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        ensure_memory_table(cur)
 
-    upserts = 0
-    for p in pairs:
-        u = (p.get("uploaded") or "").strip()
-        m = (p.get("matched") or "").strip()
-        if not u or not m or m == "Not Needed":
-            continue
-        cur.execute("""
-            INSERT INTO import_mapping_memory (uploaded_col_norm, uploaded_col_raw, db_col, weight, confidence, last_used)
-            VALUES (%s, %s, %s, 1, %s, NOW())
-            ON CONFLICT (uploaded_col_norm, db_col)
-            DO UPDATE SET weight = import_mapping_memory.weight + 1,
-                          confidence = LEAST(1.0, COALESCE(import_mapping_memory.confidence, 1.0) + %s),
-                          last_used = NOW();
-        """, (normalize_col(u), u, m, 0.2, 0.2))
-        upserts += 1
+        upserts = 0
+        remembered = []
+        for p in pairs:
+            u = (p.get("uploaded") or "").strip()
+            m = (p.get("matched") or "").strip()
+            if not u or not m or m == "Not Needed":
+                continue
+            remembered.append((normalize_col(u), m))
+            cur.execute("""
+                INSERT INTO import_mapping_memory (uploaded_col_norm, uploaded_col_raw, db_col, weight, confidence, last_used)
+                VALUES (%s, %s, %s, 1, %s, NOW())
+                ON CONFLICT (uploaded_col_norm, db_col)
+                DO UPDATE SET weight = import_mapping_memory.weight + 1,
+                              confidence = LEAST(1.0, COALESCE(import_mapping_memory.confidence, 1.0) + %s),
+                              last_used = NOW();
+            """, (normalize_col(u), u, m, 0.2, 0.2))
+            upserts += 1
 
-    conn.commit()
-    cur.close()
-    conn.close()
+        conn.commit()
+        cur.close()
+    for norm, m in remembered:
+        LEARNED_MAPPINGS.record(norm, m, 0.2)
     return jsonify({"success": True, "upserts": upserts})
 
 @import_bp.route("/admin/import_mappings", methods=["GET"])
 def admin_import_mappings():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    ensure_memory_table(cur)
-    cur.execute("SELECT uploaded_col_norm, uploaded_col_raw, db_col, weight, confidence, last_used FROM import_mapping_memory ORDER BY weight DESC;")
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with get_db_connection() as conn:
+        cur = conn.cursor()
+        ensure_memory_table(cur)
+        cur.execute("SELECT uploaded_col_norm, uploaded_col_raw, db_col, weight, confidence, last_used FROM import_mapping_memory ORDER BY weight DESC;")
+        rows = cur.fetchall()
+        cur.close()
     mappings = []
     for r in rows:
         mappings.append({
@@ -726,14 +1047,7 @@ MANDATORY_FIELDS = ["Name", "Email ID", "Phone Number"]
 
 @import_bp.route("/review/<upload_id>")
 def candidate_review(upload_id):
-    df = None
-    if upload_id in UPLOAD_STORE:
-        df = UPLOAD_STORE[upload_id]
-    else:
-        csv_path = os.path.join(UPLOAD_DIR, f"{upload_id}.csv")
-        if os.path.exists(csv_path):
-            df = pd.read_csv(csv_path)
-
+    df = UPLOAD_STORE.get(upload_id)
     if df is None:
         return "Upload not found", 404
 
@@ -741,28 +1055,10 @@ def candidate_review(upload_id):
     if mapping:
         df = df.rename(columns={ucol: dbcol for ucol, dbcol in mapping.items() if dbcol and dbcol != "Not Needed"})
 
-    dup_emails, dup_phones = set(), set()
-    if "Email" in df.columns:
-        dup_emails = set(df["Email"].astype(str).str.strip().value_counts()[lambda x: x > 1].index)
-    if "Phone" in df.columns:
-        dup_phones = set(df["Phone"].astype(str).str.strip().value_counts()[lambda x: x > 1].index)
-
+    rules = [(f, "required") for f in MANDATORY_FIELDS if f in df.columns]
+    row_errors = validate_frame(df, rules, contact_columns(df.columns))
     rows = []
-    for _, row in df.iterrows():
-        rowdict = row.to_dict()
-        errors = []
-
-        for f in MANDATORY_FIELDS:
-            if f in rowdict:
-                val = rowdict.get(f)
-                if val is None or str(val).strip() == "" or str(val).lower() == "nan":
-                    errors.append(f"{f} is required")
-
-        if "Email" in rowdict and str(rowdict["Email"]).strip() in dup_emails:
-            errors.append("Duplicate Email")
-        if "Phone" in rowdict and str(rowdict["Phone"]).strip() in dup_phones:
-            errors.append("Duplicate Phone")
-
+    for rowdict, errors in zip(df.to_dict("records"), row_errors):
         rows.append({
             "data": rowdict,
             "valid": len(errors) == 0,
@@ -790,11 +1086,11 @@ def mapping_summary():
     upload_id = data.get("upload_id")
     mapping = data.get("mapping", [])
 
-    if not upload_id or upload_id not in UPLOAD_STORE:
+    meta = UPLOAD_STORE.meta(upload_id)
+    if meta is None:
         return jsonify({"success": False, "error": "Upload session expired. Please re-upload file."})
 
-    df = UPLOAD_STORE[upload_id]
-    total_rows = len(df)
+    total_rows = meta["rows"]
     matched_count = sum(1 for m in mapping if m.get("matched") and m.get("matched") != "Not Needed")
     not_needed_count = sum(1 for m in mapping if m.get("matched") == "Not Needed")
 
@@ -808,12 +1104,7 @@ def mapping_summary():
 
 @import_bp.route("/candidates/import/list_uploads", methods=["GET"])
 def list_uploads():
-    files = []
-    for fname in os.listdir(UPLOAD_DIR):
-        if fname.endswith(".csv") or fname.endswith(".xlsx"):
-            upload_id = os.path.splitext(fname)[0]
-            files.append(upload_id)
-    return jsonify({"uploads": files})
+    return jsonify({"uploads": UPLOAD_STORE.ids()})
 
 
 @import_bp.route("/commit", methods=["POST"])
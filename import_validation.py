@@ -0,0 +1,97 @@
+"""
+import_validation.py
+Whole-column validation of an uploaded sheet (a pandas DataFrame).
+
+validate_candidates and candidate_review walked the frame with iterrows(),
+checking every cell with Python-level string/regex calls, and candidate_review
+only looked for duplicates in literal "Email" / "Phone" columns. Here each rule
+becomes one boolean mask over a column (pandas .str methods), duplicates are
+found on the normalized phones/emails (contacts.py) of every column mapped to
+them, and the per-row error lists are assembled from the masks afterwards, so
+the cost is per column plus per error rather than per cell.
+
+Rules (the `schema` posted by the import UI: {column: rule}):
+  required  non-blank
+  integer   digits only
+  email     looks like local@domain.tld
+  phone     digits only
+Cells are compared as the user typed them: missing -> '', 3.0 -> '3'.
+"""
+
+import numpy as np
+import pandas as pd
+
+import contacts
+
+REQUIRED, INTEGER, EMAIL, PHONE = 'required', 'integer', 'email', 'phone'
+_EMAIL_RULE = r'[^@]+@[^@]+\.[^@]+'
+
+MESSAGES = {
+    REQUIRED: '{col} is required',
+    INTEGER: '{col} must be an integer',
+    EMAIL: '{col} is not a valid email',
+    PHONE: '{col} must be numeric',
+}
+DUPLICATE_MESSAGES = {contacts.PHONE: 'Duplicate Phone', contacts.EMAIL: 'Duplicate Email'}
+
+
+def cell_text(series):
+    """Stripped string per cell: '' for missing values, integral floats without '.0'."""
+    if series.dtype.kind == 'f':
+        text = series.map(lambda v: '' if v != v else (str(int(v)) if v.is_integer() else str(v)))
+    else:
+        text = series.astype(object).where(series.notna(), '').astype(str)
+    return text.str.strip()
+
+
+def rule_mask(text, rule):
+    """True where the cell breaks `rule`."""
+    if rule == REQUIRED:
+        return text.eq('').to_numpy()
+    if rule in (INTEGER, PHONE):
+        return ~text.str.isdigit().to_numpy(dtype=bool)
+    if rule == EMAIL:
+        return ~text.str.match(_EMAIL_RULE).to_numpy(dtype=bool)
+    raise ValueError('unknown validation rule %r' % rule)
+
+
+def duplicate_mask(df, columns, kind):
+    """True for rows sharing a normalized phone/email (any of `columns`) with another row."""
+    normalize = contacts.normalize_phone_series if kind == contacts.PHONE else contacts.normalize_email_series
+    keys = [normalize(contacts.explode_contacts(df[c].reset_index(drop=True))) for c in columns]
+    mask = np.zeros(len(df), dtype=bool)
+    if not keys:
+        return mask
+    keys = pd.concat(keys).dropna()
+    pairs = pd.DataFrame({'row': keys.index, 'key': keys.to_numpy()}).drop_duplicates()
+    dup = pairs['key'].duplicated(keep=False).to_numpy()
+    mask[pairs['row'].to_numpy()[dup]] = True
+    return mask
+
+
+def validate_frame(df, rules=(), duplicate_columns=None):
+    """Per-row error lists for `df`.
+
+    `rules` is [(column, rule)]; a column the sheet doesn't have counts as blank.
+    `duplicate_columns` is {contacts.PHONE: [columns], contacts.EMAIL: [columns]}.
+    """
+    errors = [[] for _ in range(len(df))]
+    masks = []
+    texts = {}
+    for col, rule in rules:
+        if col not in texts:
+            texts[col] = cell_text(df[col]) if col in df.columns else pd.Series([''] * len(df), dtype=object)
+        masks.append((rule_mask(texts[col], rule), MESSAGES[rule].format(col=col)))
+    for kind, columns in (duplicate_columns or {}).items():
+        columns = [c for c in columns if c in df.columns]
+        if columns:
+            masks.append((duplicate_mask(df, columns, kind), DUPLICATE_MESSAGES[kind]))
+    for mask, message in masks:
+        for i in np.flatnonzero(mask):
+            errors[i].append(message)
+    return errors
+
+
+def schema_rules(schema):
+    """[(column, rule)] from the UI's {column: rule} schema, unknown rules ignored."""
+    return [(col, rule) for col, rule in (schema or {}).items() if rule in MESSAGES]
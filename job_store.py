@@ -0,0 +1,150 @@
+"""
+job_store.py
+What export_jobs.py and import_jobs.py share: job state kept as <job_id>.json in
+a directory (written atomically, so any gunicorn worker can answer a status
+poll), expiry of old jobs, the stale check for jobs whose worker process died,
+and a per-process thread pool that runs them.
+
+A job is a plain dict: id, owner, status (QUEUED -> RUNNING -> DONE | FAILED),
+created_at, finished_at, error, updated_at, the host and pid of the process
+whose thread pool holds it, plus whatever fields the caller adds. The status
+endpoints and progress reporting stay in the two modules.
+"""
+
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+_JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+_HOST = socket.gethostname()
+
+
+def _owner_alive(state):
+    """False only when the process that queued `state` is known to be gone."""
+    pid = state.get('pid')
+    if not pid or state.get('host') != _HOST or pid == os.getpid():
+        return True                    # another host's process can't be checked from here
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:                    # EPERM: exists, owned by someone else
+        return True
+    return True
+
+
+class JobStore:
+    """Job states under `directory`; jobs run on `workers` threads per process.
+
+    Finished or abandoned jobs (state and any files named <job_id>.*) are removed
+    `ttl` seconds after their last update; a RUNNING job not updated for `stale`
+    seconds is reported FAILED with `stale_error`. A QUEUED job only exists in
+    the memory of the process that created it, so it is reported FAILED with
+    `lost_error` once that process is gone (restart, deploy, OOM) or after
+    `queued_max` seconds in the queue, whichever comes first.
+    """
+
+    def __init__(self, directory, workers, ttl, stale, stale_error, thread_name_prefix,
+                 cleanup_interval=300, queued_max=3600,
+                 lost_error='the worker holding this job restarted before it started; please retry'):
+        self.directory = directory
+        self.workers = max(1, workers)
+        self.ttl = ttl
+        self.stale = stale
+        self.stale_error = stale_error
+        self.queued_max = queued_max
+        self.lost_error = lost_error
+        self.thread_name_prefix = thread_name_prefix
+        self.cleanup_interval = cleanup_interval
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    # ---------- state files ----------
+    def path(self, job_id, ext='json'):
+        return os.path.join(self.directory, '%s.%s' % (job_id, ext))
+
+    def save(self, state):
+        state['updated_at'] = time.time()
+        path = self.path(state['id'])
+        tmp = '%s.%d.tmp' % (path, threading.get_ident())
+        with open(tmp, 'w') as f:
+            json.dump(state, f, default=str)
+        os.replace(tmp, path)
+
+    def load(self, job_id):
+        """The job's state dict, or None for unknown/expired/malformed ids."""
+        if not job_id or not _JOB_ID_RE.match(job_id):
+            return None
+        try:
+            with open(self.path(job_id)) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('status') == RUNNING and time.time() - state.get('updated_at', 0) > self.stale:
+            # the worker process running it went away (restart, OOM, timeout)
+            state['status'] = FAILED
+            state['error'] = self.stale_error
+        elif state.get('status') == QUEUED and (time.time() - state.get('created_at', 0) > self.queued_max
+                                                or not _owner_alive(state)):
+            state['status'] = FAILED
+            state['error'] = self.lost_error
+        return state
+
+    def cleanup(self, now=None):
+        """Delete files untouched for `ttl` seconds; returns how many jobs were removed."""
+        now = now or time.time()
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+                    removed += name.endswith('.json')
+            except OSError:
+                pass
+        return removed
+
+    def create(self, owner, **fields):
+        """Save and return the state of a new QUEUED job; expires old jobs now and then."""
+        os.makedirs(self.directory, exist_ok=True)
+        if time.time() - self._last_cleanup > self.cleanup_interval:
+            self._last_cleanup = time.time()
+            self.cleanup()
+        state = {
+            'id': uuid.uuid4().hex,
+            'owner': owner,
+            'status': QUEUED,
+            'created_at': time.time(),
+            'finished_at': None,
+            'error': None,
+            'host': _HOST,
+            'pid': os.getpid(),
+        }
+        state.update(fields)
+        self.save(state)
+        return state
+
+    # ---------- executor (per process, rebuilt after fork like db_pool) ----------
+    def submit(self, fn, *args):
+        """Run fn(*args) on this process's job threads."""
+        return self._get_executor().submit(fn, *args)
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix=self.thread_name_prefix)
+                self._executor_pid = os.getpid()
+            return self._executor
@@ -12,10 +12,18 @@ from itsdangerous import URLSafeTimedSerializer
 import logging
 import json
 import io
-import openpyxl
 import re
 from export import export_bp
-from pagination import Paginator, sanitize_page_params
+from pagination import Keyset, Paginator, count_rows, sanitize_page_params
+import db_pool
+import contacts
+from export_stream import XLSX_MIMETYPE, iter_rows, write_xlsx
+import export_jobs
+import import_jobs
+from bulk_insert import bulk_insert, bulk_update
+import import_dedupe
+import migrations
+import upload_ingest
 from AllCandidates import all_candidates_bp   # import the blueprint
 from dashboard_routes import dashboard_bp
 try:
@@ -30,6 +38,8 @@ from datetime import datetime, timedelta
 from flask import jsonify
 
 app = Flask(__name__)
+# One pooled connection per request, returned to the pool at teardown (see db_pool.py)
+db_pool.init_app(app)
 
 from pipeline_routes import bp as pipeline_bp
 app.register_blueprint(pipeline_bp)
@@ -51,6 +61,14 @@ app.register_blueprint(myteam_bp, url_prefix='/myteam')
 def healthz():
     return "ok", 200
 
+# Per-worker DB pool stats (in_use / waiting / connect latency) for sizing DB_POOL_MAX;
+# admins only, the stats describe the deployment
+@app.get("/healthz/db")
+def healthz_db():
+    if 'user_id' not in session or session.get('role') != 'admin':
+        return jsonify({'error': 'forbidden'}), 403
+    return jsonify(db_pool.pool_stats()), 200
+
 # Optional: if the route ever fails to register, still let /healthz return 200
 @app.errorhandler(404)
 def _health_fallback_404(e):
@@ -137,6 +155,12 @@ else:
 from import_routes import import_bp
 app.register_blueprint(import_bp, url_prefix="/candidates/import")
 app.register_blueprint(export_bp)
+app.register_blueprint(export_jobs.export_jobs_bp)
+app.register_blueprint(import_jobs.import_jobs_bp)
+
+# Schema changes ship as versioned migrations applied at deploy (render.yaml preDeployCommand,
+# Procfile release); if one is missing, say so at boot rather than 500 on the first request.
+migrations.warn_pending()
 
 
 # --- Auto-cleanup for uploads (runs at startup) ---
@@ -174,26 +198,13 @@ logging.basicConfig(level=logging.INFO)
 
 @contextmanager
 def get_db_cursor():
-    conn = None
-    cur = None
+    # Pooled (see db_pool.py); uncommitted work is rolled back when the connection is returned.
     try:
-        conn = psycopg2.connect(DB_CONFIG['dsn']) if 'dsn' in DB_CONFIG else psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        yield conn, cur
+        with db_pool.cursor() as (conn, cur):
+            yield conn, cur
     except Exception:
         app.logger.exception("DB connection or query error")
         raise
-    finally:
-        if cur:
-            try:
-                cur.close()
-            except Exception:
-                pass
-        if conn:
-            try:
-                conn.close()
-            except Exception:
-                pass
 
 
 # small helper: normalize JSON/list fields to Python lists for templates
@@ -414,6 +425,7 @@ def requirements():
         per_page = int(request.args.get('per_page', 100))
     except Exception:
         per_page = 100
+    per_page = max(1, per_page)
 
     sort_by = request.args.get('sort_by', 'added_date')
     sort_dir = request.args.get('sort_dir', 'desc').lower()
@@ -434,7 +446,11 @@ def requirements():
     }
     order_column = allowed_sort_columns.get(sort_by, 'r.added_date')
     order_dir = 'DESC' if sort_dir == 'desc' else 'ASC'
-    offset = (page - 1) * per_page
+    # Prev/Next seek on (order_column, r.id) via ?cursor=; numbered page links stay offset-based
+    keyset = Keyset(order_column, 'r.id', descending=(order_dir == 'DESC'))
+    cursor = keyset.decode(request.args.get('cursor'))
+    next_cursor = prev_cursor = None
+    count = None
 
     requirements = []
     total = 0
@@ -466,25 +482,23 @@ def requirements():
                 where_clauses.append("r.assigned_to ILIKE %s")
                 params.append(f"%{assigned_filter}%")
 
+            # count using the same WHERE clauses (exact when small, estimate/cached when large)
+            count_from = "FROM requirements r"
             if where_clauses:
-                base_query += " WHERE " + " AND ".join(where_clauses)
+                count_from += " WHERE " + " AND ".join(where_clauses)
+            count = count_rows(cur, count_from, params)
+            total = count.value
+
+            plan = keyset.plan(cursor, page, per_page, total)
+            page_clauses = where_clauses + ([plan.where_sql] if plan.where_sql else [])
+            if page_clauses:
+                base_query += " WHERE " + " AND ".join(page_clauses)
 
             # final query with ordering and pagination
-            final_query = f"{base_query} ORDER BY {order_column} {order_dir} LIMIT %s OFFSET %s"
-            query_params = tuple(params + [per_page, offset])
+            final_query = f"{base_query} {plan.order_sql} LIMIT %s OFFSET %s"
+            query_params = tuple(params + plan.params + [plan.limit, plan.offset])
             cur.execute(final_query, query_params)
-            requirements = cur.fetchall()
-
-            # count using the same WHERE clauses
-            count_query = "SELECT COUNT(*) as total FROM requirements r"
-            if where_clauses:
-                count_query += " WHERE " + " AND ".join(where_clauses)
-                count_params = tuple(params)
-                cur.execute(count_query, count_params)
-            else:
-                cur.execute(count_query)
-            total_row = cur.fetchone()
-            total = total_row.get('total', 0) if total_row else 0
+            requirements, next_cursor, prev_cursor = keyset.finish(cur.fetchall() or [], plan, cursor, page)
 
     except Exception:
         app.logger.exception("Error fetching requirements")
@@ -492,9 +506,22 @@ def requirements():
         requirements = []
         total = 0
 
+    paginator = Paginator(
+        total=total,
+        page=page,
+        per_page=per_page,
+        base_url=url_for('requirements'),
+        args=request.args.to_dict(),
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        last_cursor=keyset.last_page_cursor(),
+        count=count,
+    )
+
     return render_template(
         'requirements.html',
         requirements=requirements,
+        paginator=paginator,
         role=session.get('role'),
         page=page,
         per_page=per_page,
@@ -759,7 +786,13 @@ def requirement_candidates(req_id):
 
     sort_by = request.args.get('sort_by', 'added_date')
     sort_dir = 'DESC' if request.args.get('sort_dir', 'desc') == 'desc' else 'ASC'
-    offset = (page - 1) * per_page
+    allowed_sort = {'added_date': 'added_date', 'candidate_name': 'candidate_name', 'application_date': 'application_date'}
+    order_col = allowed_sort.get(sort_by, 'added_date')
+    # Prev/Next seek on (order_col, id) via ?cursor=; numbered page links stay offset-based
+    keyset = Keyset(order_col, 'id', descending=(sort_dir == 'DESC'))
+    cursor = keyset.decode(request.args.get('cursor'))
+    next_cursor = prev_cursor = None
+    count = None
 
     try:
         with get_db_cursor() as (conn, cur):
@@ -771,67 +804,50 @@ def requirement_candidates(req_id):
                 return redirect(url_for('requirements'))
 
             # recruiter: ensure they can view candidates for requirements assigned to them
-            base = "SELECT * FROM candidates WHERE requirement_id = %s"
+            from_sql = "FROM candidates WHERE requirement_id = %s"
             params = [req_id]
 
             if name:
-                base += " AND candidate_name ILIKE %s"
+                from_sql += " AND candidate_name ILIKE %s"
                 params.append(f"%{name}%")
             if phone:
-                base += " AND COALESCE(phones::text, '') ILIKE %s"
-                params.append(f"%{phone}%")
+                sql, p = contacts.filter_sql(contacts.PHONE, phone, id_col='id')
+                from_sql += " AND " + sql
+                params.extend(p)
             if email:
-                base += " AND COALESCE(emails::text, '') ILIKE %s"
-                params.append(f"%{email}%")
+                sql, p = contacts.filter_sql(contacts.EMAIL, email, id_col='id')
+                from_sql += " AND " + sql
+                params.extend(p)
             if location:
-                base += " AND current_location ILIKE %s"
+                from_sql += " AND COALESCE(current_location, '') ILIKE %s"
                 params.append(f"%{location}%")
 
 
             # NEW: calling_status/profile_status filters
             if calling_status:
-                base += " AND calling_status = %s"
+                from_sql += " AND calling_status = %s"
                 params.append(calling_status)
             if profile_status:
-                base += " AND profile_status = %s"
+                from_sql += " AND profile_status = %s"
                 params.append(profile_status)
-            allowed_sort = {'added_date': 'added_date', 'candidate_name': 'candidate_name', 'application_date': 'application_date'}
-            order_col = allowed_sort.get(sort_by, 'added_date')
-
-            q = f"{base} ORDER BY {order_col} {sort_dir} LIMIT %s OFFSET %s"
-            cur.execute(q, tuple(params + [per_page, offset]))
-            candidates = cur.fetchall()
+            # count total (before the page query: jumping to the last page needs it);
+            # exact when small, planner estimate / cached count when large
+            count = count_rows(cur, from_sql, params)
+            total = count.value
+
+            plan = keyset.plan(cursor, page, per_page, total)
+            if plan.where_sql:
+                from_sql += " AND " + plan.where_sql
+                params.extend(plan.params)
+            q = f"SELECT * {from_sql} {plan.order_sql} LIMIT %s OFFSET %s"
+            cur.execute(q, tuple(params + [plan.limit, plan.offset]))
+            candidates, next_cursor, prev_cursor = keyset.finish(cur.fetchall() or [], plan, cursor, page)
 
             # Normalize phones/emails to Python lists so templates can rely on lists
             for c in candidates:
                 c['phones'] = normalize_list_field(c.get('phones'))
                 c['emails'] = normalize_list_field(c.get('emails'))
 
-            # count total
-            cnt_q = "SELECT COUNT(*) as total FROM candidates WHERE requirement_id = %s"
-            cnt_params = [req_id]
-            if name:
-                cnt_q += " AND candidate_name ILIKE %s"
-                cnt_params.append(f"%{name}%")
-            if phone:
-                cnt_q += " AND COALESCE(phones::text, '') ILIKE %s"
-                cnt_params.append(f"%{phone}%")
-            if email:
-                cnt_q += " AND COALESCE(emails::text, '') ILIKE %s"
-                cnt_params.append(f"%{email}%")
-            if location:
-                cnt_q += " AND current_location ILIKE %s"
-                cnt_params.append(f"%{location}%")
-            if calling_status:
-                cnt_q += " AND calling_status = %s"
-                cnt_params.append(calling_status)
-            if profile_status:
-                cnt_q += " AND profile_status = %s"
-                cnt_params.append(profile_status)
-            cur.execute(cnt_q, tuple(cnt_params))
-            row = cur.fetchone()
-            total = row['total'] if row else 0   # ✅ fixed
-
 
     except Exception:
         app.logger.exception("Error loading candidates")
@@ -845,7 +861,11 @@ def requirement_candidates(req_id):
         page=page,
         per_page=per_page,
         base_url=url_for("requirement_candidates", req_id=req_id),
-        args=request.args
+        args=request.args,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        last_cursor=keyset.last_page_cursor(),
+        count=count,
     )
 
     return render_template(
@@ -1178,7 +1198,7 @@ def export_candidates(req_id):
                 flash('Requirement not found', 'danger')
                 return redirect(url_for('requirements'))
 
-            base = "SELECT * FROM candidates WHERE requirement_id = %s"
+            base = "FROM candidates WHERE requirement_id = %s"
             params = [req_id]
 
             if ids:
@@ -1187,7 +1207,7 @@ def export_candidates(req_id):
                     id_list = [int(x) for x in ids.split(',') if x.strip()]
                     if id_list:
                         base += " AND id = ANY(%s)"
-                        params.append(tuple(id_list))
+                        params.append(id_list)
                 except Exception:
                     # fallback to not using ids if parse fails
                     pass
@@ -1197,60 +1217,42 @@ def export_candidates(req_id):
                     base += " AND candidate_name ILIKE %s"
                     params.append(f"%{name}%")
                 if phone:
-                    base += " AND COALESCE(phones::text, '') ILIKE %s"
-                    params.append(f"%{phone}%")
+                    sql, p = contacts.filter_sql(contacts.PHONE, phone, id_col='id')
+                    base += " AND " + sql
+                    params.extend(p)
                 if email:
-                    base += " AND COALESCE(emails::text, '') ILIKE %s"
-                    params.append(f"%{email}%")
+                    sql, p = contacts.filter_sql(contacts.EMAIL, email, id_col='id')
+                    base += " AND " + sql
+                    params.extend(p)
                 if location:
-                    base += " AND current_location ILIKE %s"
+                    base += " AND COALESCE(current_location, '') ILIKE %s"
                     params.append(f"%{location}%")
 
-            q = f"{base} ORDER BY added_date DESC"
-            cur.execute(q, tuple(params))
-            rows = cur.fetchall()
-
-            # prepare workbook
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Candidates"
-
-            # If no rows, still create workbook with a message/header
-            if not rows:
-                ws.append(["No candidates found for the selected filters"])
-            else:
-                # use keys from first row as headers (preserve order by converting to list)
-                first = rows[0]
-                headers = list(first.keys())
-                # Write header row
-                ws.append(headers)
-                for r in rows:
-                    row_values = []
-                    for h in headers:
-                        v = r.get(h)
-                        if isinstance(v, (list, dict)):
-                            try:
-                                row_values.append(json.dumps(v, ensure_ascii=False))
-                            except Exception:
-                                row_values.append(str(v))
-                        elif isinstance(v, datetime):
-                            row_values.append(v.strftime('%Y-%m-%d %H:%M:%S'))
-                        else:
-                            row_values.append("" if v is None else v)
-                    ws.append(row_values)
-
-            # prepare file for download
-            file_stream = io.BytesIO()
-            wb.save(file_stream)
-            file_stream.seek(0)
-
-            filename = f"candidates_req_{req_id}.xlsx"
-            return send_file(
-                file_stream,
-                as_attachment=True,
-                download_name=filename,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
+        # headers are the keys of the first row (SELECT *)
+        spec = export_jobs.ExportSpec(
+            fmt='xlsx',
+            filename=f"candidates_req_{req_id}.xlsx",
+            select_sql="SELECT *",
+            from_sql=base,
+            order_sql="ORDER BY added_date DESC",
+            params=params,
+            sheet_title="Candidates",
+            empty_message="No candidates found for the selected filters",
+        )
+
+        # ?async=1: render in the background and poll /exports/<job_id> (export_jobs.py)
+        if request.args.get('async') in ('1', 'true'):
+            return export_jobs.accepted(export_jobs.submit(spec, session.get('user_id')))
+
+        # rows stream off a server-side cursor into a write-only workbook spooled to disk
+        file_stream = write_xlsx(iter_rows(spec.sql, params), sheet_title=spec.sheet_title,
+                                 empty_message=spec.empty_message)
+        return send_file(
+            file_stream,
+            as_attachment=True,
+            download_name=spec.filename,
+            mimetype=XLSX_MIMETYPE
+        )
     except Exception:
         app.logger.exception("Error exporting candidates")
         flash('Error exporting candidates', 'danger')
@@ -1274,28 +1276,29 @@ def import_candidates_upload(req_id):
         filename = f.filename or ''
         if not filename.lower().endswith('.xlsx'):
             return jsonify({'error': 'Only .xlsx files are supported'}), 400
-        import openpyxl, io
-        file_bytes = f.read()
-        wb = openpyxl.load_workbook(io.BytesIO(file_bytes), data_only=True)
-        ws = wb.active
-        headers = [ (c.value if c.value is not None else '') for c in ws[1] ]
-        idx_map = _smart_map_headers(headers)
-
-        rows = []
-        row_errors = {}
-        for i, row in enumerate(ws.iter_rows(min_row=2), start=2):
-            if all((cell.value is None or str(cell.value).strip()=='' ) for cell in row):
-                continue
-            mapped = {}
-            for idx, cell in enumerate(row):
-                key = idx_map.get(idx, f'col_{idx+1}')
-                mapped[key] = cell.value
-            norm = _normalize_row(mapped)
-            errs = _validate_row_smart(norm)
-            if errs:
-                row_errors[i] = errs
-            rows.append(norm)
-        return jsonify({'rows': rows, 'row_errors': row_errors})
+        # spooled to disk and read with openpyxl read_only, one row at a time (upload_ingest.py)
+        with upload_ingest.spooled(f) as path:
+            # numbered: blank rows are skipped, so errors are keyed by the row the user sees
+            header, sheet_rows = upload_ingest.iter_xlsx_rows(path, numbered=True)
+            headers = [(v if v is not None else '') for v in header]
+            idx_map = _smart_map_headers(headers)
+
+            rows = []
+            row_numbers = []
+            row_errors = {}
+            for row_no, row in sheet_rows:
+                mapped = {}
+                for idx, value in enumerate(row):
+                    key = idx_map.get(idx, f'col_{idx+1}')
+                    mapped[key] = value
+                norm = _normalize_row(mapped)
+                errs = _validate_row_smart(norm)
+                if errs:
+                    row_errors[row_no] = errs
+                rows.append(norm)
+                row_numbers.append(row_no)
+        return jsonify({'rows': rows, 'row_errors': row_errors,
+                        'existing': _existing_matches(req_id, rows, row_numbers)})
     except Exception as e:
         app.logger.exception("Upload parse error: %s", e)
         return jsonify({'error': 'Failed to read Excel'}), 500
@@ -1572,6 +1575,18 @@ if __name__ == '__main__':
 
 
 
+# Sheet columns written by import_candidates_commit (besides requirement_id, interview_*, added_by)
+IMPORT_COMMIT_COLUMNS = [
+    'application_date', 'job_title', 'candidate_name', 'current_company', 'total_experience',
+    'phones', 'emails', 'notice_period', 'current_location', 'preferred_locations',
+    'ctc_current', 'ectc', 'key_skills', 'education', 'post_graduation', 'pf_docs_confirm',
+    'notice_period_details', 'current_ctc_lpa', 'expected_ctc_lpa', 'employee_size',
+    'companies_worked', 'calling_status', 'profile_status', 'comments',
+]
+# also overwritten when on_duplicate=update (if the sheet has a value)
+IMPORT_UPDATE_EXTRA = ['interview_date', 'interview_time']
+
+
 @app.route('/requirement/<int:req_id>/candidates/import/commit', methods=['POST'])
 def import_candidates_commit(req_id):
     if 'user_id' not in session:
@@ -1580,68 +1595,70 @@ def import_candidates_commit(req_id):
     rows = payload.get('rows') or []
     if not isinstance(rows, list) or not rows:
         return jsonify({'error': 'No rows to import'}), 400
-    inserted = 0
-    skipped = []
+    policy = payload.get('on_duplicate') or import_dedupe.SKIP
+    if policy not in import_dedupe.POLICIES:
+        return jsonify({'error': 'on_duplicate must be one of: ' + ', '.join(import_dedupe.POLICIES)}), 400
     try:
+        skipped = []
+        added_by = session.get('user_id') or session.get('username') or 'system'
+        records = []
+        rejected = set()
+        for i, r in enumerate(rows):
+            errs = _validate_row_smart(r)
+            if errs:
+                skipped.append({'row': i + 2, 'reasons': errs, 'data': r})
+                rejected.add(i)
+            record = {'requirement_id': req_id}
+            for col in IMPORT_COMMIT_COLUMNS:
+                record[col] = r.get(col, '')
+            record['interview_date'] = r.get('interview_date') or None
+            record['interview_time'] = r.get('interview_time') or None
+            record['added_by'] = added_by
+            records.append(record)
         with get_db_cursor() as (conn, cur):
-            for idx, r in enumerate(rows, start=2):
-                errs = _validate_row_smart(r)
-                if errs:
-                    skipped.append({'row': idx, 'reasons': errs, 'data': r})
-                    continue
-                try:
-                    cur.execute("""
-                        INSERT INTO candidates (
-                            requirement_id, application_date, job_title, candidate_name, current_company,
-                            total_experience, phones, emails, notice_period, current_location,
-                            preferred_locations, ctc_current, ectc, key_skills, education,
-                            post_graduation, pf_docs_confirm, notice_period_details,
-                            current_ctc_lpa, expected_ctc_lpa, employee_size, companies_worked,
-                            calling_status, profile_status, comments, interview_date, interview_time, added_by, added_date, updated_date
-                        ) VALUES (
-                            %s,%s,%s,%s,%s,%s,%s,%s,%s,%s,
-                            %s,%s,%s,%s,%s,%s,%s,%s,%s,%s,
-                            %s,%s,%s,%s,%s, %s,%s, %s, now(), now()
-                        )
-                    """, (
-                        req_id,
-                        r.get('application_date',''),
-                        r.get('job_title',''),
-                        r.get('candidate_name',''),
-                        r.get('current_company',''),
-                        r.get('total_experience',''),
-                        r.get('phones',''),
-                        r.get('emails',''),
-                        r.get('notice_period',''),
-                        r.get('current_location',''),
-                        r.get('preferred_locations',''),
-                        r.get('ctc_current',''),
-                        r.get('ectc',''),
-                        r.get('key_skills',''),
-                        r.get('education',''),
-                        r.get('post_graduation',''),
-                        r.get('pf_docs_confirm',''),
-                        r.get('notice_period_details',''),
-                        r.get('current_ctc_lpa',''),
-                        r.get('expected_ctc_lpa',''),
-                        r.get('employee_size',''),
-                        r.get('companies_worked',''),
-                        r.get('calling_status',''),
-                        r.get('profile_status',''),
-                        r.get('comments',''),
-                        session.get('user_id') or session.get('username') or 'system'
-                    ))
-                    inserted += 1
-                except Exception as ie:
-                    app.logger.exception("Insert failed for row %s: %s", idx, ie)
-                    skipped.append({'row': idx, 'reasons': ['DB insert failed'], 'data': r})
+            # existing candidates for every row's phones/emails in one lookup (import_dedupe.py);
+            # advisory like the preview: if it fails the rows are saved as new
+            matches, checked = import_dedupe.find_existing_or_new(
+                cur, [import_dedupe.record_keys(r) for r in records], req_id)
+            plan = import_dedupe.plan_commit(matches, policy, exclude=rejected, first_row=2)
+            # batched multi-row INSERTs; failing batches are bisected down to the bad rows
+            result = bulk_insert(cur, 'candidates', records,
+                                 sql_values={'added_date': 'now()', 'updated_date': 'now()'},
+                                 skip=rejected | plan.not_inserted)
+            updates = [(i, cid, import_dedupe.update_values(records[i], IMPORT_COMMIT_COLUMNS + IMPORT_UPDATE_EXTRA))
+                       for i, cid in plan.update]
+            updated = bulk_update(cur, 'candidates', updates, sql_values={'updated_date': 'now()'})
             conn.commit()
-        return jsonify({'inserted': inserted, 'skipped': skipped})
+        inserted = result.inserted
+        for i, reason in plan.skipped:
+            skipped.append({'row': i + 2, 'reasons': [reason], 'data': rows[i]})
+        for i, err in result.failed + updated.failed:
+            app.logger.warning("Write failed for row %s: %s", i + 2, err)
+            skipped.append({'row': i + 2, 'reasons': ['DB write failed'], 'data': rows[i]})
+        skipped.sort(key=lambda s: s['row'])
+        return jsonify({'inserted': inserted, 'updated': updated.updated, 'skipped': skipped,
+                        'on_duplicate': policy, 'duplicate_check': checked})
     except Exception as e:
         app.logger.exception("Bulk import commit error: %s", e)
         return jsonify({'error': 'Server error while saving'}), 500
 
 
+def _existing_matches(req_id, rows, row_numbers=None):
+    """{row number: existing-candidate flags} for preview rows that match a candidate;
+    rows are numbered from 2 unless `row_numbers` gives each row's number.
+
+    Advisory only: a failed lookup leaves the preview without flags.
+    """
+    try:
+        with get_db_cursor() as (conn, cur):
+            matches = import_dedupe.find_existing(cur, [import_dedupe.record_keys(r) for r in rows], req_id)
+    except Exception:
+        app.logger.exception("Duplicate lookup for import preview failed")
+        return {}
+    row_numbers = row_numbers or range(2, len(rows) + 2)
+    return {n: m.as_dict() for n, m in zip(row_numbers, matches) if m.status != import_dedupe.NEW}
+
+
 
 
 @app.route('/requirement/<int:req_id>/candidates/paste/preview', methods=['POST'])
@@ -1681,7 +1698,11 @@ def paste_candidates_preview(req_id):
             row_errors[i] = errs
         rows.append(norm)
 
-    return jsonify({'rows': rows, 'row_errors': row_errors})
+    # row numbers here start at 2 only with a header line
+    existing = _existing_matches(req_id, rows)
+    if not has_header:
+        existing = {n - 1: m for n, m in existing.items()}
+    return jsonify({'rows': rows, 'row_errors': row_errors, 'existing': existing})
 
 
 @app.route('/requirement/<int:req_id>/candidates/paste/commit', methods=['POST'])
@@ -1760,32 +1781,37 @@ import io, csv, datetime
 from flask import request, jsonify, render_template
 from flask_login import login_required
 
-def _parse_rows_from_csv(text):
-    f = io.StringIO(text)
+def _parse_rows_from_csv(f, preview_rows=upload_ingest.PREVIEW_ROWS):
+    """Stream a CSV text file object; returns headers, samples, suggested mapping, unmapped
+    headers, the first `preview_rows` mapped rows and the total row count."""
+    first = f.readline()
+    f.seek(0)
     sniffer = csv.Sniffer()
     try:
-        dialect = sniffer.sniff(text.splitlines()[0])
+        dialect = sniffer.sniff(first)
     except Exception:
         dialect = csv.excel
     reader = csv.DictReader(f, dialect=dialect)
     headers = reader.fieldnames or []
-    rows_raw = list(reader)
     samples = {h: [] for h in headers}
-    for r in rows_raw[:5]:
-        for h in headers:
-            v = (r.get(h) or "").strip()
-            if v:
-                samples[h].append(v)
     suggested, unmapped = _smart_map_headers(headers)
     mapped = []
-    for r in rows_raw:
-        out = {k: "" for k in SHEET_COLUMNS}
-        for h in headers:
-            sys = suggested.get(h) or ""
-            if sys:
-                out[sys] = (r.get(h) or "").strip()
-        mapped.append(out)
-    return headers, samples, suggested, unmapped, mapped
+    total = 0
+    for r in reader:
+        if total < 5:
+            for h in headers:
+                v = (r.get(h) or "").strip()
+                if v:
+                    samples[h].append(v)
+        if total < preview_rows:
+            out = {k: "" for k in SHEET_COLUMNS}
+            for h in headers:
+                sys = suggested.get(h) or ""
+                if sys:
+                    out[sys] = (r.get(h) or "").strip()
+            mapped.append(out)
+        total += 1
+    return headers, samples, suggested, unmapped, mapped, total
 
 @app.route("/requirement/<int:req_id>/candidates/import", methods=["GET"], endpoint="import_wizard")
 @login_required
@@ -1804,10 +1830,11 @@ def api_import_parse():
     pasted = request.form.get("text", "")
 
     if f and f.filename.lower().endswith((".csv", ".tsv", ".txt")):
-        text = f.read().decode("utf-8", errors="ignore")
-        headers, samples, suggested, unmapped, rows = _parse_rows_from_csv(text)
+        with upload_ingest.spooled(f) as path:
+            with open(path, encoding="utf-8", errors="ignore", newline="") as text:
+                headers, samples, suggested, unmapped, rows, total = _parse_rows_from_csv(text)
     elif pasted:
-        headers, samples, suggested, unmapped, rows = _parse_rows_from_csv(pasted)
+        headers, samples, suggested, unmapped, rows, total = _parse_rows_from_csv(io.StringIO(pasted, newline=""))
     else:
         return jsonify({"ok": False, "error": "Only CSV/TSV or pasted data supported."})
 
@@ -1817,7 +1844,8 @@ def api_import_parse():
         "samples": samples,
         "suggested_mapping": suggested,
         "unmapped_headers": unmapped,
-        "rows": rows
+        "rows": rows,                   # first PREVIEW_ROWS rows
+        "total_rows": total
     })
 
 @app.route("/api/import/validate", methods=["POST"])
@@ -0,0 +1,278 @@
+"""
+migrations.py
+Versioned schema migrations (indexes for list/search queries).
+
+Applied migrations are recorded in `schema_migrations`; each runs once, in
+version order. Index builds use CREATE INDEX CONCURRENTLY (autocommit) so
+they don't block writes on the live candidates table.
+
+CLI:  python scripts/migrate status | apply | verify
+
+Applying them is a required deploy step (render.yaml preDeployCommand, Procfile
+release): the code expects the tables and columns they create (pipeline_stage,
+candidate_contacts, import_batches, ...). main.py logs every pending migration
+at boot.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+
+import contacts
+import db_pool
+import import_delta
+import pipeline_stage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """One index; `expr` (or a tuple of them) must match the expression used in the SQL exactly."""
+    name: str
+    table: str
+    expr: object
+    using: str = 'btree'
+    opclass: str = ''
+    # representative predicate, used by `verify` to check the planner can use the index
+    probe: str = ''
+
+    def create_sql(self, schema=None, concurrently=True):
+        table = '%s.%s' % (schema, self.table) if schema else self.table
+        exprs = self.expr if isinstance(self.expr, tuple) else (self.expr,)
+        opclass = ' ' + self.opclass if self.opclass else ''
+        cols = ', '.join('(%s)%s' % (e, opclass) for e in exprs)
+        return 'CREATE INDEX %sIF NOT EXISTS %s ON %s USING %s (%s)' % (
+            'CONCURRENTLY ' if concurrently else '', self.name, table, self.using, cols)
+
+
+def _trgm(name, table, expr):
+    return IndexSpec(name, table, expr, using='gin', opclass='gin_trgm_ops',
+                     probe="%s ILIKE '%%abc%%'" % expr)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: tuple = ()                         # plain statements, run in one transaction
+    backfill: object = None                 # callable(cur, conn) -> rows; batches commit on their own
+    indexes: tuple = field(default=())      # built CONCURRENTLY, one at a time
+
+
+# Expressions mirror AllCandidates._extract_filters_from_mapping, main.requirement_candidates
+# and main.requirements (COALESCE/::text forms included) so the planner can match them.
+# The list filters now look phones/emails up in candidate_contacts (migration 5); the
+# phones/emails trigram indexes remain for ad-hoc substring searches.
+CANDIDATE_TRGM_INDEXES = (
+    _trgm('idx_candidates_name_trgm', 'candidates', 'candidate_name'),
+    _trgm('idx_candidates_phones_trgm', 'candidates', "COALESCE(phones::text, '')"),
+    _trgm('idx_candidates_emails_trgm', 'candidates', "COALESCE(emails::text, '')"),
+    _trgm('idx_candidates_key_skills_trgm', 'candidates', "COALESCE(key_skills, '')"),
+    _trgm('idx_candidates_location_trgm', 'candidates', "COALESCE(current_location, '')"),
+)
+
+REQUIREMENT_TRGM_INDEXES = (
+    _trgm('idx_requirements_client_name_trgm', 'requirements', 'client_name'),
+    _trgm('idx_requirements_name_trgm', 'requirements', 'requirement_name'),
+    _trgm('idx_requirements_assigned_to_trgm', 'requirements', 'assigned_to'),
+)
+
+CANDIDATE_BTREE_INDEXES = (
+    IndexSpec('idx_candidates_requirement_id', 'candidates', 'requirement_id',
+              probe='requirement_id = 1'),
+    # (added_date, id) also serves the keyset ORDER BY / seek in pagination.Keyset
+    IndexSpec('idx_candidates_added_date_id', 'candidates', ('added_date', 'id'),
+              probe="added_date > now() - interval '1 day'"),
+    IndexSpec('idx_candidates_interview_date', 'candidates', 'interview_date',
+              probe='interview_date = CURRENT_DATE'),
+    IndexSpec('idx_candidates_added_by', 'candidates', 'added_by',
+              probe="added_by = 'x'"),
+)
+
+# kind + search_key serve both exact and prefix (LIKE 'x%') lookups, see contacts.filter_sql
+CONTACT_INDEXES = (
+    IndexSpec('idx_candidate_contacts_key', 'candidate_contacts', ('kind', 'search_key'),
+              opclass='text_pattern_ops', probe="kind = 'phone' AND search_key LIKE '98765%'"),
+)
+
+# dashboard / pipeline grids filter on the stored stage (pipeline_stage.py)
+PIPELINE_STAGE_INDEXES = (
+    IndexSpec('idx_candidates_req_stage', 'candidates', ('requirement_id', 'pipeline_stage'),
+              probe="requirement_id = 1 AND pipeline_stage = 'R1 scheduled'"),
+    IndexSpec('idx_candidates_recruiter_stage', 'candidates',
+              (pipeline_stage.RECRUITER_EXPR_SQL, 'pipeline_stage'),
+              probe="%s = 'x' AND pipeline_stage = 'R1 scheduled'" % pipeline_stage.RECRUITER_EXPR_SQL),
+)
+
+FINGERPRINT_INDEXES = (
+    IndexSpec('idx_import_row_fingerprints_identity', 'import_row_fingerprints',
+              ('requirement_id', 'identity_hash'), probe="requirement_id = 1 AND identity_hash = 'x'"),
+)
+
+# whole-sheet header mappings of recurring upload layouts (import_routes.LayoutMappingCache)
+LAYOUT_CACHE_SQL = """
+    CREATE TABLE IF NOT EXISTS import_layout_cache (
+        signature   TEXT PRIMARY KEY,
+        headers     JSONB NOT NULL,
+        mappings    JSONB NOT NULL,
+        hits        INTEGER DEFAULT 0,
+        created_at  TIMESTAMP DEFAULT NOW(),
+        last_used   TIMESTAMP DEFAULT NOW()
+    )
+"""
+
+MIGRATIONS = (
+    Migration(1, 'pg_trgm extension', sql=('CREATE EXTENSION IF NOT EXISTS pg_trgm',)),
+    Migration(2, 'trigram indexes on candidate search columns', indexes=CANDIDATE_TRGM_INDEXES),
+    Migration(3, 'trigram indexes on requirement search columns', indexes=REQUIREMENT_TRGM_INDEXES),
+    Migration(4, 'btree indexes on candidate filter/sort columns', indexes=CANDIDATE_BTREE_INDEXES),
+    Migration(5, 'candidate_contacts table, sync trigger and backfill',
+              sql=contacts.SCHEMA_SQL + (contacts.BACKFILL_SQL,), indexes=CONTACT_INDEXES),
+    Migration(6, 'candidates.pipeline_stage column, function, trigger and backfill',
+              sql=pipeline_stage.schema_sql(), backfill=pipeline_stage.backfill,
+              indexes=PIPELINE_STAGE_INDEXES),
+    Migration(7, 'import_batches and import_row_fingerprints tables',
+              sql=import_delta.SCHEMA_SQL, indexes=FINGERPRINT_INDEXES),
+    Migration(8, 'import_layout_cache table', sql=(LAYOUT_CACHE_SQL,)),
+)
+
+
+# ---------- bookkeeping ----------
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            duration_ms INTEGER
+        )
+    """)
+
+
+def applied_versions(cur):
+    _ensure_table(cur)
+    cur.execute("SELECT version FROM schema_migrations")
+    return {(r['version'] if isinstance(r, dict) else r[0]) for r in cur.fetchall()}
+
+
+def _index_state(cur, name):
+    """None if missing, else True/False for pg_index.indisvalid."""
+    cur.execute("""
+        SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+    """, (name,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return row['indisvalid'] if isinstance(row, dict) else row[0]
+
+
+def _build_index(cur, spec):
+    # an interrupted CONCURRENTLY build leaves an INVALID index behind; rebuild it
+    if _index_state(cur, spec.name) is False:
+        cur.execute('DROP INDEX CONCURRENTLY IF EXISTS %s' % spec.name)
+    cur.execute(spec.create_sql())
+
+
+def apply(migrations=MIGRATIONS, log=print):
+    """Apply pending migrations in version order; returns the versions applied."""
+    done = []
+    with db_pool.connection(request_scoped=False) as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            applied = applied_versions(cur)
+            for m in sorted(migrations, key=lambda m: m.version):
+                if m.version in applied:
+                    continue
+                t0 = time.perf_counter()
+                log('applying %03d %s' % (m.version, m.name))
+                if m.sql:
+                    cur.execute('BEGIN')
+                    try:
+                        for stmt in m.sql:
+                            cur.execute(stmt)
+                        cur.execute('COMMIT')
+                    except Exception:
+                        cur.execute('ROLLBACK')
+                        raise
+                if m.backfill:
+                    t1 = time.perf_counter()
+                    n = m.backfill(cur, conn)
+                    log('  backfilled %d rows %23.1fs' % (n, time.perf_counter() - t1))
+                for spec in m.indexes:
+                    t1 = time.perf_counter()
+                    _build_index(cur, spec)
+                    log('  %-40s %8.1fs' % (spec.name, time.perf_counter() - t1))
+                ms = int((time.perf_counter() - t0) * 1000)
+                cur.execute("INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)",
+                            (m.version, m.name, ms))
+                done.append(m.version)
+    return done
+
+
+def status(migrations=MIGRATIONS):
+    """[(version, name, applied: bool)]"""
+    with db_pool.cursor(request_scoped=False, commit_on_exit=True) as (conn, cur):
+        applied = applied_versions(cur)
+    return [(m.version, m.name, m.version in applied) for m in migrations]
+
+
+def pending(migrations=MIGRATIONS):
+    """[(version, name)] not applied yet; read-only (unlike status(), creates nothing)."""
+    with db_pool.cursor(request_scoped=False) as (conn, cur):
+        cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS present")
+        row = cur.fetchone()
+        applied = set()
+        if row['present'] if isinstance(row, dict) else row[0]:
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {(r['version'] if isinstance(r, dict) else r[0]) for r in cur.fetchall()}
+        conn.rollback()
+    return [(m.version, m.name) for m in migrations if m.version not in applied]
+
+
+def warn_pending(migrations=MIGRATIONS):
+    """Log an error per pending migration (called at boot); never raises."""
+    try:
+        missing = pending(migrations)
+    except Exception:
+        logger.exception("could not check schema migrations")
+        return []
+    for version, name in missing:
+        logger.error("schema migration %03d (%s) is not applied; features that need it will fail "
+                     "until `python scripts/migrate apply` runs", version, name)
+    return missing
+
+
+def verify(migrations=MIGRATIONS):
+    """Check every index exists, is valid and is picked by the planner for its probe predicate.
+
+    Returns a list of problem strings (empty when everything is in place).
+    """
+    problems = []
+    with db_pool.cursor(request_scoped=False) as (conn, cur):
+        applied = applied_versions(cur)
+        for m in migrations:
+            if m.version not in applied:
+                problems.append('migration %03d (%s) not applied' % (m.version, m.name))
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        if not cur.fetchone():
+            problems.append('extension pg_trgm missing')
+        # only asks "can this index serve the predicate", not "is it cheapest"
+        cur.execute('SET LOCAL enable_seqscan = off')
+        for m in migrations:
+            for spec in m.indexes:
+                state = _index_state(cur, spec.name)
+                if state is None:
+                    problems.append('index %s missing' % spec.name)
+                    continue
+                if state is False:
+                    problems.append('index %s is INVALID (rerun apply)' % spec.name)
+                    continue
+                if spec.probe:
+                    cur.execute('EXPLAIN SELECT 1 FROM %s WHERE %s' % (spec.table, spec.probe))
+                    plan = '\n'.join((r['QUERY PLAN'] if isinstance(r, dict) else r[0]) for r in cur.fetchall())
+                    if spec.name not in plan:
+                        problems.append('index %s not used for "%s"' % (spec.name, spec.probe))
+        conn.rollback()
+    return problems
@@ -4,8 +4,7 @@ from contextlib import contextmanager
 from datetime import datetime
 from urllib.parse import urlparse
 
-import psycopg2
-import psycopg2.extras
+import db_pool
 from flask import (
     Blueprint, render_template, request, redirect, url_for, flash, session, abort,
     jsonify
@@ -46,31 +45,11 @@ def build_dsn_from_env():
 def get_db_cursor():
     """
     Yields (conn, cur) where cur is RealDictCursor (rows as dicts).
-    If DATABASE_URL exists, psycopg2.connect(DATABASE_URL) is used.
-    Else psycopg2.connect(**kwargs) is used when DB parts are in env.
+    The connection comes from the shared pool in db_pool.py (DATABASE_URL or DB_* env).
     Commits on success, rolls back on exception.
     """
-    conn = None
-    cur = None
-    dsn = build_dsn_from_env()
-    try:
-        if isinstance(dsn, str):
-            conn = psycopg2.connect(dsn)
-        else:
-            # dsn is dict of params
-            conn = psycopg2.connect(**dsn)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    with db_pool.cursor(commit_on_exit=True) as (conn, cur):
         yield conn, cur
-        conn.commit()
-    except Exception:
-        if conn:
-            conn.rollback()
-        raise
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
 
 # ---------- Helpers ----------
 def fmtdate(value):
@@ -1,8 +1,18 @@
 from __future__ import annotations
+import base64
+import datetime as _dt
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 from urllib.parse import urlencode
 
+from settings import env_int
+
 
 def _to_int(value, default):
     try:
@@ -22,6 +32,324 @@ def sanitize_page_params(page_value, per_page_value, *, default_per_page: int =
     return page, per_page
 
 
+# ---------- keyset (cursor) pagination ----------
+# Tokens are opaque to clients: urlsafe base64 of {"s": sort signature, "d": "n"|"p", "k": key}.
+# "n" seeks past the key in display order, "p" before it; "p" without a key means "last page".
+NEXT = "n"
+PREV = "p"
+
+
+def _enc_value(v: Any) -> Any:
+    if isinstance(v, _dt.datetime):
+        return {"t": v.isoformat()}
+    if isinstance(v, _dt.date):
+        return {"d": v.isoformat()}
+    if isinstance(v, Decimal):
+        return {"m": str(v)}
+    return v
+
+
+# what a decoded key value may be; anything else (lists, nested objects) is a forged token
+_KEY_SCALARS = (str, int, float, bool, Decimal, _dt.date)
+
+
+def _dec_value(v: Any) -> Any:
+    if isinstance(v, dict):
+        if len(v) != 1 or not isinstance(next(iter(v.values())), str):
+            raise ValueError("bad cursor value")
+        if "t" in v:
+            return _dt.datetime.fromisoformat(v["t"])
+        if "d" in v:
+            return _dt.date.fromisoformat(v["d"])
+        if "m" in v:
+            return Decimal(v["m"])
+        raise ValueError("bad cursor value")
+    if v is not None and not isinstance(v, _KEY_SCALARS):
+        raise ValueError("bad cursor value")
+    return v
+
+
+@dataclass(frozen=True)
+class Cursor:
+    direction: str
+    key: Optional[Tuple[Any, ...]]
+    sort: str = ""
+
+    def encode(self) -> str:
+        payload = {"s": self.sort, "d": self.direction,
+                   "k": None if self.key is None else [_enc_value(v) for v in self.key]}
+        raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, token: Optional[str], sort: str = "") -> Optional["Cursor"]:
+        """Parse a token; None for missing/garbled tokens, keys that are not a list of
+        scalars, or tokens minted for another sort order."""
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            payload = json.loads(raw.decode("utf-8"))
+            if payload.get("s", "") != sort or payload.get("d") not in (NEXT, PREV):
+                return None
+            key = payload.get("k")
+            if key is not None and not isinstance(key, list):
+                return None
+            return cls(payload["d"], None if key is None else tuple(_dec_value(v) for v in key), sort)
+        except Exception:
+            return None
+
+
+@dataclass(frozen=True)
+class KeysetPlan:
+    where_sql: str          # "" or a predicate to AND into the WHERE clause
+    params: List[Any]
+    order_sql: str          # "ORDER BY ..." (reversed when scanning backwards)
+    limit: int              # per_page + 1; the extra row tells whether more exist
+    offset: int
+    reverse: bool
+
+
+@dataclass(frozen=True)
+class Keyset:
+    """Seek pagination over (sort_col, id_col) in the same order as ORDER BY sort_col DIR, id_col DIR.
+
+    NULL sort values follow Postgres defaults (they sort as the largest value), so
+    rows with a NULL sort_col are neither skipped nor repeated across pages.
+    """
+    sort_col: str
+    id_col: str
+    descending: bool = True
+    sort_key: str = ""      # row key holding sort_col's value (defaults to its unqualified name)
+    id_key: str = "id"
+    sort_type: Optional[type] = None    # when set, a cursor's sort value must be None or one of these
+
+    @property
+    def signature(self) -> str:
+        return "%s:%s" % (self.sort_col, "d" if self.descending else "a")
+
+    @property
+    def _row_sort_key(self) -> str:
+        return self.sort_key or self.sort_col.rsplit(".", 1)[-1]
+
+    @property
+    def _single(self) -> bool:
+        return self.sort_col == self.id_col
+
+    def decode(self, token: Optional[str]) -> Optional[Cursor]:
+        """Cursor.decode(), also None unless the key is (sort value, id) -- just (id,) when
+        sorting by the id -- with an integer id and a sort value of `sort_type`; the list
+        then falls back to page 1 instead of failing the query."""
+        cursor = Cursor.decode(token, self.signature)
+        if cursor is None or cursor.key is None:
+            return cursor
+        key = cursor.key
+        if len(key) != (1 if self._single else 2):
+            return None
+        if not isinstance(key[-1], int) or isinstance(key[-1], bool):
+            return None
+        if (self.sort_type is not None and not self._single
+                and key[0] is not None and not isinstance(key[0], self.sort_type)):
+            return None
+        return cursor
+
+    def order_sql(self, reverse: bool = False) -> str:
+        desc = self.descending != reverse
+        d = "DESC" if desc else "ASC"
+        if self._single:
+            return "ORDER BY %s %s" % (self.id_col, d)
+        return "ORDER BY %s %s, %s %s" % (self.sort_col, d, self.id_col, d)
+
+    def seek_sql(self, cursor: Cursor) -> Tuple[str, List[Any]]:
+        """Predicate selecting rows strictly after (NEXT) / before (PREV) cursor.key in display order."""
+        towards_smaller = self.descending == (cursor.direction == NEXT)
+        op = "<" if towards_smaller else ">"
+        if self._single:
+            return "%s %s %%s" % (self.id_col, op), [cursor.key[-1]]
+        v, i = cursor.key[0], cursor.key[1]
+        s, idc = self.sort_col, self.id_col
+        if v is None:
+            if towards_smaller:
+                return "((%s IS NULL AND %s < %%s) OR %s IS NOT NULL)" % (s, idc, s), [i]
+            return "(%s IS NULL AND %s > %%s)" % (s, idc), [i]
+        if towards_smaller:
+            return "(%s, %s) < (%%s, %%s)" % (s, idc), [v, i]
+        return "((%s, %s) > (%%s, %%s) OR %s IS NULL)" % (s, idc, s), [v, i]
+
+    def plan(self, cursor: Optional[Cursor], page: int, per_page: int, total: int = 0) -> KeysetPlan:
+        if cursor is None:
+            return KeysetPlan("", [], self.order_sql(), per_page + 1, (page - 1) * per_page, False)
+        if cursor.direction == PREV and cursor.key is None:
+            # jump to the last page: scan backwards for however many rows it holds
+            last_size = total - (max(1, (total + per_page - 1) // per_page) - 1) * per_page
+            return KeysetPlan("", [], self.order_sql(reverse=True), max(1, last_size) + 1, 0, True)
+        where_sql, params = self.seek_sql(cursor)
+        return KeysetPlan(where_sql, params, self.order_sql(reverse=cursor.direction == PREV),
+                          per_page + 1, 0, cursor.direction == PREV)
+
+    def _key_of(self, row) -> Tuple[Any, ...]:
+        if self._single:
+            return (row[self.id_key],)
+        return (row[self._row_sort_key], row[self.id_key])
+
+    def finish(self, rows: Sequence, plan: KeysetPlan, cursor: Optional[Cursor], page: int
+               ) -> Tuple[List, Optional[str], Optional[str]]:
+        """Trim the probe row, restore display order and mint (rows, next_cursor, prev_cursor)."""
+        rows = list(rows)
+        more = len(rows) >= plan.limit
+        rows = rows[:plan.limit - 1]
+        if plan.reverse:
+            rows.reverse()
+        if cursor is None:
+            has_next, has_prev = more, page > 1
+        elif cursor.direction == NEXT:
+            has_next, has_prev = more, True
+        else:
+            has_next, has_prev = cursor.key is not None, more
+        if not rows:
+            return rows, None, None
+        nxt = Cursor(NEXT, self._key_of(rows[-1]), self.signature).encode() if has_next else None
+        prv = Cursor(PREV, self._key_of(rows[0]), self.signature).encode() if has_prev else None
+        return rows, nxt, prv
+
+    def last_page_cursor(self) -> str:
+        return Cursor(PREV, None, self.signature).encode()
+
+
+def and_where(where_sql: str, plan: KeysetPlan) -> str:
+    """Append the plan's seek predicate to an existing WHERE body (without the WHERE keyword)."""
+    if not plan.where_sql:
+        return where_sql
+    return "(%s) AND %s" % (where_sql, plan.where_sql) if where_sql else plan.where_sql
+
+
+# ---------- count strategy ----------
+# Full COUNT(*) with the list's ILIKE filters can cost more than the page itself, so:
+#   planner estimate <= COUNT_EXACT_THRESHOLD  -> exact COUNT(*)
+#   larger, strategy "estimate" (default)      -> EXPLAIN row estimate ("about N")
+#   larger, strategy "cached"                  -> exact COUNT(*) cached for COUNT_CACHE_TTL seconds
+#   larger, strategy "capped"                  -> count at most COUNT_CAP rows ("more than N")
+COUNT_EXACT_THRESHOLD = env_int("COUNT_EXACT_THRESHOLD", 10000)
+COUNT_CACHE_TTL = env_int("COUNT_CACHE_TTL", 60)
+COUNT_CAP = env_int("COUNT_CAP", 10000)
+COUNT_STRATEGY = os.getenv("COUNT_STRATEGY", "estimate")
+_COUNT_CACHE_MAX = 512
+
+_count_cache: "OrderedDict[Tuple, Tuple[float, CountResult]]" = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class CountResult:
+    value: int
+    exact: bool = True
+    capped: bool = False    # true total is more than `value`
+
+    def __int__(self) -> int:
+        return self.value
+
+    @property
+    def label(self) -> str:
+        if self.capped:
+            return f"more than {self.value:,}"
+        if not self.exact:
+            return f"about {self.value:,}"
+        return f"{self.value:,}"
+
+
+def _first_value(row):
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return next(iter(row.values()))
+    return row[0]
+
+
+def _cache_key(from_sql: str, params: Sequence) -> Tuple:
+    return (" ".join(from_sql.split()), tuple(str(p) for p in params))
+
+
+def _cache_get(key: Tuple) -> Optional[CountResult]:
+    with _count_cache_lock:
+        hit = _count_cache.get(key)
+        if hit is None:
+            return None
+        if hit[0] < time.monotonic():
+            _count_cache.pop(key, None)
+            return None
+        _count_cache.move_to_end(key)
+        return hit[1]
+
+
+def _cache_put(key: Tuple, result: CountResult, ttl: int) -> None:
+    if ttl <= 0:
+        return
+    with _count_cache_lock:
+        _count_cache[key] = (time.monotonic() + ttl, result)
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > _COUNT_CACHE_MAX:
+            _count_cache.popitem(last=False)
+
+
+_ESTIMATE_SAVEPOINT = "count_rows_estimate"
+
+
+def estimate_rows(cur, from_sql: str, params: Sequence) -> int:
+    """Planner row estimate for `SELECT 1 <from_sql>` (no rows are read)."""
+    cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 {from_sql}", tuple(params))
+    plan = _first_value(cur.fetchone())
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(cur, from_sql: str, params: Sequence = (), *, strategy: Optional[str] = None,
+               exact_threshold: Optional[int] = None, ttl: Optional[int] = None,
+               cap: Optional[int] = None) -> CountResult:
+    """Count rows of `SELECT ... <from_sql>` ("FROM ... WHERE ...") using the configured strategy.
+
+    Large results are cached per normalized (from_sql, params) for `ttl` seconds, so paging
+    through the same broad filter set doesn't recount; small exact counts are never cached.
+    """
+    strategy = strategy or COUNT_STRATEGY
+    exact_threshold = COUNT_EXACT_THRESHOLD if exact_threshold is None else exact_threshold
+    ttl = COUNT_CACHE_TTL if ttl is None else ttl
+    cap = COUNT_CAP if cap is None else cap
+    params = list(params)
+
+    key = _cache_key(from_sql, params) + (strategy,)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    # a failed EXPLAIN aborts the transaction; the savepoint keeps the caller's
+    # (request-scoped) transaction usable for the exact count and what follows
+    cur.execute("SAVEPOINT " + _ESTIMATE_SAVEPOINT)
+    try:
+        estimate = estimate_rows(cur, from_sql, params)
+    except Exception:
+        # EXPLAIN unavailable (permissions, odd SQL): fall back to an exact count
+        cur.execute("ROLLBACK TO SAVEPOINT " + _ESTIMATE_SAVEPOINT)
+        estimate = 0
+    cur.execute("RELEASE SAVEPOINT " + _ESTIMATE_SAVEPOINT)
+
+    if estimate <= exact_threshold:
+        cur.execute(f"SELECT COUNT(*) AS total {from_sql}", tuple(params))
+        return CountResult(int(_first_value(cur.fetchone()) or 0))
+
+    if strategy == "cached":
+        cur.execute(f"SELECT COUNT(*) AS total {from_sql}", tuple(params))
+        result = CountResult(int(_first_value(cur.fetchone()) or 0))
+    elif strategy == "capped":
+        cur.execute(f"SELECT COUNT(*) AS total FROM (SELECT 1 {from_sql} LIMIT %s) t", tuple(params) + (cap + 1,))
+        n = int(_first_value(cur.fetchone()) or 0)
+        result = CountResult(min(n, cap), exact=n <= cap, capped=n > cap)
+    else:
+        result = CountResult(estimate, exact=False)
+    _cache_put(key, result, ttl)
+    return result
+
+
 @dataclass(frozen=True)
 class Paginator:
     total: int
@@ -29,6 +357,20 @@ class Paginator:
     per_page: int
     base_url: str
     args: Dict[str, str]
+    # cursor mode: Prev/Next/Last follow keyset tokens, numbered links stay page-based
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    last_cursor: Optional[str] = None
+    count: Optional[CountResult] = None
+
+    @property
+    def total_label(self) -> str:
+        """'12,400', 'about 12,400' or 'more than 10,000' depending on how total was obtained."""
+        return self.count.label if self.count is not None else f"{self.total:,}"
+
+    @property
+    def total_is_exact(self) -> bool:
+        return self.count is None or self.count.exact
 
     @property
     def pages(self) -> int:
@@ -40,6 +382,9 @@ class Paginator:
 
     @property
     def has_next(self) -> bool:
+        if not self.total_is_exact:
+            # the page query's probe row knows better than an estimated total
+            return self.next_cursor is not None
         return self.page < self.pages
 
     @property
@@ -50,9 +395,11 @@ class Paginator:
     def limit(self) -> int:
         return self.per_page
 
-    def url_for_page(self, page: int) -> str:
-        params = {k: v for k, v in self.args.items() if k not in {"page"}}
+    def url_for_page(self, page: int, cursor: Optional[str] = None) -> str:
+        params = {k: v for k, v in self.args.items() if k not in {"page", "cursor"}}
         params.update({"page": str(page), "per_page": str(self.per_page)})
+        if cursor:
+            params["cursor"] = cursor
         query = urlencode(params, doseq=True)
         return f"{self.base_url}?{query}" if query else self.base_url
 
@@ -61,11 +408,11 @@ class Paginator:
         if self.pages <= 1:
             return links
         links["first"] = self.url_for_page(1)
-        links["last"] = self.url_for_page(self.pages)
+        links["last"] = self.url_for_page(self.pages, self.last_cursor)
         if self.has_prev:
-            links["prev"] = self.url_for_page(self.page - 1)
+            links["prev"] = self.url_for_page(self.page - 1, self.prev_cursor if self.page > 2 else None)
         if self.has_next:
-            links["next"] = self.url_for_page(self.page + 1)
+            links["next"] = self.url_for_page(self.page + 1, self.next_cursor)
         return links
 
     def windowed_pages(self, *, window: int = 2) -> List[Tuple[int, str, bool]]:
@@ -86,4 +433,5 @@ class Paginator:
             add_unique(p)
         add_unique(total_pages)
 
-        return [(p, self.url_for_page(p), p == self.page) for p in pages]
+        return [(p, self.url_for_page(p, self.last_cursor if p == total_pages else None), p == self.page)
+                for p in pages]
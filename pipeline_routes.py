@@ -5,7 +5,6 @@ Requires: psycopg2-binary, Flask
 """
 
 from contextlib import contextmanager
-import psycopg2
 import datetime
 import decimal
 import uuid
@@ -33,9 +32,10 @@ def serialize_row(row):
         return row
     return {k: _serialize_value(v) for k, v in d.items()}
 
-import psycopg2.extras
 from flask import Blueprint, render_template, request, jsonify, current_app
 import os
+import db_pool
+from pagination import Keyset, and_where, count_rows
 
 bp = Blueprint('pipeline', __name__)
 
@@ -57,39 +57,9 @@ else:
 
 @contextmanager
 def get_db_cursor(commit_on_exit=False):
-    """Yield (conn, cur). Uses DB_CONFIG; supports DB_CONFIG['dsn'] (DATABASE_URL)."""
-    conn = None
-    cur = None
-    try:
-        # If a DSN string is present, pass that to psycopg2.connect, otherwise expand kwargs.
-        if 'dsn' in DB_CONFIG:
-            conn = psycopg2.connect(DB_CONFIG['dsn'])
-        else:
-            conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    """Yield (conn, cur) from the shared pool (db_pool.py); DB_CONFIG above is kept for reference."""
+    with db_pool.cursor(commit_on_exit=commit_on_exit) as (conn, cur):
         yield conn, cur
-        if commit_on_exit:
-            conn.commit()
-    except Exception:
-        # If a commit was intended but we failed, attempt rollback to avoid partial writes.
-        if conn and commit_on_exit:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-        # Re-raise so calling code handles/logs the exception as before
-        raise
-    finally:
-        if cur is not None:
-            try:
-                cur.close()
-            except Exception:
-                pass
-        if conn is not None:
-            try:
-                conn.close()
-            except Exception:
-                pass
 
 
 
@@ -185,27 +155,30 @@ def api_requirements_details_all():
         per_page = min(100, int(request.args.get('per_page') or 50))  # Reasonable default
     except Exception:
         per_page = 50
-        
-    offset = (page - 1) * per_page
+    per_page = max(1, per_page)
+
+    # ?cursor= (from next_cursor/prev_cursor) seeks on (added_date, id) instead of OFFSET
+    keyset = Keyset('r.added_date', 'r.id', descending=True, sort_type=datetime.date)
+    cursor = keyset.decode(request.args.get('cursor'))
     
     try:
         with get_db_cursor() as (conn, cur):
             # Get total count
-            cur.execute("""
-                SELECT COUNT(DISTINCT r.id) as total_count
-                FROM requirements r
-                WHERE (LOWER(TRIM(COALESCE(r.status, ''))) != 'closed')
-            """)
-            total_count = cur.fetchone().get('total_count', 0)
-            
+            active_sql = "(LOWER(TRIM(COALESCE(r.status, ''))) != 'closed')"
+            count = count_rows(cur, f"FROM requirements r WHERE {active_sql}")
+            total_count = count.value
+            plan = keyset.plan(cursor, page, per_page, total_count)
+
             # Get paginated data
-            cur.execute(r"""
+            cur.execute(rf"""
                 SELECT
                   r.id AS requirement_id,
                   r.requirement_name,
                   COALESCE(r.client_name, '') AS client_name,
                   COALESCE(r.client_poc, '') AS client_poc,
                   COALESCE(r.assigned_to, '') AS assigned_to,
+                  r.added_date,
+                  r.id,
                   COUNT(c.id) AS total_candidates,
                   SUM(CASE WHEN c.added_date >= (NOW() - INTERVAL '7 days') THEN 1 ELSE 0 END) AS candidates_last_7_days,
                   SUM(CASE WHEN LOWER(TRIM(COALESCE(c.profile_status,''))) NOT LIKE '%%rejected%%' THEN 1 ELSE 0 END) AS candidates_not_rejected,
@@ -215,12 +188,12 @@ def api_requirements_details_all():
                   SUM(CASE WHEN LOWER(TRIM(COALESCE(c.profile_status,''))) = 'offered' THEN 1 ELSE 0 END) AS offered_count
                 FROM requirements r
                 LEFT JOIN candidates c ON c.requirement_id = r.id
-                WHERE (LOWER(TRIM(COALESCE(r.status, ''))) != 'closed')
-                GROUP BY r.id, r.requirement_name, r.client_name, r.client_poc, r.assigned_to
-                ORDER BY r.added_date DESC
+                WHERE {and_where(active_sql, plan)}
+                GROUP BY r.id, r.requirement_name, r.client_name, r.client_poc, r.assigned_to, r.added_date
+                {plan.order_sql}
                 LIMIT %s OFFSET %s
-            """, (per_page, offset))
-            rows = cur.fetchall()
+            """, tuple(plan.params) + (plan.limit, plan.offset))
+            rows, next_cursor, prev_cursor = keyset.finish(cur.fetchall(), plan, cursor, page)
     except Exception as e:
         try:
             current_app.logger.exception('api_requirements_details_all failed: %s', e)
@@ -251,7 +224,11 @@ def api_requirements_details_all():
             'page': page,
             'per_page': per_page,
             'total': total_count,
-            'pages': (total_count + per_page - 1) // per_page
+            'pages': (total_count + per_page - 1) // per_page,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor,
+            'total_exact': count.exact,
+            'total_label': count.label,
         }
     })
 
@@ -349,8 +326,11 @@ def api_candidates():
         per_page = min(200, int(request.args.get('per_page') or 50))  # Reasonable default
     except Exception:
         per_page = 50
-        
-    offset = (page - 1) * per_page
+    per_page = max(1, per_page)
+
+    # ?cursor= (from next_cursor/prev_cursor) seeks on id instead of OFFSET
+    keyset = Keyset('c.id', 'c.id', descending=True)
+    cursor = keyset.decode(request.args.get('cursor'))
 
     params = []
     where = []
@@ -380,39 +360,36 @@ def api_candidates():
     where_sql = ''
     if where:
         where_sql = 'WHERE ' + ' AND '.join(where)
+    filter_sql = ' AND '.join(where)
 
     join_clause = 'LEFT JOIN requirements r ON r.id = c.requirement_id' if client_name else ''
 
-    # Count query
-    count_q = f"""
-        SELECT COUNT(*) as total_count
-        FROM candidates c
-        {join_clause}
-        {where_sql}
-    """
-
-    # Data query
-    data_q = f"""
-        SELECT c.*
+    # Count query body
+    count_from = f"""
         FROM candidates c
         {join_clause}
         {where_sql}
-        ORDER BY c.id DESC
-        LIMIT %s OFFSET %s
     """
 
-    params_for_count = tuple(params)
-    params_for_data = tuple(params) + (per_page, offset)
-    
     try:
         with get_db_cursor() as (conn, cur):
-            # Get total count
-            cur.execute(count_q, params_for_count)
-            total_count = cur.fetchone().get('total_count', 0)
-            
-            # Get paginated data
-            cur.execute(data_q, params_for_data)
-            rows = cur.fetchall()
+            # Get total count (exact when small, planner estimate / cached count when large)
+            count = count_rows(cur, count_from, params)
+            total_count = count.value
+
+            # Data query
+            plan = keyset.plan(cursor, page, per_page, total_count)
+            page_where = and_where(filter_sql, plan)
+            data_q = f"""
+                SELECT c.*
+                FROM candidates c
+                {join_clause}
+                {('WHERE ' + page_where) if page_where else ''}
+                {plan.order_sql}
+                LIMIT %s OFFSET %s
+            """
+            cur.execute(data_q, tuple(params) + tuple(plan.params) + (plan.limit, plan.offset))
+            rows, next_cursor, prev_cursor = keyset.finish(cur.fetchall(), plan, cursor, page)
     except Exception as e:
         try:
             current_app.logger.exception('api_candidates sql failed: %s', e)
@@ -435,7 +412,11 @@ def api_candidates():
                 'page': page,
                 'per_page': per_page,
                 'total': total_count,
-                'pages': (total_count + per_page - 1) // per_page
+                'pages': (total_count + per_page - 1) // per_page,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor,
+                'total_exact': count.exact,
+                'total_label': count.label,
             }
         })
 
@@ -445,7 +426,11 @@ def api_candidates():
             'page': page,
             'per_page': per_page,
             'total': total_count,
-            'pages': (total_count + per_page - 1) // per_page
+            'pages': (total_count + per_page - 1) // per_page,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor,
+            'total_exact': count.exact,
+            'total_label': count.label,
         }
     })
 
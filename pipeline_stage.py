@@ -0,0 +1,258 @@
+"""
+pipeline_stage.py
+Canonical pipeline stage (18 buckets) persisted on candidates.pipeline_stage.
+
+The bucket is computed from profile_status at write time by the DB function
+pipeline_stage_of(text) (fired from a BEFORE INSERT/UPDATE trigger), so the
+dashboard grids, drilldowns and KPIs filter with `pipeline_stage = %s`
+instead of running regex/ILIKE scans per row.
+
+The column, function, trigger and indexes are migration 6 (`python scripts/migrate
+apply`, see migrations.py); its indexes build CONCURRENTLY. After editing
+STAGE_PATTERNS run `python scripts/migrate_pipeline_stage` to reinstall the
+function and re-backfill; it is a no-op when the installed function already
+matches.
+"""
+
+import re
+import hashlib
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Column order of the pipeline grids
+PIPELINE_STAGES = [
+    'Profile shared with client', 'Review Pending by client', 'R1 to be schedule', 'R1 scheduled',
+    'R2 Pending', 'R2 scheduled', 'R2 FBP', 'R2 Select', 'R3 Pending', 'R3 scheduled', 'R3 FBP',
+    'HR Round', 'Offered', 'R1 FBP', 'R1 Rejected', 'R2 Rejected', 'R3 Rejected', 'Others'
+]
+OTHERS = 'Others'
+
+# First match wins, evaluated against lower(profile_status). Python `re` syntax;
+# translated for Postgres (\b -> \y) when the SQL function is generated.
+STAGE_PATTERNS = [
+    ('Profile shared with client', [r'profile\s*shared', r'shared.*client']),
+    ('Review Pending by client', [r'review\s*pending.*client', r'pending.*client']),
+    ('R1 to be schedule', [r'\br?1\b.*to\s*be.*sched']),
+    ('R1 scheduled', [r'\br?1\b.*sched']),
+    ('R2 Pending', [r'\br?2\b.*pending']),
+    ('R2 scheduled', [r'\br?2\b.*sched']),
+    ('R2 FBP', [r'\br?2\b.*fbp']),
+    ('R2 Select', [r'\br?2\b.*select']),
+    ('R3 Pending', [r'\br?3\b.*pending']),
+    ('R3 scheduled', [r'\br?3\b.*sched']),
+    ('R3 FBP', [r'\br?3\b.*fbp']),
+    ('HR Round', [r'hr\s*round', r'\bhr\b']),
+    ('Offered', [r'offered?', r'\boffer\b']),
+    ('R1 FBP', [r'\br?1\b.*fbp']),
+    ('R1 Rejected', [r'\br?1\b.*reject']),
+    ('R2 Rejected', [r'\br?2\b.*reject']),
+    ('R3 Rejected', [r'\br?3\b.*reject']),
+]
+
+# Buckets that make up the "final stage / combined offer pipeline" KPI
+FINAL_STAGES = ('R3 scheduled', 'R3 FBP', 'HR Round', 'Offered')
+FBP_STAGES = ('R1 FBP', 'R2 FBP', 'R3 FBP')
+
+RECRUITER_EXPR_SQL = "COALESCE(NULLIF(TRIM(added_by), ''), 'Unknown')"
+
+# Arbitrary constant so concurrent processes don't run the reinstall/backfill twice
+_ADVISORY_LOCK_KEY = 74110001
+
+
+def _pg_regex(pattern):
+    return pattern.replace(r'\b', r'\y')
+
+
+class StatusClassifier:
+    """Maps a raw profile_status to its canonical stage; Python and SQL forms agree.
+
+    Each stage's patterns are compiled once into a single alternation, and results
+    are memoized on the raw string (there are only a few hundred distinct statuses),
+    so classifying a large result set is mostly dict hits.
+    """
+
+    def __init__(self, stage_patterns=STAGE_PATTERNS, default=OTHERS, cache_size=4096):
+        self.stage_patterns = list(stage_patterns)
+        self.default = default
+        self._compiled = [
+            (stage, re.compile('|'.join('(?:%s)' % p for p in pats)))
+            for stage, pats in self.stage_patterns
+        ]
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, raw):
+        t = (raw or '').strip().lower()
+        for stage, rx in self._compiled:
+            if rx.search(t):
+                return stage
+        return self.default
+
+    def __call__(self, raw):
+        return self.classify(raw)
+
+    def cache_info(self):
+        return self.classify.cache_info()
+
+    # ---------- SQL equivalents ----------
+    @staticmethod
+    def _match_sql(subject, pats):
+        return '(' + ' OR '.join("%s ~ '%s'" % (subject, _pg_regex(p)) for p in pats) + ')'
+
+    def sql_case(self, subject='s'):
+        """CASE expression over an already-lowered text expression (first match wins)."""
+        whens = ["            WHEN %s THEN '%s'" % (self._match_sql(subject, pats), stage)
+                 for stage, pats in self.stage_patterns]
+        return "CASE\n%s\n            ELSE '%s'\n        END" % ('\n'.join(whens), self.default)
+
+    def sql_predicate(self, stage, status_col='c.profile_status'):
+        """(sql, params) true exactly when classify(status_col) == stage, without the stored column.
+
+        A row belongs to a stage when it matches that stage and none listed before it;
+        the default stage is "matches nothing".
+        """
+        subject = "lower(COALESCE(%s, ''))" % status_col
+        parts, params = [], []
+        for name, pats in self.stage_patterns:
+            cond = '(' + ' OR '.join('%s ~ %%s' % subject for _ in pats) + ')'
+            if name == stage:
+                parts.append(cond)
+                params.extend(_pg_regex(p) for p in pats)
+                break
+            parts.append('NOT ' + cond)
+            params.extend(_pg_regex(p) for p in pats)
+        else:
+            if stage != self.default:
+                return 'FALSE', []
+        return '(' + ' AND '.join(parts) + ')', params
+
+    def stage_condition_sql(self, stage, stage_col='c.pipeline_stage', status_col='c.profile_status'):
+        """Equality on the stored stage, falling back to sql_predicate for rows not yet backfilled."""
+        pred, params = self.sql_predicate(stage, status_col)
+        return ("(%s = %%s OR (%s IS NULL AND %s))" % (stage_col, stage_col, pred),
+                [stage] + params)
+
+
+CLASSIFIER = StatusClassifier()
+
+
+def patterns_version():
+    """Short hash of STAGE_PATTERNS; stored as the SQL function's comment."""
+    raw = repr(STAGE_PATTERNS).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+def stage_function_sql():
+    return """
+        CREATE OR REPLACE FUNCTION pipeline_stage_of(status text) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $fn$
+        SELECT %s
+        FROM (SELECT lower(COALESCE(status, '')) AS s) t
+        $fn$;
+    """ % CLASSIFIER.sql_case('s')
+
+
+TRIGGER_SQL = """
+    CREATE OR REPLACE FUNCTION candidates_set_pipeline_stage() RETURNS trigger
+    LANGUAGE plpgsql AS $fn$
+    BEGIN
+        NEW.pipeline_stage := pipeline_stage_of(NEW.profile_status);
+        RETURN NEW;
+    END
+    $fn$;
+    DROP TRIGGER IF EXISTS trg_candidates_pipeline_stage ON candidates;
+    CREATE TRIGGER trg_candidates_pipeline_stage
+        BEFORE INSERT OR UPDATE OF profile_status ON candidates
+        FOR EACH ROW EXECUTE FUNCTION candidates_set_pipeline_stage();
+"""
+
+
+def schema_sql():
+    """Statements installing the function (commented with patterns_version()), column and trigger."""
+    return (
+        stage_function_sql(),
+        "COMMENT ON FUNCTION pipeline_stage_of(text) IS '%s'" % patterns_version(),
+        "ALTER TABLE candidates ADD COLUMN IF NOT EXISTS pipeline_stage TEXT",
+        TRIGGER_SQL,
+    )
+
+
+def installed_version(cur):
+    cur.execute("""
+        SELECT obj_description(p.oid, 'pg_proc') AS v
+        FROM pg_proc p JOIN pg_namespace n ON n.oid = p.pronamespace
+        WHERE p.proname = 'pipeline_stage_of' AND n.nspname = current_schema()
+    """)
+    row = cur.fetchone()
+    if not row:
+        return None
+    return row['v'] if isinstance(row, dict) else row[0]
+
+
+_BACKFILL_SQL = """
+    WITH batch AS (
+        SELECT id FROM candidates WHERE id > %(last)s ORDER BY id LIMIT %(n)s
+    ), changed AS (
+        UPDATE candidates c SET pipeline_stage = pipeline_stage_of(c.profile_status)
+        FROM batch b
+        WHERE c.id = b.id AND c.pipeline_stage IS DISTINCT FROM pipeline_stage_of(c.profile_status)
+        RETURNING 1
+    )
+    SELECT (SELECT max(id) FROM batch) AS last, (SELECT count(*) FROM changed) AS n
+"""
+
+
+def backfill(cur, conn, batch_size=5000):
+    """Recompute pipeline_stage for rows that are NULL or stale, in id order, committing per batch.
+
+    Each batch resumes after the last id of the previous one, so every row is
+    classified once. Returns the number of rows changed.
+    """
+    total, last = 0, 0
+    while True:
+        cur.execute(_BACKFILL_SQL, {'last': last, 'n': batch_size})
+        row = cur.fetchone()
+        last, n = (row['last'], row['n']) if isinstance(row, dict) else row
+        conn.commit()
+        if last is None:
+            return total
+        total += n
+
+
+def ensure_schema(conn, cur, force=False):
+    """Reinstall function and trigger, then backfill, when STAGE_PATTERNS changed.
+
+    Indexes come from migration 6. Returns the number of rows backfilled (0 when
+    already up to date).
+    """
+    if not force and installed_version(cur) == patterns_version():
+        conn.rollback()
+        return 0
+
+    cur.execute("SELECT pg_try_advisory_lock(%s)", (_ADVISORY_LOCK_KEY,))
+    row = cur.fetchone()
+    got = row['pg_try_advisory_lock'] if isinstance(row, dict) else row[0]
+    if not got:
+        # another process is migrating right now
+        conn.rollback()
+        return 0
+    try:
+        for stmt in schema_sql():
+            cur.execute(stmt)
+        conn.commit()
+        n = backfill(cur, conn)
+        logger.info("pipeline_stage: installed version %s, backfilled %s rows", patterns_version(), n)
+        return n
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (_ADVISORY_LOCK_KEY,))
+        conn.commit()
+
+
+def stage_filter_sql(stages, col='c.pipeline_stage'):
+    """(sql, params) matching any of the given canonical stages."""
+    stages = list(stages)
+    return "%s IN (%s)" % (col, ','.join(['%s'] * len(stages))), stages
@@ -1,8 +1,7 @@
 
 from flask import Blueprint, render_template, jsonify, session
 from contextlib import contextmanager
-import psycopg2
-import psycopg2.extras
+import db_pool
 
 # Blueprint name must match url_for usage in template
 recruiter_perf_bp = Blueprint('recruiter_perf', __name__)
@@ -14,19 +13,8 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 
 @contextmanager
 def get_db_cursor():
-    conn = None
-    cur = None
-    try:
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    with db_pool.cursor() as (conn, cur):
         yield conn, cur
-    finally:
-        if cur:
-            try: cur.close()
-            except Exception: pass
-        if conn:
-            try: conn.close()
-            except Exception: pass
 
 # Query helpers
 DATE_COL = "c.added_date"  # confirmed column name
@@ -1,12 +1,14 @@
 
 # Reports.py — Saved Reports + Graphical Metrics
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify, send_file
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify
 import os
-import psycopg2, psycopg2.extras
-import io, csv, json, re as _re
+import json, re as _re
 from datetime import datetime, date, timedelta
 from contextlib import contextmanager
-from pagination import Paginator, sanitize_page_params
+from pagination import Keyset, Paginator, and_where, count_rows, sanitize_page_params
+import db_pool
+from export_stream import csv_response, iter_csv, iter_rows
+import export_jobs
 from AllCandidates import normalize_list_field, _extract_filters_from_mapping
 
 # ---------------------- DB CONFIG ----------------------
@@ -24,14 +26,9 @@ def _load_db_conn_args():
     }
 @contextmanager
 def db_cursor():
-    args = _load_db_conn_args()
-    conn = psycopg2.connect(args['dsn']) if 'dsn' in args else psycopg2.connect(**args)
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    try:
+    # Connection args are resolved by db_pool (same DATABASE_URL / DB_* precedence as above).
+    with db_pool.cursor() as (conn, cur):
         yield conn, cur
-    finally:
-        cur.close()
-        conn.close()
 
 reports_bp = Blueprint("reports_bp", __name__, template_folder="templates")
 
@@ -75,24 +72,29 @@ def reports_index():
     filt = _extract_filters_from_mapping(getp)
     where_sql, params = filt["where_sql"], filt["params"]
 
-    # Table data
+    # Table data (Prev/Next seek on (added_date, id) via ?cursor=)
+    keyset = Keyset("c.added_date", "c.id", descending=True, sort_type=date)
+    cursor = keyset.decode(request.args.get("cursor"))
     with db_cursor() as (conn, cur):
-        cur.execute(f"SELECT COUNT(*) AS total FROM candidates c LEFT JOIN requirements r ON r.id=c.requirement_id WHERE {where_sql}", params)
-        total = cur.fetchone()["total"]
+        count = count_rows(cur, f"FROM candidates c LEFT JOIN requirements r ON r.id=c.requirement_id WHERE {where_sql}", params)
+        total = count.value
+        plan = keyset.plan(cursor, page, per_page, total)
         cur.execute(f"""
             SELECT c.*, r.id AS req_id, r.requirement_name, r.client_name
             FROM candidates c
             LEFT JOIN requirements r ON r.id=c.requirement_id
-            WHERE {where_sql}
-            ORDER BY c.added_date DESC, c.id DESC
+            WHERE {and_where(where_sql, plan)}
+            {plan.order_sql}
             LIMIT %s OFFSET %s
-        """, params + [per_page, (page-1)*per_page])
-        candidates = cur.fetchall() or []
+        """, params + plan.params + [plan.limit, plan.offset])
+        candidates, next_cursor, prev_cursor = keyset.finish(cur.fetchall() or [], plan, cursor, page)
         for c in candidates:
             c["phones"] = normalize_list_field(c.get("phones"))
             c["emails"] = normalize_list_field(c.get("emails"))
 
-    paginator = Paginator(total, page, per_page, url_for("reports_bp.reports_index"), request.args.to_dict())
+    paginator = Paginator(total, page, per_page, url_for("reports_bp.reports_index"), request.args.to_dict(),
+                          next_cursor=next_cursor, prev_cursor=prev_cursor, last_cursor=keyset.last_page_cursor(),
+                          count=count)
 
     # Saved reports list
     with db_cursor() as (conn, cur):
@@ -239,6 +241,23 @@ def run_saved_report(slug):
             flash("Access denied","danger"); return redirect(url_for("reports_bp.reports_index"))
         return redirect(url_for("reports_bp.reports_index", **row["filters"]))
 
+EXPORT_HEADERS = ["Job Title","Requirement","Candidate Name","Total Experience",
+                  "Phone Number","Email ID","Notice Period","Current Location",
+                  "Calling Status","Profile Status","Comments","Added By"]
+
+def _export_row(c):
+    phones = ", ".join(normalize_list_field(c.get("phones")))
+    emails = ", ".join(normalize_list_field(c.get("emails")))
+    req = (c.get("requirement_name") or f"Requirement {c.get('req_id')}") if c.get("req_id") else "-"
+    if c.get("client_name"): req += f" ({c['client_name']})"
+    return [
+        c.get("job_title") or "-", req, c.get("candidate_name") or "-",
+        c.get("total_experience") or "-", phones or "-", emails or "-",
+        c.get("notice_period") or "-", c.get("current_location") or "-",
+        c.get("calling_status") or "-", c.get("profile_status") or "-",
+        c.get("comments") or "-", c.get("added_by_name") or c.get("added_by") or "—"
+    ]
+
 @reports_bp.route("/reports/export_all", methods=["POST"])
 def export_all():
     if not _require_login(): return redirect(url_for("login"))
@@ -247,31 +266,17 @@ def export_all():
     filt = _extract_filters_from_mapping(gp)
     where_sql, params = filt["where_sql"], filt["params"]
 
-    with db_cursor() as (conn, cur):
-        cur.execute(f"""
-            SELECT c.*, r.id AS req_id, r.requirement_name, r.client_name
-            FROM candidates c
-            LEFT JOIN requirements r ON r.id=c.requirement_id
-            WHERE {where_sql} ORDER BY c.added_date DESC, c.id DESC
-        """, params)
-        rows = cur.fetchall()
-
-    headers = ["Job Title","Requirement","Candidate Name","Total Experience",
-               "Phone Number","Email ID","Notice Period","Current Location",
-               "Calling Status","Profile Status","Comments","Added By"]
-
-    sio = io.StringIO(); writer = csv.writer(sio); writer.writerow(headers)
-    for c in rows:
-        phones = ", ".join(normalize_list_field(c.get("phones")))
-        emails = ", ".join(normalize_list_field(c.get("emails")))
-        req = (c.get("requirement_name") or f"Requirement {c.get('req_id')}") if c.get("req_id") else "-"
-        if c.get("client_name"): req += f" ({c['client_name']})"
-        writer.writerow([
-            c.get("job_title") or "-", req, c.get("candidate_name") or "-",
-            c.get("total_experience") or "-", phones or "-", emails or "-",
-            c.get("notice_period") or "-", c.get("current_location") or "-",
-            c.get("calling_status") or "-", c.get("profile_status") or "-",
-            c.get("comments") or "-", c.get("added_by_name") or c.get("added_by") or "—"
-        ])
-    mem = io.BytesIO(sio.getvalue().encode("utf-8-sig")); mem.seek(0)
-    return send_file(mem, as_attachment=True, download_name="report_export.csv", mimetype="text/csv")
+    spec = export_jobs.ExportSpec(
+        fmt="csv", filename="report_export.csv",
+        select_sql="SELECT c.*, r.id AS req_id, r.requirement_name, r.client_name",
+        from_sql=f"FROM candidates c LEFT JOIN requirements r ON r.id=c.requirement_id WHERE {where_sql}",
+        order_sql="ORDER BY c.added_date DESC, c.id DESC",
+        params=params, headers=EXPORT_HEADERS, to_row=_export_row)
+
+    # {"async": 1}: background job, polled via /exports/<job_id> (export_jobs.py)
+    if str(payload.get("async") or "") in ("1", "true", "True"):
+        return export_jobs.accepted(export_jobs.submit(spec, session.get("user_id")))
+
+    # Streamed from a server-side cursor in CSV chunks (export_stream.py)
+    rows = iter_rows(spec.sql, params)
+    return csv_response(iter_csv(EXPORT_HEADERS, rows, _export_row), spec.filename)
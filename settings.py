@@ -0,0 +1,18 @@
+"""
+settings.py
+Reading tunables from the environment.
+
+Every module that takes a number from the environment (pool sizes, chunk sizes,
+TTLs) reads it through env_int(), so a typo such as DB_POOL_MAX=ten falls back
+to the module's default instead of failing the import at boot.
+"""
+
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    """int(os.environ[name]), or `default` when it is unset or not an integer."""
+    try:
+        return int(os.getenv(name, default))
+    except Exception:
+        return default
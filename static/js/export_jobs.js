@@ -0,0 +1,28 @@
+// Background exports (export_jobs.py): start the job, poll its progress, then download.
+// startResp is the fetch() response of an export endpoint called with async=1 (HTTP 202).
+// Polling stops after EXPORT_POLL_MAX_MS; the server fails jobs lost to a restart well before.
+const EXPORT_POLL_MAX_MS = 30 * 60 * 1000;
+
+async function followExportJob(startResp, button) {
+  if (startResp.status !== 202) { throw new Error("Export failed"); }
+  let job = await startResp.json();
+  const label = button ? button.innerHTML : null;
+  const pollUntil = Date.now() + EXPORT_POLL_MAX_MS;
+  try {
+    while (job.status === "queued" || job.status === "running") {
+      if (Date.now() > pollUntil) { throw new Error("Export is taking too long; please try again later"); }
+      if (button) {
+        button.disabled = true;
+        button.textContent = job.status === "queued" ? "Export queued…" : `Exporting… ${job.percent}%`;
+      }
+      await new Promise(r => setTimeout(r, 1000));
+      const resp = await fetch(job.status_url, { headers: { "X-Requested-With": "XMLHttpRequest" } });
+      if (!resp.ok) { throw new Error("Export failed"); }
+      job = await resp.json();
+    }
+  } finally {
+    if (button) { button.disabled = false; button.innerHTML = label; }
+  }
+  if (job.status !== "done") { throw new Error(job.error || "Export failed"); }
+  window.location.href = job.download_url;
+}
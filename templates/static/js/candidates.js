@@ -292,6 +292,32 @@ previewBtn.addEventListener('click', async function(){
     });
   }
 
+  // What to do with rows matching an existing candidate (import_dedupe.POLICIES);
+  // uses #<id> when the page has it, else puts a selector before the commit button
+  function duplicateSelect(btn, id){
+    let sel = document.getElementById(id);
+    if (!sel && btn) {
+      sel = document.createElement('select');
+      sel.id = id;
+      sel.className = 'form-select form-select-sm d-inline-block w-auto me-2';
+      sel.title = 'Rows matching an existing candidate';
+      sel.innerHTML = '<option value="skip">Skip duplicates</option>'
+        + '<option value="update">Update existing</option>'
+        + '<option value="insert">Insert anyway</option>';
+      btn.parentNode.insertBefore(sel, btn);
+    }
+    return sel;
+  }
+
+  function commitMessage(data){
+    const skipped = (data.skipped || []).length;
+    let msg = `Imported ${data.inserted} candidate(s), updated ${data.updated || 0}, skipped ${skipped}.`;
+    if (data.duplicate_check === false) {
+      msg += '\nThe duplicate check could not run; every row was saved as new.';
+    }
+    return msg;
+  }
+
   // Excel flow
   const excelFile = document.getElementById('excelFile');
   const excelPreview = document.getElementById('excelPreview');
@@ -327,19 +353,20 @@ previewBtn.addEventListener('click', async function(){
     });
   }
 
+  const excelOnDuplicate = duplicateSelect(excelCommitBtn, 'excelOnDuplicate');
   if (excelCommitBtn) {
     excelCommitBtn.addEventListener('click', async function(){
       const resp = await fetch(`/requirement/${REQ_ID}/candidates/import/commit`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json', 'X-CSRFToken': CSRF },
-        body: JSON.stringify({ rows: excelRows })
+        body: JSON.stringify({ rows: excelRows, on_duplicate: excelOnDuplicate.value })
       });
       const data = await resp.json();
       if (!resp.ok) {
         alert(data.error || 'Save failed');
         return;
       }
-      alert(`Imported ${data.inserted} candidate(s).`);
+      alert(commitMessage(data));
       window.location.reload();
     });
   }
@@ -381,19 +408,20 @@ previewBtn.addEventListener('click', async function(){
     });
   }
 
+  const pasteOnDuplicate = duplicateSelect(pasteCommitBtn, 'pasteOnDuplicate');
   if (pasteCommitBtn) {
     pasteCommitBtn.addEventListener('click', async function(){
       const resp = await fetch(`/requirement/${REQ_ID}/candidates/import/commit`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json', 'X-CSRFToken': CSRF },
-        body: JSON.stringify({ rows: pasteRows })
+        body: JSON.stringify({ rows: pasteRows, on_duplicate: pasteOnDuplicate.value })
       });
       const data = await resp.json();
       if (!resp.ok) {
         alert(data.error || 'Save failed');
         return;
       }
-      alert(`Imported ${data.inserted} candidate(s).`);
+      alert(commitMessage(data));
       window.location.reload();
     });
   }
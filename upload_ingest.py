@@ -0,0 +1,207 @@
+"""
+upload_ingest.py
+Streaming ingestion of import uploads (CSV / XLSX).
+
+The upload endpoints used to read the whole request into memory and parse it in
+one go (pd.read_csv / pd.read_excel / openpyxl in normal mode / a list of every
+CSV row), so a 50k-row sheet could blow through the worker's memory and the
+gunicorn timeout. Here the upload is spooled to disk first and parsed in chunks
+of INGEST_CHUNK_ROWS rows:
+
+  csv   pd.read_csv(chunksize=...)
+  xlsx  openpyxl read_only=True, values_only rows
+  other (xls/ods) pd.read_excel in one piece, there is no streaming reader
+
+Each chunk is a DataFrame with the same columns (named the way pandas names
+them: blank headers become 'Unnamed: <i>', repeats get '.1', '.2'). IngestStats
+accumulates full-file statistics chunk by chunk and keeps the first PREVIEW_ROWS
+rows, so callers can answer with a preview as soon as the file is stored.
+
+Tunables (env):
+  INGEST_CHUNK_ROWS  rows per parsed chunk          (default 5000)
+  INGEST_SPOOL_DIR   where uploads are spooled      (default: system tmp)
+"""
+
+import math
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from settings import env_int
+
+
+INGEST_CHUNK_ROWS = env_int('INGEST_CHUNK_ROWS', 5000)
+INGEST_SPOOL_DIR = os.getenv('INGEST_SPOOL_DIR') or None
+PREVIEW_ROWS = 50
+
+CSV, XLSX, EXCEL = 'csv', 'xlsx', 'excel'
+
+
+def file_kind(filename):
+    name = (filename or '').lower()
+    if name.endswith(('.csv', '.tsv', '.txt')):
+        return CSV
+    if name.endswith(('.xlsx', '.xlsm')):
+        return XLSX
+    return EXCEL
+
+
+@contextmanager
+def spooled(file_storage):
+    """Save an uploaded werkzeug FileStorage to a temp file; yields its path, removed on exit."""
+    suffix = os.path.splitext(file_storage.filename or '')[1]
+    fd, path = tempfile.mkstemp(prefix='reqtool_upload_', suffix=suffix, dir=INGEST_SPOOL_DIR)
+    os.close(fd)
+    try:
+        file_storage.save(path)         # copied in buffered blocks, never fully in memory
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def column_names(header):
+    """pandas-style column names for a header row."""
+    names, seen = [], {}
+    for i, h in enumerate(header):
+        name = h if (h is not None and str(h).strip() != '') else 'Unnamed: %d' % i
+        if name in seen:
+            seen[name] += 1
+            name = '%s.%d' % (name, seen[name])
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def iter_xlsx_rows(path, sheet=None, numbered=False):
+    """(header, row iterator) of an .xlsx sheet read with openpyxl read_only; rows are value tuples,
+    or (sheet row number, values) pairs with numbered=True (the header is row 1).
+
+    Fully empty rows are skipped (read_only sheets often report stale dimensions and
+    yield thousands of trailing blank rows). The workbook is closed when the
+    iterator is exhausted or garbage-collected.
+    """
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    ws = wb[sheet] if sheet else wb.active
+    rows = ws.iter_rows(values_only=True)       # every row from 1, gaps filled with empty rows
+    header = next(rows, None) or ()
+
+    def body():
+        try:
+            for row_no, row in enumerate(rows, 2):
+                if any(v is not None and str(v).strip() != '' for v in row):
+                    yield (row_no, row) if numbered else row
+        finally:
+            wb.close()
+    return list(header), body()
+
+
+def iter_frames(path, kind, chunk_rows=None, sep=',', sheet_rows=False, sheet=None):
+    """Yield the upload at `path` (for .xlsx, `sheet` or the active one) as DataFrames of at most
+    chunk_rows rows.
+
+    With sheet_rows=True each frame is indexed by sheet row number (the header is
+    row 1; for CSV, the record number) and fully empty rows are dropped in every
+    format, so a row can be reported back to the user as the row they see.
+    """
+    chunk_rows = chunk_rows or INGEST_CHUNK_ROWS
+    if kind == CSV:
+        # blank lines are kept (as all-NaN rows) so the index still counts them
+        for df in pd.read_csv(path, sep=sep, chunksize=chunk_rows, skip_blank_lines=not sheet_rows):
+            if sheet_rows:
+                df = _sheet_rows(df)
+                if df.empty:
+                    continue
+            yield df
+    elif kind == XLSX:
+        header, rows = iter_xlsx_rows(path, sheet, numbered=True)
+        columns = column_names(header)
+        width = len(columns)
+        buf, row_nos = [], []
+        for row_no, row in rows:
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            buf.append(row)
+            row_nos.append(row_no)
+            if len(buf) >= chunk_rows:
+                yield _xlsx_frame(buf, columns, row_nos, sheet_rows)
+                buf, row_nos = [], []
+        if buf or not columns:
+            yield _xlsx_frame(buf, columns, row_nos, sheet_rows)
+    else:
+        df = pd.read_excel(path)
+        yield _sheet_rows(df) if sheet_rows else df
+
+
+def _xlsx_frame(buf, columns, row_nos, sheet_rows):
+    index = pd.Index(row_nos, dtype=np.int64) if sheet_rows else None
+    return pd.DataFrame(buf, columns=columns, index=index).infer_objects()
+
+
+def _sheet_rows(df):
+    """Index a pandas-read frame (RangeIndex counting every data row) by sheet row; drop empty rows."""
+    df.index = df.index + 2
+    return df[df.notna().any(axis=1)] if len(df.columns) else df
+
+
+def _json_value(v):
+    if v is None or (isinstance(v, float) and math.isnan(v)) or v is pd.NaT:
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.isoformat()
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+class IngestStats:
+    """Whole-file statistics, accumulated one chunk at a time."""
+
+    def __init__(self, preview_rows=PREVIEW_ROWS):
+        self.preview_rows = preview_rows
+        self.columns = None
+        self.rows = 0
+        self.blank_rows = 0
+        self.filled = None           # non-blank cells per column
+        self.preview = []
+
+    def update(self, df):
+        if self.columns is None:
+            self.columns = list(df.columns)
+            self.filled = np.zeros(len(self.columns), dtype=np.int64)
+        present = df.notna()
+        for col in df.columns[df.dtypes.eq(object)]:
+            # not astype(str): on unpickled chunks (import_parse) pandas converts the shared array in place
+            present[col] &= ~np.fromiter((isinstance(v, str) and not v.strip() for v in df[col]),
+                                         dtype=bool, count=len(df))
+        mask = present.to_numpy()
+        self.filled += mask.sum(axis=0)
+        self.blank_rows += int((~mask.any(axis=1)).sum()) if mask.shape[1] else len(df)
+        self.rows += len(df)
+        need = self.preview_rows - len(self.preview)
+        if need > 0:
+            for rec in df.head(need).to_dict('records'):
+                self.preview.append({k: _json_value(v) for k, v in rec.items()})
+
+    def as_dict(self):
+        columns = self.columns or []
+        filled = self.filled if self.filled is not None else []
+        return {
+            'rows': self.rows,
+            'blank_rows': self.blank_rows,
+            'columns': [{'name': str(c), 'filled': int(n), 'empty': self.rows - int(n)}
+                        for c, n in zip(columns, filled)],
+        }
+
+
+def tracked(frames, stats):
+    """Pass `frames` through, feeding each to stats.update()."""
+    for df in frames:
+        stats.update(df)
+        yield df
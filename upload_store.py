@@ -0,0 +1,282 @@
+"""
+upload_store.py
+Parsed import uploads, shared by all gunicorn workers through UPLOAD_DIR.
+
+import_routes kept every uploaded DataFrame in a module-level dict (unbounded,
+and invisible to the other workers, hence random "Upload session expired") and
+also wrote it out as CSV. Here each upload is written once, column by column, as
+.npy files under UPLOAD_DIR/<upload_id>/, one part per chunk it was written in
+(see upload_ingest.py), p<k>c<i>.* for part k, column i:
+
+  meta.json          columns, row count, per part: rows + column kinds, created_at
+  p<k>c<i>.npy       numeric / bool / datetime64 values  (loaded memory-mapped)
+  p<k>c<i>.off.npy   str columns: int64 offsets into ...
+  p<k>c<i>.utf8.npy  ... one UTF-8 buffer (memory-mapped), plus
+  p<k>c<i>.null.npy  the missing-value mask
+  p<k>c<i>.obj.npy   anything else (mixed Excel cells), pickled object array
+
+meta() answers row counts and column names without touching the data; get()
+decodes the frame and keeps it in a per-process LRU capped at UPLOAD_CACHE_BYTES.
+Uploads expire UPLOAD_TTL seconds after they were written.
+
+Tunables (env):
+  UPLOAD_TTL          seconds an upload is kept          (default 21600)
+  UPLOAD_CACHE_BYTES  decoded frames kept per process    (default 256 MB)
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from settings import env_int
+
+logger = logging.getLogger(__name__)
+
+
+UPLOAD_TTL = env_int('UPLOAD_TTL', 6 * 3600)
+UPLOAD_CACHE_BYTES = env_int('UPLOAD_CACHE_BYTES', 256 * 1024 * 1024)
+_CLEANUP_INTERVAL = 300
+
+_ID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+NUM, DATETIME, STR, OBJ = 'num', 'datetime', 'str', 'obj'
+
+
+def _kind(series):
+    dtype = series.dtype
+    if isinstance(dtype, np.dtype):
+        if dtype.kind in 'biuf':
+            return NUM
+        if dtype.kind == 'M':
+            return DATETIME
+        if dtype == object:
+            values = series.dropna()
+            if values.map(type).eq(str).all():
+                return STR
+    return OBJ
+
+
+def _write_column(path, part, i, series):
+    kind = _kind(series)
+    base = os.path.join(path, 'p%dc%d' % (part, i))
+    if kind == NUM:
+        np.save(base + '.npy', series.to_numpy())
+    elif kind == DATETIME:
+        np.save(base + '.npy', series.to_numpy().astype('datetime64[ns]'))
+    elif kind == STR:
+        null = series.isna().to_numpy()
+        encoded = [b'' if n else v.encode('utf-8') for v, n in zip(series.tolist(), null)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        np.save(base + '.off.npy', offsets)
+        np.save(base + '.utf8.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(base + '.null.npy', null)
+    else:
+        np.save(base + '.obj.npy', series.astype(object).to_numpy(), allow_pickle=True)
+    return kind
+
+
+def _read_column(path, part, i, kind):
+    base = os.path.join(path, 'p%dc%d' % (part, i))
+    if kind in (NUM, DATETIME):
+        return np.load(base + '.npy', mmap_mode='r')
+    if kind == STR:
+        offsets = np.load(base + '.off.npy')
+        buf = np.load(base + '.utf8.npy', mmap_mode='r')
+        null = np.load(base + '.null.npy')
+        raw = memoryview(buf) if len(buf) else b''
+        out = np.empty(len(null), dtype=object)
+        for j in range(len(null)):
+            out[j] = np.nan if null[j] else str(raw[offsets[j]:offsets[j + 1]], 'utf-8')
+        return out
+    return np.load(base + '.obj.npy', allow_pickle=True)
+
+
+def _concat(pieces):
+    if len(pieces) == 1:
+        return pieces[0]
+    if not pieces:
+        return np.empty(0, dtype=object)
+    dtypes = {p.dtype for p in pieces}
+    if len(dtypes) == 1 or all(d.kind in 'biuf' for d in dtypes):
+        # one type, or numbers only: numpy's promotion matches what pandas would infer
+        return np.concatenate(pieces)
+    # chunks inferred differently (e.g. numbers in one, text in another): keep the values
+    return np.concatenate([p.astype(object) for p in pieces])
+
+
+class UploadStore:
+    def __init__(self, root, ttl=UPLOAD_TTL, cache_bytes=UPLOAD_CACHE_BYTES):
+        self.root = root
+        self.ttl = ttl
+        self.cache_bytes = cache_bytes
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()      # upload_id -> (DataFrame, nbytes)
+        self._cached_bytes = 0
+        self._last_cleanup = 0.0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, upload_id):
+        if not upload_id or not _ID_RE.match(str(upload_id)):
+            return None
+        return os.path.join(self.root, upload_id)
+
+    # ---------- write ----------
+    def put(self, df):
+        """Persist `df`; returns its new upload id."""
+        upload_id = self.put_frames([df])
+        self._remember(upload_id, df)
+        return upload_id
+
+    def put_frames(self, frames):
+        """Persist an upload arriving as DataFrame chunks with identical columns; returns its id.
+
+        Only one chunk is held at a time. The upload becomes visible once complete.
+        """
+        self._maybe_cleanup()
+        upload_id = str(uuid.uuid4())
+        final = self._path(upload_id)
+        tmp = '%s.tmp-%d' % (final, os.getpid())
+        os.makedirs(tmp)
+        try:
+            columns, parts, rows = None, [], 0
+            for part, df in enumerate(frames):
+                if columns is None:
+                    columns = list(df.columns)
+                elif list(df.columns) != columns:
+                    raise ValueError('upload chunks have different columns')
+                kinds = [_write_column(tmp, part, i, df.iloc[:, i]) for i in range(df.shape[1])]
+                parts.append({'rows': int(len(df)), 'kinds': kinds})
+                rows += len(df)
+            meta = {
+                'columns': columns or [],
+                'rows': rows,
+                'parts': parts,
+                'created_at': time.time(),
+            }
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f, default=str)
+            os.rename(tmp, final)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return upload_id
+
+    # ---------- read ----------
+    def meta(self, upload_id):
+        """{'columns', 'rows', 'parts', 'created_at'} without loading data, or None if unknown/expired."""
+        path = self._path(upload_id)
+        if path is None:
+            return None
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - meta.get('created_at', 0) > self.ttl:
+            self.delete(upload_id)
+            return None
+        return meta
+
+    def exists(self, upload_id):
+        return self.meta(upload_id) is not None
+
+    def get(self, upload_id):
+        """The upload as a DataFrame (shared, don't modify in place), or None."""
+        meta = self.meta(upload_id)
+        if meta is None:
+            return None
+        with self._lock:
+            hit = self._cache.get(upload_id)
+            if hit is not None:
+                self._cache.move_to_end(upload_id)
+                return hit[0]
+        path = self._path(upload_id)
+        try:
+            data = {}
+            for i in range(len(meta['columns'])):
+                pieces = [_read_column(path, k, i, part['kinds'][i]) for k, part in enumerate(meta['parts'])]
+                data[i] = _concat(pieces)
+        except (OSError, ValueError):
+            logger.warning("upload %s is incomplete or unreadable", upload_id)
+            return None
+        df = pd.DataFrame(data, index=pd.RangeIndex(meta['rows']))
+        df.columns = meta['columns']
+        self._remember(upload_id, df)
+        return df
+
+    def ids(self):
+        """Ids of uploads that haven't expired, oldest first."""
+        found = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return []
+        for name in names:
+            meta = self.meta(name)
+            if meta is not None:
+                found.append((meta['created_at'], name))
+        return [name for _, name in sorted(found)]
+
+    # ---------- eviction ----------
+    def _remember(self, upload_id, df):
+        nbytes = int(df.memory_usage(index=False, deep=True).sum())
+        if nbytes > self.cache_bytes:
+            return
+        with self._lock:
+            old = self._cache.pop(upload_id, None)
+            if old is not None:
+                self._cached_bytes -= old[1]
+            self._cache[upload_id] = (df, nbytes)
+            self._cached_bytes += nbytes
+            while self._cached_bytes > self.cache_bytes:
+                _, (_, evicted) = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted
+
+    def delete(self, upload_id):
+        path = self._path(upload_id)
+        if path is None:
+            return
+        with self._lock:
+            old = self._cache.pop(upload_id, None)
+            if old is not None:
+                self._cached_bytes -= old[1]
+        shutil.rmtree(path, ignore_errors=True)
+
+    def cleanup(self, now=None):
+        """Remove expired uploads (and leftovers of interrupted writes); returns how many."""
+        now = now or time.time()
+        removed = 0
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            try:
+                if now - os.path.getmtime(path) <= self.ttl:
+                    continue
+            except OSError:
+                continue
+            if self._path(name) is not None:
+                self.delete(name)
+            else:
+                shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def _maybe_cleanup(self):
+        if time.time() - self._last_cleanup > _CLEANUP_INTERVAL:
+            self._last_cleanup = time.time()
+            self.cleanup()